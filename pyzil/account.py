@@ -12,20 +12,42 @@ Zilliqa Account
 :license: MIT License, see LICENSE for more details.
 """
 
-from typing import List, Union, Optional
+import time
+from typing import List, Union, Optional, Iterable, Iterator, Sequence
 from collections import namedtuple
 from concurrent import futures
 from concurrent.futures import ThreadPoolExecutor
 
 from pyzil.crypto import zilkey
 from pyzil.zilliqa.api import APIError
-from pyzil.zilliqa.chain import active_chain
+from pyzil.zilliqa.chain import active_chain, SignedTransaction
 from pyzil.zilliqa.units import Qa, Zil
 
 
 BatchTransfer = namedtuple("BatchTransfer", ["to_addr", "zils"])
 
 
+def _transfer_amount(zils) -> Qa:
+    """Amount of transfer in Qa, Qa is kept as Qa and others are Zils."""
+    if isinstance(zils, Qa):
+        return zils
+    if not isinstance(zils, Zil):
+        zils = Zil(zils)
+    return zils.toQa()
+
+
+def check_transfer(to_addr, zils) -> None:
+    """Raise ValueError if address or amount of transfer is invalid."""
+    if not isinstance(to_addr, str) or not zilkey.normalise_address(to_addr):
+        raise ValueError("invalid to address")
+    try:
+        amount = _transfer_amount(zils)
+    except TypeError as e:
+        raise ValueError("invalid amount: {}".format(e))
+    if amount < 0:
+        raise ValueError("invalid amount: {}".format(zils))
+
+
 class Account:
     """Zilliqa Account"""
 
@@ -206,67 +228,110 @@ class Account:
         self.last_txn_details = txn_details
         return txn_details
 
-    def transfer_batch(self, batch: List[BatchTransfer],
+    def sign_transfers(self, batch: Iterable[BatchTransfer],
                        gas_price: Optional[int]=None, gas_limit=1,
-                       max_workers=200, timeout=None):
-        """Batch Transfer zils to addresses."""
+                       nonce: Optional[int]=None) -> Iterator[SignedTransaction]:
+        """Sign transfers lazily, yield SignedTransaction one by one.
+        nonce is the nonce of the first transaction, default is current nonce + 1.
+        """
         if not self.zil_key or not self.zil_key.encoded_private_key:
             raise RuntimeError("can not create transaction without private key")
 
-        # check address format
-        for to_addr, zils in batch:
-            to_addr = zilkey.normalise_address(to_addr)
-            if not to_addr:
-                raise ValueError("invalid to address")
-
         if gas_price is None:
             gas_price = self.get_min_gas_price(refresh=False)
 
-        resp = self.get_balance_nonce()
-        batch_nonce = resp["nonce"] + 1
+        if nonce is None:
+            resp = self.get_balance_nonce()
+            nonce = resp["nonce"] + 1
 
-        txn_params = []
+        sender = active_chain.transaction_sender(self.zil_key, gas_price, gas_limit)
         for to_addr, zils in batch:
             to_addr = zilkey.normalise_address(to_addr)
             if not to_addr:
                 raise ValueError("invalid to address")
 
-            if isinstance(zils, Qa):
-                amount = zils
-            else:
-                if not isinstance(zils, Zil):
-                    zils = Zil(zils)
-                amount = zils.toQa()
-
-            params = active_chain.build_transaction_params(
-                self.zil_key, to_addr,
-                amount, batch_nonce,
-                gas_price, gas_limit
-            )
-            txn_params.append(params)
-            batch_nonce += 1
-
-        def create_txn(p):
+            amount = _transfer_amount(zils)
+            yield active_chain.sign_transaction(sender, to_addr, amount, nonce)
+            nonce += 1
+
+    def transfer_batch(self, batch: Iterable[BatchTransfer],
+                       gas_price: Optional[int]=None, gas_limit=1,
+                       max_workers=200, timeout=None):
+        """Batch Transfer zils to addresses.
+        batch can also be zip(addresses, QaArray), amounts are passed as Qa.
+        Transactions are signed while sending, at most 2 * max_workers
+        signed transactions are kept in memory.
+        A list batch is checked before sending, ValueError is raised if any
+        transfer is invalid. An iterator batch is checked while streaming,
+        an invalid transfer gets None as result and uses no nonce.
+        timeout is for the whole batch, as in previous versions.
+        """
+        if not self.zil_key or not self.zil_key.encoded_private_key:
+            raise RuntimeError("can not create transaction without private key")
+
+        txn_results = []
+
+        # check address format
+        if isinstance(batch, Sequence):
+            for to_addr, zils in batch:
+                check_transfer(to_addr, zils)
+        else:
+            batch = self._valid_transfers(batch, txn_results)
+
+        def create_txn(txn):
             try:
-                txn_info = active_chain.api.CreateTransaction(p)
+                txn_info = active_chain.api.CreateTransaction(txn.to_params())
             except Exception as e:
                 print("Error in CreateTransaction: {}".format(e))
                 txn_info = None
             return txn_info
 
-        txn_results = []
-        with ThreadPoolExecutor(max_workers=max_workers) as pool:
-            all_tasks = [pool.submit(create_txn, p) for p in txn_params]
-
-            for future in futures.as_completed(all_tasks, timeout=timeout):
+        def collect(done_tasks):
+            for future in done_tasks:
                 try:
                     txn_results.append(future.result())
                 except Exception as e:
                     print("Error: {}".format(e))
                     txn_results.append(None)
 
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining():
+            if deadline is None:
+                return None
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise futures.TimeoutError()
+            return left
+
+        signed_txns = self.sign_transfers(batch, gas_price=gas_price, gas_limit=gas_limit)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = set()
+            for txn in signed_txns:
+                pending.add(pool.submit(create_txn, txn))
+                while len(pending) >= max_workers * 2:
+                    done, pending = futures.wait(
+                        pending, timeout=remaining(), return_when=futures.FIRST_COMPLETED
+                    )
+                    collect(done)
+
+            collect(futures.as_completed(pending, timeout=remaining()))
+
         return txn_results
 
+    @staticmethod
+    def _valid_transfers(batch: Iterable[BatchTransfer],
+                         txn_results: list) -> Iterator[BatchTransfer]:
+        """Yield valid transfers, append None to txn_results for invalid ones."""
+        for to_addr, zils in batch:
+            try:
+                check_transfer(to_addr, zils)
+            except ValueError as e:
+                print("Error in transfer to {}: {}".format(to_addr, e))
+                txn_results.append(None)
+                continue
+            yield to_addr, zils
+
     @classmethod
     def wait_txn_confirm(cls, txn_id, timeout=300, sleep=20):
         return active_chain.wait_txn_confirm(txn_id, timeout=timeout, sleep=sleep)
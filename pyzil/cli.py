@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+"""
+pyzil.cli
+~~~~~~~~~~~~
+
+Command line tools.
+
+:copyright: (c) 2019 by Gully Chen.
+:license: MIT License, see LICENSE for more details.
+"""
+
+import click
+
+from pyzil.account import Account
+from pyzil.payout import run_payout, PAYOUT_CHUNK_SIZE
+from pyzil.zilliqa import chain
+
+
+CHAINS = {
+    "testnet": chain.TestNet,
+    "mainnet": chain.MainNet,
+    "isolated": chain.IsolatedServer,
+}
+
+
+@click.group()
+def cli():
+    """pyzil command line tools."""
+
+
+@cli.command()
+@click.argument("recipients_file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--chain", "chain_name", type=click.Choice(sorted(CHAINS)), default="testnet",
+              show_default=True, help="Zilliqa chain.")
+@click.option("--keystore", type=click.Path(exists=True, dir_okay=False),
+              help="Keystore json file of the paying account.")
+@click.option("--password", envvar="PYZIL_KEYSTORE_PASSWORD",
+              help="Keystore password, prompted if missing.")
+@click.option("--private-key", envvar="PYZIL_PRIVATE_KEY",
+              help="Private key of the paying account.")
+@click.option("--checkpoint", type=click.Path(dir_okay=False),
+              help="Checkpoint file, default is RECIPIENTS_FILE.checkpoint.")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]),
+              help="Recipients file format, guessed from extension by default.")
+@click.option("--unit", type=click.Choice(["zil", "qa"]), default="zil", show_default=True,
+              help="Unit of amounts in recipients file.")
+@click.option("--gas-price", type=int, help="Gas price in Qa, default is minimum gas price.")
+@click.option("--gas-limit", type=int, default=1, show_default=True)
+@click.option("--chunk-size", type=int, default=PAYOUT_CHUNK_SIZE, show_default=True)
+@click.option("--workers", type=int, default=50, show_default=True)
+def payout(recipients_file, chain_name, keystore, password, private_key, checkpoint,
+           fmt, unit, gas_price, gas_limit, chunk_size, workers):
+    """Pay recipients listed in csv or jsonl file, resumable."""
+    if keystore:
+        if password is None:
+            password = click.prompt("Keystore password", hide_input=True)
+        account = Account.from_keystore(password, keystore)
+    elif private_key:
+        account = Account(private_key=private_key)
+    else:
+        raise click.UsageError("--keystore or --private-key is required")
+
+    chain.set_active_chain(CHAINS[chain_name])
+
+    def progress(stats):
+        click.echo("sent {} failed {} skipped {} invalid {}, {:.2f} txn/s".format(
+            stats.sent, stats.failed, stats.skipped, stats.invalid, stats.rate
+        ))
+
+    stats = run_payout(
+        account, recipients_file, checkpoint_file=checkpoint, fmt=fmt, unit=unit,
+        gas_price=gas_price, gas_limit=gas_limit, chunk_size=chunk_size,
+        max_workers=workers, progress=progress
+    )
+    click.echo(repr(stats))
+    if stats.failed or stats.invalid:
+        raise SystemExit(1)
+
+
+if "__main__" == __name__:
+    cli()
@@ -12,12 +12,101 @@ Zilliqa Smart Contract
 :license: MIT License, see LICENSE for more details.
 """
 
+import re
 import json
+import heapq
+import bisect
+import threading
 from enum import Enum
-from typing import Dict, List, Optional
+from collections import namedtuple
+from typing import Dict, List, Optional, Iterable, Iterator, Tuple, Sequence, Any, Callable
 
 from pyzil.crypto import zilkey
-from pyzil.zilliqa.chain import active_chain
+from pyzil.zilliqa.api import APIError
+from pyzil.zilliqa.chain import active_chain, TxnSpec
+from pyzil.zilliqa.units import QaArray, Qa, Zil
+
+
+def encode_key(key_type: Optional[str], key) -> str:
+    """Encode map key as in contract state, ByStr20 keys are 0x lowercase hex."""
+    if key_type == "ByStr20":
+        address = zilkey.to_valid_address(key)
+        if not address:
+            raise ValueError("invalid address key: {}".format(key))
+        return "0x" + address
+    return str(key)
+
+
+def decode_value(value_type: Optional[str], value):
+    """Decode state value, Uint/Int types to int, others as is."""
+    if value is None or value_type is None:
+        return value
+    if value_type.startswith(("Uint", "Int")):
+        return int(value)
+    return value
+
+
+BatchCallResult = namedtuple("BatchCallResult", ["txn_id", "receipt", "error"])
+
+
+class ContractMap:
+    """Typed accessor of a map field, fetched by GetSmartContractSubState."""
+
+    def __init__(self, contract: "Contract", variable: str,
+                 key_types: Sequence[Optional[str]]=(None, ),
+                 value_type: Optional[str]=None):
+        self.contract = contract
+        self.variable = variable
+        self.key_types = tuple(key_types)
+        self.value_type = value_type
+
+    def __repr__(self):
+        return "<ContractMap: {}.{}>".format(self.contract.address, self.variable)
+
+    def _indices(self, keys) -> List[str]:
+        if not isinstance(keys, tuple):
+            keys = (keys, )
+        if len(keys) > len(self.key_types):
+            raise ValueError("too many keys for map {}".format(self.variable))
+        return [encode_key(key_type, key) for key_type, key in zip(self.key_types, keys)]
+
+    def _lookup(self, substate, indices: List[str]):
+        for index in indices:
+            if not isinstance(substate, dict) or index not in substate:
+                return None
+            substate = substate[index]
+        if len(indices) == len(self.key_types):
+            return decode_value(self.value_type, substate)
+        return substate
+
+    def get(self, *keys, default=None):
+        """Return decoded value of keys, nested map takes multiple keys."""
+        indices = self._indices(keys)
+        value = self._lookup(self.contract.get_substate(self.variable, indices), indices)
+        return default if value is None else value
+
+    def __getitem__(self, keys):
+        value = self.get(*(keys if isinstance(keys, tuple) else (keys, )))
+        if value is None:
+            raise KeyError(keys)
+        return value
+
+    def __contains__(self, keys):
+        return self.get(*(keys if isinstance(keys, tuple) else (keys, ))) is not None
+
+    def get_many(self, keys: Iterable, default=None) -> List:
+        """Return values of many keys in batched requests, keys of
+        nested map are tuples.
+        """
+        all_indices = [self._indices(key) for key in keys]
+        substates = self.contract.get_substates(
+            [(self.variable, indices) for indices in all_indices]
+        )
+        values = []
+        for substate, indices in zip(substates, all_indices):
+            value = self._lookup(substate, indices)
+            values.append(default if value is None else value)
+        return values
 
 
 class Contract:
@@ -84,6 +173,13 @@ class Contract:
     def account(self, account):
         self._account = account
 
+    @classmethod
+    def predict_address(cls, sender: str, nonce: int) -> str:
+        """Return address of contract deployed by sender, nonce is the current
+        nonce of sender, the deploy transaction takes nonce + 1.
+        """
+        return zilkey.contract_address(sender, nonce)
+
     @classmethod
     def new_from_code(cls, code: str) -> "Contract":
         return cls(code=code)
@@ -126,6 +222,36 @@ class Contract:
         self.state = active_chain.api.GetSmartContractState(self.address)
         return self.state
 
+    def get_substate(self, variable: str, indices: Optional[List[str]]=None) -> Any:
+        """Return the variable of state, or a part of map variable by indices.
+        Return None if not found.
+        """
+        assert self.address, "contract has not been deployed"
+        resp = active_chain.api.GetSmartContractSubState(self.address, variable, indices or [])
+        return resp and resp.get(variable)
+
+    def get_substates(self, queries: Iterable[Tuple[str, Optional[List[str]]]]) -> List[Any]:
+        """Batch get_substate for (variable, indices) queries in batched requests."""
+        assert self.address, "contract has not been deployed"
+        queries = list(queries)
+        results = active_chain.api.call_batch(
+            ("GetSmartContractSubState", (self.address, variable, indices or []))
+            for variable, indices in queries
+        )
+        substates = []
+        for (variable, _), resp in zip(queries, results):
+            if isinstance(resp, APIError):
+                raise resp
+            substates.append(resp and resp.get(variable))
+        return substates
+
+    def map(self, variable: str, key_types: Sequence[Optional[str]]=(None, ),
+            value_type: Optional[str]=None) -> ContractMap:
+        """Return typed accessor of map field, eg. ZRC-2 balances is
+        contract.map("balances", ["ByStr20"], "Uint128").
+        """
+        return ContractMap(self, variable, key_types=key_types, value_type=value_type)
+
     def deploy(self, init_params: Optional[List[Dict]]=None,
                nonce: Optional[int]=None,
                gas_price: Optional[int]=None, gas_limit=10000, priority=True,
@@ -141,6 +267,8 @@ class Contract:
             ]
 
         self.init = init_params
+        if nonce is None:
+            nonce = self.account.get_balance_nonce()["nonce"] + 1
 
         txn_info = self.account.transfer(
             to_addr=Contract.DEPLOY_ADDRESS,
@@ -166,7 +294,7 @@ class Contract:
             self.last_receipt = txn_details["receipt"].copy()
 
             if txn_details["receipt"]["success"]:
-                self.address = active_chain.api.GetContractAddressFromTransactionID(deploy_txn_id)
+                self.address = Contract.predict_address(self.account.address, nonce - 1)
                 assert address == self.address, "address mismatch"
                 self.status = Contract.Status.Deployed
             else:
@@ -208,3 +336,616 @@ class Contract:
         txn_details = self.account.wait_txn_confirm(call_txn_id, timeout=timeout, sleep=sleep)
         self.last_receipt = txn_details and txn_details["receipt"]
         return txn_details
+
+    def call_batch(self, calls: Iterable[Sequence],
+                   nonce: Optional[int]=None,
+                   gas_price: Optional[int]=None, gas_limit=10000, priority=True,
+                   confirm=True, timeout=300, sleep=10,
+                   workers: Optional[int]=None) -> List[BatchCallResult]:
+        """Call contract with many (method, params) or (method, params, amount),
+        using consecutive nonces from nonce (default current nonce + 1).
+        Transactions are signed in parallel, sent and confirmed in batched
+        requests, return a BatchCallResult for each call in order.
+        A call that failed to send leaves a nonce gap, unconfirmed calls
+        after it get a "blocked by nonce gap" error.
+        """
+        if not self.address:
+            raise ValueError("invalid contract address")
+        if self.status != Contract.Status.Deployed:
+            raise ValueError("contract has not been deployed")
+
+        account = self.account
+        if gas_price is None:
+            gas_price = account.get_min_gas_price(refresh=False)
+        if nonce is None:
+            nonce = account.get_balance_nonce()["nonce"] + 1
+
+        to_addr = self.checksum_address
+        txns = []
+        for i, call in enumerate(calls):
+            method, params = call[0], call[1]
+            amount = call[2] if len(call) > 2 else 0
+            if not isinstance(amount, Qa):
+                amount = (amount if isinstance(amount, Zil) else Zil(amount)).toQa()
+            call_data = json.dumps({"_tag": method, "params": params})
+            txns.append(TxnSpec(to_addr, amount, nonce + i, data=call_data, priority=priority))
+
+        signed = active_chain.sign_transactions(account.zil_key, txns, gas_price, gas_limit,
+                                                workers=workers)
+        txn_infos = active_chain.api.call_batch(
+            ("CreateTransaction", (txn.to_params(), )) for txn in signed
+        )
+
+        results = []
+        for txn_info in txn_infos:
+            if isinstance(txn_info, APIError) or not txn_info:
+                results.append(BatchCallResult(None, None, txn_info or APIError("no response")))
+            else:
+                results.append(BatchCallResult(txn_info["TranID"], None, None))
+        if not confirm:
+            return results
+
+        # calls after a nonce that was not sent can not be confirmed
+        gap = min((txn.nonce for txn, r in zip(txns, results) if not r.txn_id), default=None)
+        confirmed = active_chain.wait_txns_confirm(
+            [r.txn_id for r in results if r.txn_id], timeout=timeout, sleep=sleep
+        )
+        for i, result in enumerate(results):
+            if not result.txn_id:
+                continue
+            txn_details = confirmed.get(result.txn_id)
+            if txn_details is None:
+                if gap is not None and txns[i].nonce > gap:
+                    error = APIError("blocked by nonce gap at {}".format(gap))
+                else:
+                    error = APIError("transaction not confirmed")
+                results[i] = result._replace(error=error)
+            else:
+                results[i] = result._replace(receipt=txn_details["receipt"])
+        confirmed_receipts = [r.receipt for r in results if r.receipt]
+        if confirmed_receipts:
+            self.last_receipt = confirmed_receipts[-1]
+        return results
+
+
+class ContractDeployer:
+    """Deploy many contracts concurrently.
+
+    Contracts are deployed in waves: all contracts whose dependencies are
+    deployed are signed with consecutive nonces, sent in one batch and
+    confirmed together. An init value may be a Contract, it is replaced
+    by the address of that contract and makes it a dependency.
+
+    With predict_addresses, addresses are computed from the sender nonces
+    and all contracts are sent in a single wave in dependency order.
+    """
+
+    def __init__(self, account, gas_price: Optional[int]=None, gas_limit=10000,
+                 priority=True, timeout=300, sleep=10, workers: Optional[int]=None,
+                 predict_addresses=False):
+        self.account = account
+        self.gas_price = gas_price
+        self.gas_limit = gas_limit
+        self.priority = priority
+        self.timeout = timeout
+        self.sleep = sleep
+        self.workers = workers
+        self.predict_addresses = predict_addresses
+        self.contracts = []    # type: List[Contract]
+        self._init_params = {}
+        self._depends_on = {}
+        self._predicted = {}
+
+    def add(self, contract: Contract, init_params: Optional[List[Dict]]=None,
+            depends_on: Iterable[Contract]=()) -> Contract:
+        assert contract.code, "invalid contract code"
+        if contract.address or contract.status == Contract.Status.Deployed:
+            raise ValueError("contract had deployed already")
+        if not init_params:
+            init_params = [Contract.value_dict("_scilla_version", "Uint32", "0")]
+
+        depends_on = list(depends_on)
+        depends_on.extend(item["value"] for item in init_params
+                          if isinstance(item["value"], Contract))
+        self.contracts.append(contract)
+        self._init_params[id(contract)] = init_params
+        self._depends_on[id(contract)] = depends_on
+        return contract
+
+    def waves(self) -> List[List[Contract]]:
+        """Return contracts grouped by deploy order, raise ValueError on cycle."""
+        pending = list(self.contracts)
+        done = set()
+        waves = []
+        while pending:
+            wave = [c for c in pending
+                    if all(id(d) in done or d.status == Contract.Status.Deployed
+                           for d in self._depends_on[id(c)])]
+            if not wave:
+                raise ValueError("circular or missing contract dependencies")
+            waves.append(wave)
+            done.update(id(c) for c in wave)
+            pending = [c for c in pending if id(c) not in done]
+        return waves
+
+    def _address0x(self, contract: Contract) -> str:
+        if contract.address:
+            return contract.address0x
+        return "0x" + self._predicted[id(contract)]
+
+    def _resolve_init(self, contract: Contract) -> List[Dict]:
+        return [
+            dict(item, value=self._address0x(item["value"]))
+            if isinstance(item["value"], Contract) else item
+            for item in self._init_params[id(contract)]
+        ]
+
+    def _deploy_wave(self, wave: List[Contract], gas_price: int, nonce: int) -> int:
+        """Deploy a wave from nonce, return the nonce for the next wave."""
+        ready = []
+        for contract in wave:
+            if not self.predict_addresses and any(
+                    d.status != Contract.Status.Deployed for d in self._depends_on[id(contract)]):
+                contract.status = Contract.Status.Failed
+            else:
+                ready.append(contract)
+        if not ready:
+            return nonce
+
+        for i, contract in enumerate(ready):
+            if self.predict_addresses:
+                # in dependency order, addresses of dependencies are predicted already
+                self._predicted[id(contract)] = Contract.predict_address(
+                    self.account.address, nonce + i - 1)
+            contract.init = self._resolve_init(contract)
+
+        to_addr = zilkey.normalise_address(Contract.DEPLOY_ADDRESS)
+        txns = [TxnSpec(to_addr, 0, nonce + i, code=contract.code,
+                        data=contract.init_str, priority=self.priority)
+                for i, contract in enumerate(ready)]
+        signed = active_chain.sign_transactions(self.account.zil_key, txns, gas_price,
+                                                self.gas_limit, workers=self.workers)
+        txn_infos = active_chain.api.call_batch(
+            ("CreateTransaction", (txn.to_params(), )) for txn in signed
+        )
+
+        deploy_txns = {}
+        next_nonce = nonce
+        for contract, txn, txn_info in zip(ready, txns, txn_infos):
+            if isinstance(txn_info, APIError) or not txn_info:
+                contract.status = Contract.Status.Failed
+            else:
+                address = Contract.predict_address(self.account.address, txn.nonce - 1)
+                deploy_txns[txn_info["TranID"]] = (contract, address)
+                next_nonce = txn.nonce + 1
+
+        confirmed = active_chain.wait_txns_confirm(deploy_txns, timeout=self.timeout,
+                                                   sleep=self.sleep)
+        for txn_id, (contract, address) in deploy_txns.items():
+            txn_details = confirmed.get(txn_id)
+            if not txn_details:
+                contract.status = Contract.Status.Failed
+                continue
+            contract.last_receipt = txn_details["receipt"].copy()
+            if txn_details["receipt"]["success"]:
+                contract.address = address
+                contract.account = self.account
+                contract.status = Contract.Status.Deployed
+            else:
+                contract.status = Contract.Status.Rejected
+        return next_nonce
+
+    def deploy(self) -> List[Contract]:
+        """Deploy all contracts, fill addresses and statuses, return contracts.
+        Contracts depending on a failed one are marked Failed without sending,
+        unless addresses are predicted. The nonce is read once and carried
+        from wave to wave, so transactions still pending from a timed out
+        wave never share nonces with later ones.
+        """
+        waves = self.waves()
+        gas_price = self.gas_price
+        if gas_price is None:
+            gas_price = self.account.get_min_gas_price(refresh=False)
+        if self.predict_addresses:
+            waves = [[contract for wave in waves for contract in wave]]
+        nonce = self.account.get_balance_nonce()["nonce"] + 1
+        for wave in waves:
+            nonce = self._deploy_wave(wave, gas_price, nonce)
+        return self.contracts
+
+
+StateChange = namedtuple("StateChange", ["block_num", "variable", "indices", "old", "new"])
+
+
+def state_to_dict(state) -> Dict[str, Any]:
+    """Convert state of [{"vname", "type", "value"}] to {vname: value}."""
+    if isinstance(state, list):
+        return {item["vname"]: item["value"] for item in state}
+    return dict(state or {})
+
+
+def diff_state(old, new, block_num: int, variable: str,
+               indices: Tuple[str, ...]=()) -> List[StateChange]:
+    """Return changes from old to new value, maps are compared by keys."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in old.keys() | new.keys():
+            changes.extend(diff_state(old.get(key), new.get(key), block_num,
+                                      variable, indices + (key, )))
+        return changes
+    if old != new:
+        return [StateChange(block_num, variable, indices, old, new)]
+    return []
+
+
+def _receipt_addresses(txn: dict) -> set:
+    """Return 0x addresses mentioned in transaction, its events and transitions."""
+    addresses = set()
+
+    def add(value):
+        if isinstance(value, str) and value.startswith("0x") and len(value) == 42:
+            addresses.add(value.lower())
+
+    if txn.get("toAddr"):
+        add("0x" + txn["toAddr"].lower().replace("0x", ""))
+    if txn.get("senderPubKey"):
+        try:
+            add("0x" + zilkey.ZilKey(public_key=txn["senderPubKey"]).address)
+        except ValueError:
+            pass
+
+    receipt = txn.get("receipt") or {}
+    for event in receipt.get("event_logs") or []:
+        add(event.get("address"))
+        for param in event.get("params") or []:
+            add(param.get("value"))
+    for transition in receipt.get("transitions") or []:
+        add(transition.get("addr"))
+        msg = transition.get("msg") or {}
+        add(msg.get("_recipient"))
+        for param in msg.get("params") or []:
+            add(param.get("value"))
+    return addresses
+
+
+class ContractStateMirror:
+    """Local copy of contract state, updated by following TxBlocks.
+
+    Full state is loaded once. For every transaction touching the contract,
+    the fields are refreshed by sub-state queries, fields in map_fields only
+    for the address keys found in the transaction, others as a whole.
+    Changes are returned by sync and sent to listeners. State is reloaded
+    fully if a block or transaction can not be fetched.
+    """
+
+    def __init__(self, contract: Contract, map_fields: Iterable[str]=(),
+                 key_resolver: Optional[Callable[[dict], Iterable[str]]]=None):
+        assert contract.address, "contract has not been deployed"
+        self.contract = contract
+        self.address0x = contract.address0x
+        self.map_fields = set(map_fields)
+        self.key_resolver = key_resolver or _receipt_addresses
+        self.state = None    # type: Optional[Dict[str, Any]]
+        self.block_num = None    # type: Optional[int]
+        self.full_reloads = 0
+        self.listeners = []    # type: List[Callable[[List[StateChange]], None]]
+
+    def add_listener(self, listener: Callable[[List[StateChange]], None]) -> None:
+        self.listeners.append(listener)
+
+    def _emit(self, changes: List[StateChange]) -> List[StateChange]:
+        if changes:
+            for listener in self.listeners:
+                listener(changes)
+        return changes
+
+    @staticmethod
+    def latest_block_num() -> int:
+        return int(active_chain.api.GetNumTxBlocks()) - 1
+
+    def load(self) -> List[StateChange]:
+        """Load full state, return changes against the previous copy."""
+        block_num = self.latest_block_num()
+        new_state = state_to_dict(active_chain.api.GetSmartContractState(self.contract.address))
+        changes = []
+        if self.state is not None:
+            self.full_reloads += 1
+            for variable in self.state.keys() | new_state.keys():
+                changes.extend(diff_state(self.state.get(variable), new_state.get(variable),
+                                          block_num, variable))
+        self.state = new_state
+        self.contract.state = new_state
+        self.block_num = block_num
+        return self._emit(changes)
+
+    def touches(self, txn: dict) -> bool:
+        receipt = txn.get("receipt") or {}
+        if not receipt.get("success"):
+            return False
+        return self.address0x in _receipt_addresses(txn)
+
+    def block_transactions(self, block_num: int) -> List[dict]:
+        """Return transactions of TxBlock, raise APIError if failed."""
+        try:
+            txn_ids = active_chain.api.GetTransactionsForTxBlock(str(block_num))
+        except APIError as e:
+            if "no transactions" in str(e).lower():
+                return []
+            raise
+        txn_ids = [txn_id for shard in txn_ids or [] for txn_id in shard or []]
+        txns = active_chain.api.call_batch(("GetTransaction", (txn_id, )) for txn_id in txn_ids)
+        for txn in txns:
+            if isinstance(txn, APIError):
+                raise txn
+        return txns
+
+    def _refresh(self, block_num: int, txns: List[dict]) -> List[StateChange]:
+        keys = set()
+        for txn in txns:
+            keys.update(self.key_resolver(txn))
+
+        queries = []
+        for variable in self.state:
+            if variable in self.map_fields:
+                queries.extend((variable, [key]) for key in sorted(keys))
+            else:
+                queries.append((variable, None))
+        substates = self.contract.get_substates(queries)
+
+        changes = []
+        for (variable, indices), substate in zip(queries, substates):
+            if indices is None:
+                old, new = self.state.get(variable), substate
+                self.state[variable] = new
+            else:
+                key = indices[0]
+                field = self.state.setdefault(variable, {})
+                old = {key: field.pop(key)} if key in field else {}
+                new = {key: substate[key]} if isinstance(substate, dict) and key in substate else {}
+                field.update(new)
+            changes.extend(diff_state(old, new, block_num, variable))
+        return changes
+
+    def sync(self) -> List[StateChange]:
+        """Follow TxBlocks to the latest one, return changes."""
+        if self.state is None:
+            return self.load()
+
+        latest = self.latest_block_num()
+        if latest < self.block_num:
+            # chain rolled back or switched node
+            return self.load()
+
+        changes = []
+        try:
+            for block_num in range(self.block_num + 1, latest + 1):
+                txns = [txn for txn in self.block_transactions(block_num) if self.touches(txn)]
+                if txns:
+                    changes.extend(self._refresh(block_num, txns))
+                self.block_num = block_num
+        except APIError:
+            self._emit(changes)
+            return changes + self.load()
+        return self._emit(changes)
+
+    def follow(self, interval: float=10, stop_event: Optional[threading.Event]=None) -> None:
+        """Call sync every interval seconds until stop_event is set."""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            self.sync()
+            stop_event.wait(interval)
+
+
+FIELD_RE = re.compile(r"^\s*field\s+(\w+)\s*:\s*(.+?)\s*=", re.MULTILINE)
+
+
+def scilla_field_types(code: str) -> Dict[str, str]:
+    """Return {field: type} of mutable fields declared in Scilla code."""
+    return {name: " ".join(vtype.split()) for name, vtype in FIELD_RE.findall(code or "")}
+
+
+def parse_scilla_type(vtype: str):
+    """Parse Scilla type to a str of primitive type, or a tuple of
+    ("Map", key_type, value_type), eg. "Map ByStr20 (Map ByStr20 Uint128)".
+    """
+    tokens = vtype.replace("(", " ( ").replace(")", " ) ").split()
+
+    def parse(pos):
+        token = tokens[pos]
+        if token == "(":
+            parsed, pos = parse(pos + 1)
+            if pos >= len(tokens) or tokens[pos] != ")":
+                raise ValueError("invalid type: {}".format(vtype))
+            return parsed, pos + 1
+        if token == "Map":
+            key_type, pos = parse(pos + 1)
+            value_type, pos = parse(pos)
+            return ("Map", key_type, value_type), pos
+        return token, pos + 1
+
+    try:
+        parsed, pos = parse(0)
+    except IndexError:
+        raise ValueError("invalid type: {}".format(vtype))
+    if pos != len(tokens):
+        # generic types like "List Uint128" are kept as str
+        return " ".join(tokens)
+    return parsed
+
+
+# Uint types that fit in QaArray, Uint256 values are kept as int
+QA_ARRAY_TYPES = ("Uint32", "Uint64", "Uint128")
+
+
+def _is_uint(vtype) -> bool:
+    return vtype in QA_ARRAY_TYPES
+
+
+def _decode_address(value) -> bytes:
+    # parse only, the address forms cache is not touched for map keys
+    address = zilkey.to_address_bytes(value) if isinstance(value, str) else None
+    if address is None:
+        raise ValueError("invalid address: {}".format(value))
+    return address
+
+
+def decode_typed_value(vtype, value):
+    """Decode json state value to compact native value by parsed Scilla type."""
+    if value is None:
+        return None
+    if isinstance(vtype, tuple):
+        return CompactMap.from_json(vtype[1], vtype[2], value)
+    if vtype.startswith(("Uint", "Int")):
+        return int(value)
+    if vtype == "ByStr20":
+        return _decode_address(value)
+    return value
+
+
+class _FixedKeys:
+    """Sequence view of sorted fixed size keys packed in bytes."""
+    __slots__ = ("blob", "size")
+
+    def __init__(self, blob: bytes, size: int):
+        self.blob = blob
+        self.size = size
+
+    def __len__(self):
+        return len(self.blob) // self.size
+
+    def __getitem__(self, i):
+        return self.blob[i * self.size:(i + 1) * self.size]
+
+
+class CompactMap:
+    """Read-only Scilla map with sorted keys and compact values.
+    ByStr20 keys are packed 20 bytes each, Uint32/64/128 values are kept
+    in a QaArray, other values in a list.
+    """
+    __slots__ = ("key_type", "value_type", "_keys", "_values")
+
+    def __init__(self, key_type, value_type, keys, values):
+        self.key_type = key_type
+        self.value_type = value_type
+        self._keys = keys
+        self._values = values
+
+    @classmethod
+    def from_json(cls, key_type, value_type, value: Dict) -> "CompactMap":
+        if key_type == "ByStr20":
+            items = sorted((_decode_address(k), v) for k, v in value.items())
+            keys = _FixedKeys(b"".join(k for k, _ in items), 20)
+        else:
+            items = sorted((decode_typed_value(key_type, k), v) for k, v in value.items())
+            keys = [k for k, _ in items]
+
+        if _is_uint(value_type):
+            values = QaArray(int(v) for _, v in items)
+        else:
+            values = [decode_typed_value(value_type, v) for _, v in items]
+        return cls(key_type, value_type, keys, values)
+
+    def _index(self, key) -> int:
+        if self.key_type == "ByStr20":
+            key = _decode_address(key) if not isinstance(key, bytes) else key
+        else:
+            key = decode_typed_value(self.key_type, key)
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return i
+        return -1
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return self._index(key) >= 0
+
+    def __getitem__(self, key):
+        i = self._index(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._values[i]
+
+    def get(self, key, default=None):
+        i = self._index(key)
+        return self._values[i] if i >= 0 else default
+
+    def keys(self) -> Iterator:
+        return (self._keys[i] for i in range(len(self._keys)))
+
+    def values(self) -> Iterator:
+        return iter(self._values)
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        return zip(self.keys(), self.values())
+
+    def top(self, n: int) -> List[Tuple[Any, Any]]:
+        """Return n items with the largest values, largest first."""
+        if isinstance(self._values, QaArray):
+            return [(self._keys[i], self._values[i]) for i in self._values.nlargest(n)]
+        return heapq.nlargest(n, self.items(), key=lambda item: item[1])
+
+    def total(self):
+        """Return sum of values."""
+        if isinstance(self._values, QaArray):
+            return int(self._values.sum())
+        return sum(self._values)
+
+
+class ContractStateView:
+    """Typed read-only view of contract state, fields are decoded on first
+    access and the json value is dropped then.
+    Fields without known type are returned as is.
+    """
+
+    def __init__(self, state, field_types: Optional[Dict[str, str]]=None):
+        field_types = dict(field_types or {})
+        if isinstance(state, list):
+            for item in state:
+                field_types.setdefault(item["vname"], item.get("type"))
+        self._raw = state_to_dict(state)
+        self._decoded = {}
+        self.field_types = {name: parse_scilla_type(vtype)
+                            for name, vtype in field_types.items() if vtype}
+
+    @classmethod
+    def from_contract(cls, contract: Contract,
+                      field_types: Optional[Dict[str, str]]=None) -> "ContractStateView":
+        """Build view of contract state, types are parsed from contract code if not given."""
+        if contract.state is None:
+            contract.get_state()
+        if field_types is None:
+            field_types = scilla_field_types(contract.code)
+        return cls(contract.state, field_types)
+
+    def __contains__(self, variable: str):
+        return variable in self._decoded or variable in self._raw
+
+    def __iter__(self):
+        return iter(self._decoded.keys() | self._raw.keys())
+
+    def __getitem__(self, variable: str):
+        if variable in self._decoded:
+            return self._decoded[variable]
+        value = self._raw[variable]
+        vtype = self.field_types.get(variable)
+        if vtype is not None:
+            value = decode_typed_value(vtype, value)
+        self._decoded[variable] = value
+        del self._raw[variable]
+        return value
+
+    def get(self, variable: str, default=None):
+        return self[variable] if variable in self else default
+
+    @property
+    def decoded_fields(self) -> List[str]:
+        return list(self._decoded)
+
+    def top(self, variable: str, n: int) -> List[Tuple[Any, Any]]:
+        """Return n largest entries of map field, eg. top holders of balances."""
+        value = self[variable]
+        if not isinstance(value, CompactMap):
+            raise ValueError("field {} is not a typed map".format(variable))
+        return value.top(n)
@@ -117,3 +117,71 @@ def encode(hrp, witprog):
     if decode(hrp, ret) is None:
         return None
     return ret
+
+
+# Fast codec for 20 bytes addresses with "zil" HRP.
+ZIL_HRP = "zil"
+ZIL_ADDRESS_NUM_BYTES = 20
+ZIL_DATA_LENGTH = ZIL_ADDRESS_NUM_BYTES * 8 // 5
+ZIL_BECH32_LENGTH = len(ZIL_HRP) + 1 + ZIL_DATA_LENGTH + 6
+
+_CHARSET_REV = {c: i for i, c in enumerate(CHARSET)}
+
+
+def _build_polymod_table():
+    generator = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+    table = []
+    for top in range(32):
+        chk = 0
+        for i in range(5):
+            if (top >> i) & 1:
+                chk ^= generator[i]
+        table.append(chk)
+    return tuple(table)
+
+
+POLYMOD_TABLE = _build_polymod_table()
+
+
+def polymod_step(chk, values):
+    """Continue checksum state chk with values, using table lookups."""
+    table = POLYMOD_TABLE
+    for value in values:
+        chk = ((chk & 0x1ffffff) << 5 ^ value) ^ table[chk >> 25]
+    return chk
+
+
+ZIL_HRP_POLYMOD = polymod_step(1, bech32_hrp_expand(ZIL_HRP))
+
+
+def zil_encode(address):
+    """Encode 20 bytes address to bech32 string with "zil" HRP."""
+    if len(address) != ZIL_ADDRESS_NUM_BYTES:
+        return None
+    n = int.from_bytes(address, "big")
+    data = [(n >> shift) & 31 for shift in range(155, -1, -5)]
+    polymod = polymod_step(ZIL_HRP_POLYMOD, data)
+    polymod = polymod_step(polymod, (0, 0, 0, 0, 0, 0)) ^ 1
+    checksum = [(polymod >> shift) & 31 for shift in (25, 20, 15, 10, 5, 0)]
+    return ZIL_HRP + "1" + "".join([CHARSET[d] for d in data + checksum])
+
+
+def zil_decode(bech):
+    """Decode bech32 string with "zil" HRP to 20 bytes address."""
+    if len(bech) != ZIL_BECH32_LENGTH:
+        return None
+    lower = bech.lower()
+    if lower != bech and bech.upper() != bech:
+        return None
+    if lower[:4] != "zil1":
+        return None
+    try:
+        data = [_CHARSET_REV[c] for c in lower[4:]]
+    except KeyError:
+        return None
+    if polymod_step(ZIL_HRP_POLYMOD, data) != 1:
+        return None
+    n = 0
+    for value in data[:ZIL_DATA_LENGTH]:
+        n = n << 5 | value
+    return n.to_bytes(ZIL_ADDRESS_NUM_BYTES, "big")
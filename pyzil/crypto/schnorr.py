@@ -14,7 +14,7 @@ Zilliqa schnorr signature
 
 import secrets
 import hashlib
-from typing import Optional
+from typing import Optional, List, Tuple
 
 from fastecdsa import keys
 from fastecdsa import point
@@ -109,6 +109,55 @@ def mod_sqrt(n: int, p: int, is_odd: bool) -> int:
     return y
 
 
+def batch_inverse(values: List[int], p: int) -> List[int]:
+    """Return modular inverses of non-zero values using one inversion."""
+    prefix = []
+    acc = 1
+    for v in values:
+        prefix.append(acc)
+        acc = acc * v % p
+    inv = pow(acc, p - 2, p)
+    result = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        result[i] = prefix[i] * inv % p
+        inv = inv * values[i] % p
+    return result
+
+
+def batch_add(base: Tuple[int, int],
+              points: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Return affine (x, y) of base + P for all points, with one inversion."""
+    p = CURVE.p
+    bx, by = base
+    diffs = [(x - bx) % p for x, _ in points]
+    if 0 in diffs:
+        # doubling or point at infinity, rare enough to do it point by point
+        base_point = point.Point(bx, by, CURVE)
+        results = []
+        for x, y in points:
+            q = base_point + point.Point(x, y, CURVE)
+            results.append((q.x, q.y))
+        return results
+
+    results = []
+    for (x, y), inv in zip(points, batch_inverse(diffs, p)):
+        slope = (y - by) * inv % p
+        x3 = (slope * slope - bx - x) % p
+        results.append((x3, (slope * (bx - x3) - by) % p))
+    return results
+
+
+def multiples(q: Tuple[int, int], n: int) -> List[Tuple[int, int]]:
+    """Return affine (x, y) of [Q, 2Q, ..., nQ]."""
+    q_point = point.Point(q[0], q[1], CURVE)
+    double = q_point + q_point
+    results = [q, (double.x, double.y)][:n]
+    while len(results) < n:
+        m = len(results)
+        results.extend(batch_add(results[-1], results[:min(m - 1, n - m)]))
+    return results
+
+
 def sign(bytes_msg: bytes, bytes_private: bytes, retries=10) -> Optional[bytes]:
     """sign bytes message with private key."""
     for i in range(retries):
@@ -13,8 +13,12 @@ crypto tools
 """
 
 import hmac
+import json
+import time
 import hashlib
-from typing import Union
+import threading
+from typing import Union, Optional, List
+from collections import OrderedDict, namedtuple
 
 from Crypto.Cipher import AES
 
@@ -41,11 +45,108 @@ def compare_digest(a, b) -> bool:
     return hmac.compare_digest(a, b)
 
 
+class DerivedKeyCache:
+    """Bounded in-memory cache of derived keys with TTL.
+
+    Entries are keyed by hmac digest of (password, kdf, kdfparams) with a
+    random per-process secret, cached keys are zeroed when evicted.
+    """
+    def __init__(self, max_size: int=32, ttl: float=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._secret = utils.rand_bytes(32)
+        self._keys = OrderedDict()    # type: OrderedDict[bytes, tuple]
+        self._lock = threading.Lock()
+
+    def _digest(self, password: bytes, kdf_method: str, params: dict) -> bytes:
+        params = dict(params)
+        if isinstance(params.get("salt"), bytes):
+            params["salt"] = utils.bytes_to_hex_str(params["salt"])
+        msg = json.dumps([kdf_method, params], sort_keys=True).encode()
+        return hmac.new(self._secret, msg + b"\x00" + password,
+                        digestmod=hashlib.sha256).digest()
+
+    @staticmethod
+    def _zeroise(key: bytearray) -> None:
+        for i in range(len(key)):
+            key[i] = 0
+
+    def _evict_expired(self, now: float) -> None:
+        for digest in [d for d, (_, expire) in self._keys.items() if expire <= now]:
+            self._zeroise(self._keys.pop(digest)[0])
+
+    def get(self, password: bytes, kdf_method: str, params: dict) -> Optional[bytes]:
+        """Return cached derived key, None if not cached or expired."""
+        digest = self._digest(password, kdf_method, params)
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            entry = self._keys.get(digest)
+            if entry is None:
+                return None
+            self._keys.move_to_end(digest)
+            return bytes(entry[0])
+
+    def put(self, password: bytes, kdf_method: str, params: dict,
+            derived_key: bytes) -> None:
+        digest = self._digest(password, kdf_method, params)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            old = self._keys.pop(digest, None)
+            if old is not None:
+                self._zeroise(old[0])
+            self._keys[digest] = (bytearray(derived_key), now + self.ttl)
+            while len(self._keys) > self.max_size:
+                self._zeroise(self._keys.popitem(last=False)[1][0])
+
+    def clear(self) -> None:
+        """Zero and remove all cached keys."""
+        with self._lock:
+            for key, _ in self._keys.values():
+                self._zeroise(key)
+            self._keys.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)
+
+
+derived_key_cache = None    # type: Optional[DerivedKeyCache]
+
+
+def enable_derived_key_cache(max_size: int=32, ttl: float=300) -> DerivedKeyCache:
+    """Cache derived keys of gen_derived_key in memory, disabled by default."""
+    global derived_key_cache
+    disable_derived_key_cache()
+    derived_key_cache = DerivedKeyCache(max_size=max_size, ttl=ttl)
+    return derived_key_cache
+
+
+def disable_derived_key_cache() -> None:
+    global derived_key_cache
+    if derived_key_cache is not None:
+        derived_key_cache.clear()
+    derived_key_cache = None
+
+
 def gen_derived_key(password: Union[str, bytes],
                     kdf_method: str, params: dict) -> bytes:
     """Generate derived key bytes using pbkdf2 or scrypt."""
     if isinstance(password, str):
         password = password.encode()
+
+    cache = derived_key_cache
+    if cache is None:
+        return _gen_derived_key(password, kdf_method, params)
+
+    derived_key = cache.get(password, kdf_method, params)
+    if derived_key is None:
+        derived_key = _gen_derived_key(password, kdf_method, params)
+        cache.put(password, kdf_method, params, derived_key)
+    return derived_key
+
+
+def _gen_derived_key(password: bytes, kdf_method: str, params: dict) -> bytes:
     salt = params["salt"]
     if isinstance(salt, str):
         salt = utils.hex_str_to_bytes(salt)
@@ -57,13 +158,75 @@ def gen_derived_key(password: Union[str, bytes],
             "sha256", password, salt, count, dklen=dklen
         )
     elif kdf_method == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
         return hashlib.scrypt(
-            password, salt,
-            params["n"], params["r"], params["p"],
+            password, salt=salt, n=n, r=r, p=p,
+            maxmem=max(SCRYPT_DEFAULT_MAXMEM, scrypt_memory(n, r, p) + SCRYPT_MAXMEM_SLACK),
             dklen=dklen
         )
     else:
-        raise NotImplemented("unsupported kdf method")
+        raise ValueError("unsupported kdf method")
+
+
+# kdf params calibration
+DEFAULT_KDF_PARAMS = {"n": 8192, "c": 262144, "r": 8, "p": 1, "dklen": 32}
+
+PBKDF2_MIN_COUNT = 1 << 14
+SCRYPT_MIN_N = 1 << 12
+SCRYPT_DEFAULT_MAXMEM = 32 * 1024 * 1024
+SCRYPT_MAXMEM_SLACK = 1024 * 1024
+
+KdfBenchmark = namedtuple("KdfBenchmark", ["kdf_method", "params", "seconds", "memory"])
+
+
+def scrypt_memory(n: int, r: int, p: int) -> int:
+    """Return bytes of memory used by scrypt."""
+    return 128 * r * (n + p + 2)
+
+
+def benchmark_kdf(kdf_method: str, params: dict, rounds: int=1) -> KdfBenchmark:
+    """Return average time of deriving a key with params on this machine."""
+    params = dict(DEFAULT_KDF_PARAMS, **params)
+    params.setdefault("salt", utils.rand_bytes(32))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        _gen_derived_key(b"benchmark", kdf_method, params)
+    seconds = (time.perf_counter() - start) / rounds
+
+    memory = 0
+    if kdf_method == "scrypt":
+        memory = scrypt_memory(params["n"], params["r"], params["p"])
+    params.pop("salt")
+    return KdfBenchmark(kdf_method, params, seconds, memory)
+
+
+def benchmark_kdf_report(param_sets: List[dict], kdf_method: str="pbkdf2",
+                         rounds: int=1) -> List[KdfBenchmark]:
+    """Return unlock time of each params set."""
+    return [benchmark_kdf(kdf_method, params, rounds=rounds) for params in param_sets]
+
+
+def calibrate_kdf(kdf_method: str="pbkdf2", target_time: float=0.5,
+                  max_memory: int=64 * 1024 * 1024, r: int=8, p: int=1,
+                  dklen: int=32) -> dict:
+    """Return kdf params that take about target_time seconds to unlock on
+    this machine, scrypt uses no more than max_memory bytes.
+    """
+    if kdf_method == "pbkdf2":
+        probe = benchmark_kdf(kdf_method, {"c": PBKDF2_MIN_COUNT, "dklen": dklen})
+        count = int(PBKDF2_MIN_COUNT * target_time / max(probe.seconds, 1e-6))
+        return dict(DEFAULT_KDF_PARAMS, c=max(count, PBKDF2_MIN_COUNT), dklen=dklen)
+
+    if kdf_method == "scrypt":
+        probe = benchmark_kdf(kdf_method, {"n": SCRYPT_MIN_N, "r": r, "p": p, "dklen": dklen})
+        per_n = max(probe.seconds, 1e-6) / SCRYPT_MIN_N
+        n = SCRYPT_MIN_N
+        while (n * 2 * per_n <= target_time and
+               scrypt_memory(n * 2, r, p) <= max_memory):
+            n *= 2
+        return dict(DEFAULT_KDF_PARAMS, n=n, r=r, p=p, dklen=dklen)
+
+    raise ValueError("unsupported kdf method")
 
 
 def aes_ctr_decrypt(key: bytes, initial_value: bytes,
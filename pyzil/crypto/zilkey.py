@@ -12,10 +12,18 @@ Zilliqa Key
 :license: MIT License, see LICENSE for more details.
 """
 
+import os
 import json
+import time
 import uuid
-from typing import Union, Optional
-from collections import namedtuple
+import queue
+import hashlib
+import threading
+import multiprocessing
+from typing import Union, Optional, Iterable, Iterator, List, Tuple, Callable
+from collections import namedtuple, OrderedDict
+from concurrent import futures
+from concurrent.futures import ProcessPoolExecutor
 
 from pyzil.common import utils
 from pyzil.crypto import tools, schnorr, bech32
@@ -40,29 +48,26 @@ def is_valid_address(address: str) -> bool:
     return True
 
 
-def to_valid_address(address: str) -> Optional[str]:
-    """Return lower case address if address is valid."""
-    if is_bech32_address(address):
-        address = from_bech32_address(address)
+def _parse_address(address: str) -> Optional[bytes]:
+    """Return 20 bytes of bech32 or hex address, None if invalid."""
+    if address.startswith("zil1"):
+        return bech32.zil_decode(address)
 
-    if not is_valid_address(address):
-        return None
-    address = address.lower()
-    if address.startswith("0x"):
+    if address[:2] in ("0x", "0X"):
         address = address[2:]
-    return address
-
-
-def to_checksum_address(address: str, prefix="0x") -> Optional[str]:
-    """Convert address to checksum address."""
-    if is_bech32_address(address):
-        address = from_bech32_address(address)
-
-    if not is_valid_address(address):
+    if len(address) != ADDRESS_STR_LENGTH:
         return None
+    try:
+        address_bytes = bytes.fromhex(address)
+    except ValueError:
+        return None
+    if len(address_bytes) != ADDRESS_NUM_BYTES:
+        return None
+    return address_bytes
 
-    address = address.lower().replace("0x", "")
-    address_bytes = utils.hex_str_to_bytes(address)
+
+def _checksum_from_bytes(address_bytes: bytes, prefix="0x") -> str:
+    address = utils.bytes_to_hex_str(address_bytes)
     v = utils.bytes_to_int(tools.hash256_bytes(address_bytes))
 
     checksum_address = prefix
@@ -77,47 +82,268 @@ def to_checksum_address(address: str, prefix="0x") -> Optional[str]:
     return checksum_address
 
 
+# memoized address forms
+AddressForms = namedtuple("AddressForms", ["address", "checksum_address", "bech32_address"])
+AddressCacheInfo = namedtuple("AddressCacheInfo", ["hits", "misses", "evictions", "size", "max_size"])
+
+ADDRESS_CACHE_MAX_ITEMS = 4096
+
+
+class AddressCache:
+    """Thread-safe LRU cache of 20 bytes address to its address forms."""
+    def __init__(self, max_size: int=ADDRESS_CACHE_MAX_ITEMS):
+        self.max_size = max_size
+        self._forms = OrderedDict()    # type: OrderedDict[bytes, AddressForms]
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, address_bytes: bytes) -> AddressForms:
+        """Return lower case, checksum and bech32 forms of address."""
+        with self._lock:
+            forms = self._forms.get(address_bytes)
+            if forms is not None:
+                self._forms.move_to_end(address_bytes)
+                self._hits += 1
+                return forms
+            self._misses += 1
+
+        forms = AddressForms(
+            utils.bytes_to_hex_str(address_bytes),
+            _checksum_from_bytes(address_bytes),
+            bech32.zil_encode(address_bytes),
+        )
+        if self.max_size <= 0:
+            return forms
+
+        with self._lock:
+            self._forms[address_bytes] = forms
+            while len(self._forms) > self.max_size:
+                self._forms.popitem(last=False)  # remove last recently accessed
+                self._evictions += 1
+        return forms
+
+    def info(self) -> AddressCacheInfo:
+        """Return cache statistics."""
+        with self._lock:
+            return AddressCacheInfo(self._hits, self._misses, self._evictions,
+                                    len(self._forms), self.max_size)
+
+    def clear(self) -> None:
+        """Remove all cached addresses and reset statistics."""
+        with self._lock:
+            self._forms.clear()
+            self._hits = self._misses = self._evictions = 0
+
+
+address_cache = AddressCache()
+
+
+def address_forms(address: str) -> Optional[AddressForms]:
+    """Return memoized forms of hex or bech32 address, None if invalid."""
+    address_bytes = _parse_address(address)
+    if address_bytes is None:
+        return None
+    return address_cache.get(address_bytes)
+
+
+def address_cache_info() -> AddressCacheInfo:
+    """Return hits, misses, evictions and size of the address cache."""
+    return address_cache.info()
+
+
+def clear_address_cache() -> None:
+    """Remove all cached address forms and reset statistics."""
+    address_cache.clear()
+
+
+def to_valid_address(address: str) -> Optional[str]:
+    """Return lower case address if address is valid."""
+    forms = address_forms(address)
+    return forms and forms.address
+
+
+def to_address_bytes(address: str) -> Optional[bytes]:
+    """Return 20 bytes of hex or bech32 address without caching its forms,
+    None if invalid.
+    """
+    return _parse_address(address)
+
+
+def to_checksum_address(address: str, prefix="0x") -> Optional[str]:
+    """Convert address to checksum address."""
+    forms = address_forms(address)
+    if forms is None:
+        return None
+    if prefix == "0x":
+        return forms.checksum_address
+    return prefix + forms.checksum_address[2:]
+
+
 def is_valid_checksum_address(address: str) -> bool:
     """Return True if address is valid checksum address."""
-    if not is_valid_address(address):
+    if address.startswith("zil1"):
         return False
-    return to_checksum_address(address) == address
+    forms = address_forms(address)
+    return forms is not None and forms.checksum_address == address
 
 
 def to_bech32_address(address: str) -> Optional[str]:
     """Convert 20 bytes address to bech32 address."""
-    if not is_valid_address(address):
+    if address.startswith("zil1"):
         return None
-    return bech32.encode("zil", utils.hex_str_to_bytes(address))
+    forms = address_forms(address)
+    return forms and forms.bech32_address
 
 
 def from_bech32_address(bech32_address: str) -> Optional[str]:
     """Convert bech32 address to 20 bytes address."""
-    data = bech32.decode("zil", bech32_address)
+    data = bech32.zil_decode(bech32_address)
     if data is None:
         return None
-    address = utils.bytes_to_hex_str(bytes(data))
-    return to_valid_address(address)
+    return address_cache.get(data).address
 
 
 def is_bech32_address(bech32_address: str) -> bool:
     """Return True if address is valid bech32 address."""
     if not bech32_address.startswith("zil1"):
         return False
-    return from_bech32_address(bech32_address) is not None
+    return bech32.zil_decode(bech32_address) is not None
 
 
 def normalise_address(address: str) -> str:
     """Check address format, return checksum address."""
-    if is_bech32_address(address):
-        address = from_bech32_address(address)
-        if not address:
-            raise ValueError("Invalid address format")
-        return to_checksum_address(address)
-
-    if not is_valid_checksum_address(address):
+    forms = address_forms(address)
+    if forms is None:
         raise ValueError("Invalid address format")
-    return address
+    if address.startswith("zil1") or forms.checksum_address == address:
+        return forms.checksum_address
+    raise ValueError("Invalid address format")
+
+
+def address_from_public_key(public_key: Union[str, bytes]) -> str:
+    """Return address of hex or bytes public key, compressed key is hashed directly."""
+    if isinstance(public_key, str):
+        public_key = utils.hex_str_to_bytes(public_key)
+    if len(public_key) != 33:
+        return ZilKey(public_key=public_key).address
+    return hashlib.sha256(public_key).digest()[-ADDRESS_NUM_BYTES:].hex()
+
+
+def contract_address(sender_address: str, nonce: int) -> str:
+    """Return address of contract deployed by sender, nonce is the nonce of
+    sender account before the deploy transaction (deploy txn nonce - 1).
+    """
+    address_bytes = _parse_address(sender_address)
+    if address_bytes is None:
+        raise ValueError("Invalid address format")
+    digest = hashlib.sha256(address_bytes + nonce.to_bytes(8, "big")).digest()
+    return digest[-ADDRESS_NUM_BYTES:].hex()
+
+
+# bulk address conversion
+BulkResult = namedtuple("BulkResult", ["results", "errors"])
+
+BULK_CHUNK_SIZE = 10000
+BULK_PARALLEL_MIN_SIZE = 50000
+
+
+def _bulk_to_checksum(address: str) -> Optional[str]:
+    address_bytes = _parse_address(address)
+    return address_bytes and _checksum_from_bytes(address_bytes)
+
+
+def _bulk_to_bech32(address: str) -> Optional[str]:
+    if address.startswith("zil1"):
+        return None
+    address_bytes = _parse_address(address)
+    return address_bytes and bech32.zil_encode(address_bytes)
+
+
+def _bulk_from_bech32(address: str) -> Optional[str]:
+    if not address.startswith("zil1"):
+        return None
+    address_bytes = _parse_address(address)
+    return address_bytes and utils.bytes_to_hex_str(address_bytes)
+
+
+def _bulk_normalise(address: str) -> Optional[str]:
+    address_bytes = _parse_address(address)
+    if not address_bytes:
+        return None
+    checksum_address = _checksum_from_bytes(address_bytes)
+    if address.startswith("zil1") or checksum_address == address:
+        return checksum_address
+    return None
+
+
+_BULK_CONVERTERS = {
+    "to_checksum": _bulk_to_checksum,
+    "to_bech32": _bulk_to_bech32,
+    "from_bech32": _bulk_from_bech32,
+    "normalise": _bulk_normalise,
+}
+
+
+def _bulk_convert_chunk(converter: str, addresses: List[str]) -> List[Optional[str]]:
+    func = _BULK_CONVERTERS[converter]
+    results = []
+    for address in addresses:
+        try:
+            results.append(func(address))
+        except (TypeError, AttributeError):
+            results.append(None)
+    return results
+
+
+def _bulk_convert(converter: str, addresses: Iterable[str],
+                  workers: Optional[int]=None,
+                  chunk_size: int=BULK_CHUNK_SIZE) -> BulkResult:
+    addresses = list(addresses)
+    if workers == 1 or (workers is None and len(addresses) < BULK_PARALLEL_MIN_SIZE):
+        results = _bulk_convert_chunk(converter, addresses)
+    else:
+        chunks = [addresses[i:i + chunk_size]
+                  for i in range(0, len(addresses), chunk_size)]
+        results = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk_results in pool.map(_bulk_convert_chunk,
+                                          [converter] * len(chunks), chunks):
+                results.extend(chunk_results)
+
+    errors = [r is None for r in results]
+    return BulkResult(results, errors)
+
+
+def to_checksum_addresses(addresses: Iterable[str], workers: Optional[int]=None,
+                          chunk_size: int=BULK_CHUNK_SIZE) -> BulkResult:
+    """Convert hex or bech32 addresses to checksum addresses."""
+    return _bulk_convert("to_checksum", addresses, workers, chunk_size)
+
+
+def to_bech32_addresses(addresses: Iterable[str], workers: Optional[int]=None,
+                        chunk_size: int=BULK_CHUNK_SIZE) -> BulkResult:
+    """Convert 20 bytes addresses to bech32 addresses."""
+    return _bulk_convert("to_bech32", addresses, workers, chunk_size)
+
+
+def from_bech32_addresses(addresses: Iterable[str], workers: Optional[int]=None,
+                          chunk_size: int=BULK_CHUNK_SIZE) -> BulkResult:
+    """Convert bech32 addresses to 20 bytes addresses."""
+    return _bulk_convert("from_bech32", addresses, workers, chunk_size)
+
+
+def normalise_addresses(addresses: Iterable[str], workers: Optional[int]=None,
+                        chunk_size: int=BULK_CHUNK_SIZE) -> BulkResult:
+    """Check addresses format, return checksum addresses.
+
+    Return BulkResult of results and error mask, invalid addresses get None
+    in results and True in errors. With workers=None, inputs of
+    BULK_PARALLEL_MIN_SIZE or more addresses are converted in chunks by a
+    process pool, workers=1 disables the pool.
+    """
+    return _bulk_convert("normalise", addresses, workers, chunk_size)
 
 
 KeyPair = namedtuple("KeyPair", ["public", "private"])
@@ -278,22 +504,18 @@ class ZilKey:
         return zilkey
 
     def save_keystore(self, password: str, kdf_method: str="pbkdf2",
-                      keystore_file=None) -> dict:
+                      keystore_file=None, kdfparams: Optional[dict]=None) -> dict:
         """Save Zilliqa key to keystore, format details on
         https://github.com/ethereum/wiki/wiki/Web3-Secret-Storage-Definition.
+
+        kdfparams overrides the default n/c/r/p, see tools.calibrate_kdf.
         """
         address = self.address
         cipher = "aes-128-ctr"
         salt = utils.rand_bytes(32)
         iv = utils.rand_bytes(16)
-        kdfparams = {
-            "salt": utils.bytes_to_hex_str(salt),
-            "n": 8192,
-            "c": 262144,
-            "r": 8,
-            "p": 1,
-            "dklen": 32
-        }
+        kdfparams = dict(tools.DEFAULT_KDF_PARAMS, **(kdfparams or {}))
+        kdfparams["salt"] = utils.bytes_to_hex_str(salt)
         derived_key = tools.gen_derived_key(password, kdf_method, kdfparams)
 
         key = derived_key[:16]
@@ -327,3 +549,287 @@ class ZilKey:
             with open(keystore_file, "w") as f:
                 json.dump(keystore, f)
         return keystore
+
+
+# vanity address search
+VanityProgress = namedtuple("VanityProgress", ["checked", "seconds", "rate"])
+
+VANITY_BATCH_SIZE = 1024
+VANITY_POLL_INTERVAL = 0.1
+
+
+def vanity_range(pattern: str) -> Tuple[bytes, Optional[bytes]]:
+    """Return [low, high) range of 20 bytes addresses matching pattern.
+
+    pattern is a hex prefix of address (with or without 0x) or a bech32
+    prefix starting with "zil1", high is None if range is not bounded.
+    """
+    if pattern.startswith("zil1"):
+        chars, alphabet, bits = pattern[4:].lower(), bech32.CHARSET, 5
+    else:
+        chars = pattern[2:] if pattern[:2] in ("0x", "0X") else pattern
+        chars, alphabet, bits = chars.lower(), "0123456789abcdef", 4
+
+    if len(chars) * bits > ADDRESS_NUM_BYTES * 8:
+        raise ValueError("pattern is too long")
+    value = 0
+    for c in chars:
+        if c not in alphabet:
+            raise ValueError("invalid char in pattern: {}".format(c))
+        value = value << bits | alphabet.index(c)
+
+    shift = ADDRESS_NUM_BYTES * 8 - len(chars) * bits
+    low = value << shift
+    high = (value + 1) << shift
+    if high >> (ADDRESS_NUM_BYTES * 8):
+        return low.to_bytes(ADDRESS_NUM_BYTES, "big"), None
+    return low.to_bytes(ADDRESS_NUM_BYTES, "big"), high.to_bytes(ADDRESS_NUM_BYTES, "big")
+
+
+def _vanity_worker(low: bytes, high: Optional[bytes], batch: int,
+                   stop_event, counter, results) -> None:
+    sha256 = hashlib.sha256
+    G = schnorr.CURVE.G
+    while not stop_event.is_set():
+        private_key = schnorr.gen_private_key()
+        if private_key + batch >= schnorr.CURVE.q:
+            continue
+        # step public key by G instead of a new scalar multiplication
+        pub_key = schnorr.get_public_key(private_key)
+        for i in range(batch):
+            tag = b"\x03" if pub_key.y & 1 else b"\x02"
+            address = sha256(tag + pub_key.x.to_bytes(32, "big")).digest()[-ADDRESS_NUM_BYTES:]
+            if low <= address and (high is None or address < high):
+                results.put(private_key + i)
+                return
+            pub_key = pub_key + G
+        with counter.get_lock():
+            counter.value += batch
+
+
+def search_vanity(pattern: str, workers: Optional[int]=None,
+                  timeout: Optional[float]=None,
+                  progress: Optional[Callable[[VanityProgress], None]]=None,
+                  progress_interval: float=1.0,
+                  cancel: Optional[threading.Event]=None,
+                  batch: int=VANITY_BATCH_SIZE) -> Optional["ZilKey"]:
+    """Search key whose address matches hex or bech32 prefix pattern.
+
+    Run workers processes, call progress every progress_interval seconds.
+    Return None if timeout or cancel is set before a key is found.
+    """
+    low, high = vanity_range(pattern)
+    workers = workers or os.cpu_count() or 1
+
+    ctx = multiprocessing.get_context()
+    stop_event = ctx.Event()
+    counter = ctx.Value("Q", 0)
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=_vanity_worker,
+                    args=(low, high, batch, stop_event, counter, results),
+                    daemon=True)
+        for _ in range(workers)
+    ]
+    for p in processes:
+        p.start()
+
+    private_key = None
+    start = last_progress = time.time()
+    try:
+        while private_key is None:
+            try:
+                private_key = results.get(timeout=VANITY_POLL_INTERVAL)
+                break
+            except queue.Empty:
+                pass
+
+            now = time.time()
+            if progress and now - last_progress >= progress_interval:
+                last_progress = now
+                checked = counter.value
+                progress(VanityProgress(checked, now - start, checked / (now - start)))
+            if cancel is not None and cancel.is_set():
+                break
+            if timeout is not None and now - start >= timeout:
+                break
+    finally:
+        stop_event.set()
+        for p in processes:
+            p.join(timeout=1)
+            if p.is_alive():
+                p.terminate()
+
+    if private_key is None:
+        return None
+
+    zil_key = ZilKey(private_key=utils.int_to_bytes(private_key))
+    address = utils.hex_str_to_bytes(zil_key.address)
+    assert low <= address and (high is None or address < high)
+    return zil_key
+
+
+# bulk key generation
+GeneratedKey = namedtuple("GeneratedKey", ["address", "public", "private"])
+
+KEYGEN_BATCH_SIZE = 256
+
+
+def _generate_key_batch(count: int) -> List[GeneratedKey]:
+    """Generate count keys as k + j * d, with random k and d per batch.
+
+    Public keys are stepped by D = d * G with batched affine additions.
+    Keys of a batch are related: a single leaked key reveals nothing, but
+    any two leaked keys of the same batch give d and k, exposing every key
+    of the batch. Batches are independent of each other.
+    """
+    order = schnorr.CURVE.q
+    sha256 = hashlib.sha256
+    while True:
+        private_key = schnorr.gen_private_key()
+        step = schnorr.gen_private_key()
+        private_keys = [(private_key + j * step) % order for j in range(count)]
+        if all(private_keys):
+            break
+
+    pub_key = schnorr.get_public_key(private_key)
+    base = (pub_key.x, pub_key.y)
+    step_key = schnorr.get_public_key(step)
+    pub_keys = [base]
+    if count > 1:
+        pub_keys += schnorr.batch_add(base, schnorr.multiples((step_key.x, step_key.y), count - 1))
+
+    keys = []
+    for private_key, (x, y) in zip(private_keys, pub_keys):
+        public = (b"\x03" if y & 1 else b"\x02") + x.to_bytes(32, "big")
+        address = sha256(public).digest()[-ADDRESS_NUM_BYTES:]
+        keys.append(GeneratedKey(address.hex(), public.hex(), private_key.to_bytes(32, "big").hex()))
+    return keys
+
+
+def generate_keys(count: int, workers: Optional[int]=1,
+                  batch: int=KEYGEN_BATCH_SIZE) -> Iterable[GeneratedKey]:
+    """Generate count keys, yield GeneratedKey(address, public, private)
+    in hex strings, same format as ZilKey.address and ZilKey.keypair_str.
+
+    Batches of keys are generated by a process pool if workers is not 1.
+    Keys of a batch are linearly related (see _generate_key_batch), use
+    batch=1 if keys are handed to different parties.
+    """
+    batches = [min(batch, count - i) for i in range(0, count, batch)]
+    if workers == 1:
+        for n in batches:
+            yield from _generate_key_batch(n)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for keys in pool.map(_generate_key_batch, batches):
+            yield from keys
+
+
+def generate_keys_to_file(key_file: str, count: int, workers: Optional[int]=1,
+                          batch: int=KEYGEN_BATCH_SIZE) -> int:
+    """Generate count keys, write lines of "address public private" to
+    key_file (created with 0600 permission), return number of keys written.
+    """
+    fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    n_keys = 0
+    with open(fd, "w") as f:
+        for key in generate_keys(count, workers=workers, batch=batch):
+            f.write("{} {} {}\n".format(key.address, key.public, key.private))
+            n_keys += 1
+    return n_keys
+
+
+# bulk keystore load/save
+KeystoreResult = namedtuple("KeystoreResult", ["keystore_file", "zil_key", "error"])
+
+
+def _load_keystore_worker(password: str, keystore_file: str) -> KeyPair:
+    return ZilKey.load_keystore(password, keystore_file).keypair_bytes
+
+
+def _save_keystore_worker(private_key: bytes, password: str,
+                          kdf_method: str, kdfparams: Optional[dict],
+                          keystore_file: str) -> None:
+    ZilKey(private_key=private_key).save_keystore(
+        password, kdf_method=kdf_method,
+        keystore_file=keystore_file, kdfparams=kdfparams
+    )
+
+
+def _get_password(password_provider: Union[str, Callable[[str], str]],
+                  keystore_file: str) -> str:
+    if callable(password_provider):
+        return password_provider(keystore_file)
+    return password_provider
+
+
+def _run_keystore_tasks(tasks: List[Tuple[str, Callable, tuple]],
+                        workers: Optional[int]) -> Iterator[Tuple[str, object, Optional[Exception]]]:
+    if workers == 1:
+        for keystore_file, func, args in tasks:
+            try:
+                yield keystore_file, func(*args), None
+            except Exception as e:
+                yield keystore_file, None, e
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        all_tasks = {
+            pool.submit(func, *args): keystore_file
+            for keystore_file, func, args in tasks
+        }
+        for future in futures.as_completed(all_tasks):
+            keystore_file = all_tasks[future]
+            try:
+                yield keystore_file, future.result(), None
+            except Exception as e:
+                yield keystore_file, None, e
+
+
+def load_keystores(keystore_files: Iterable[str],
+                   password_provider: Union[str, Callable[[str], str]],
+                   workers: Optional[int]=None) -> Iterator[KeystoreResult]:
+    """Load keystore files in a process pool, yield KeystoreResult as each
+    finishes, error is the exception raised for a failed file.
+
+    password_provider is a password or a callable taking keystore file,
+    an exception raised by it fails that file only.
+    """
+    tasks = []
+    for keystore_file in keystore_files:
+        try:
+            password = _get_password(password_provider, keystore_file)
+        except Exception as e:
+            yield KeystoreResult(keystore_file, None, e)
+            continue
+        tasks.append((keystore_file, _load_keystore_worker, (password, keystore_file)))
+
+    for keystore_file, keypair, error in _run_keystore_tasks(tasks, workers):
+        zil_key = keypair and ZilKey(public_key=keypair.public, private_key=keypair.private)
+        yield KeystoreResult(keystore_file, zil_key, error)
+
+
+def save_keystores(zil_keys: Iterable[Tuple["ZilKey", str]],
+                   password_provider: Union[str, Callable[[str], str]],
+                   kdf_method: str="pbkdf2", kdfparams: Optional[dict]=None,
+                   workers: Optional[int]=None) -> Iterator[KeystoreResult]:
+    """Save (zil_key, keystore_file) pairs in a process pool, yield
+    KeystoreResult as each finishes, a failed password lookup fails
+    that file only.
+    """
+    tasks = []
+    keys_by_file = {}
+    for zil_key, keystore_file in zil_keys:
+        try:
+            password = _get_password(password_provider, keystore_file)
+        except Exception as e:
+            yield KeystoreResult(keystore_file, zil_key, e)
+            continue
+        keys_by_file[keystore_file] = zil_key
+        args = (zil_key.encoded_private_key, password, kdf_method, kdfparams, keystore_file)
+        tasks.append((keystore_file, _save_keystore_worker, args))
+
+    for keystore_file, _, error in _run_keystore_tasks(tasks, workers):
+        yield KeystoreResult(keystore_file, keys_by_file[keystore_file], error)
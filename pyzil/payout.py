@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+"""
+pyzil.payout
+~~~~~~~~~~~~
+
+Streaming payout runner with write-ahead checkpoint.
+
+:copyright: (c) 2019 by Gully Chen.
+:license: MIT License, see LICENSE for more details.
+"""
+
+import os
+import csv
+import json
+import time
+from typing import Iterable, Iterator, Optional, Callable, Tuple, Dict
+from concurrent.futures import ThreadPoolExecutor
+
+from pyzil.account import Account, check_transfer
+from pyzil.zilliqa.chain import active_chain
+from pyzil.zilliqa.units import Qa, Zil
+
+
+PAYOUT_CHUNK_SIZE = 500
+
+STATUS_SIGNED = "signed"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+STATUS_INVALID = "invalid"
+
+
+def read_recipients(recipients_file: str, fmt: Optional[str]=None,
+                    unit: str="zil") -> Iterator[Tuple[str, object]]:
+    """Read (to_addr, amount) from csv or jsonl file incrementally.
+    csv rows are "address,amount" with an optional header,
+    jsonl lines are {"address": ..., "amount": ...}.
+    unit is "zil" or "qa", amounts are returned as Zil or Qa.
+    Malformed rows are yielded with amount None, so that row indexes
+    stay the same when the file is fixed.
+    """
+    if fmt is None:
+        fmt = "jsonl" if recipients_file.lower().endswith((".jsonl", ".json")) else "csv"
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError("invalid recipients format: {}".format(fmt))
+    if unit not in ("zil", "qa"):
+        raise ValueError("invalid amount unit: {}".format(unit))
+    convert = Zil if unit == "zil" else (lambda amount: Qa(int(amount)))
+
+    def to_amount(amount):
+        try:
+            return convert(amount)
+        except (TypeError, ValueError):
+            return None
+
+    with open(recipients_file, "r", newline="") as f:
+        if fmt == "csv":
+            for n, row in enumerate(csv.reader(f)):
+                if not row or not "".join(row).strip():
+                    continue
+                if n == 0 and row[0].strip().lower() in ("address", "to_addr", "to"):
+                    continue
+                if len(row) < 2:
+                    yield row[0].strip(), None
+                    continue
+                yield row[0].strip(), to_amount(row[1].strip())
+        else:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    yield None, None
+                    continue
+                if not isinstance(item, dict):
+                    yield None, None
+                    continue
+                to_addr = item.get("address", item.get("to_addr"))
+                amount = item.get("amount", item.get("zils"))
+                yield to_addr, to_amount(amount)
+
+
+class PayoutStats:
+    """Counters and throughput of a payout run."""
+    __slots__ = ("total", "sent", "failed", "skipped", "invalid", "amount_sent",
+                 "started", "elapsed")
+
+    def __init__(self):
+        self.total = 0
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.amount_sent = 0
+        self.started = time.time()
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return ("<PayoutStats: total {} sent {} failed {} skipped {} invalid {} "
+                "amount {} Qa, {:.2f} txn/s>").format(
+            self.total, self.sent, self.failed, self.skipped, self.invalid,
+            self.amount_sent, self.rate
+        )
+
+    @property
+    def rate(self) -> float:
+        """Sent transactions per second."""
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class PayoutCheckpoint:
+    """Append-only jsonl log of payout records.
+
+    A "signed" record with the full CreateTransaction params is written and
+    synced before the transaction is sent, "sent" or "failed" records follow.
+    Resending the same signed params can not pay twice, because the nonce
+    is already used if the first one got through. Malformed recipients get
+    an "invalid" record and no nonce.
+    """
+
+    def __init__(self, checkpoint_file: str):
+        self.checkpoint_file = checkpoint_file
+        self.sent = set()
+        self.invalid = set()
+        self.pending = {}    # type: Dict[int, dict]
+        self.last_nonce = None
+        self._load()
+        self._file = open(checkpoint_file, "a")
+
+    def _load(self):
+        if not os.path.isfile(self.checkpoint_file):
+            return
+        with open(self.checkpoint_file, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # torn last line after crash
+                    continue
+                index, status = record["index"], record["status"]
+                if status == STATUS_SIGNED:
+                    self.pending[index] = record["params"]
+                    nonce = record["params"]["nonce"]
+                    if self.last_nonce is None or nonce > self.last_nonce:
+                        self.last_nonce = nonce
+                elif status == STATUS_SENT:
+                    self.sent.add(index)
+                    self.pending.pop(index, None)
+                elif status == STATUS_INVALID:
+                    self.invalid.add(index)
+
+    def write(self, records: Iterable[dict]) -> None:
+        for record in records:
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class PayoutRunner:
+    """Sign and send payouts in chunks with a write-ahead checkpoint.
+
+    Run again with the same recipients and checkpoint file to resume,
+    sent payouts are skipped and unconfirmed ones are resent as-is.
+    Malformed recipients are recorded as invalid and skipped, they are
+    checked again on resume and paid if fixed.
+    """
+
+    def __init__(self, account: Account, checkpoint_file: str,
+                 gas_price: Optional[int]=None, gas_limit=1,
+                 chunk_size=PAYOUT_CHUNK_SIZE, max_workers=50, retries=2,
+                 progress: Optional[Callable[[PayoutStats], None]]=None):
+        self.account = account
+        self.checkpoint_file = checkpoint_file
+        self.gas_price = gas_price
+        self.gas_limit = gas_limit
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.retries = retries
+        self.progress = progress
+        self.stats = PayoutStats()
+
+    def _send(self, index: int, params: dict) -> dict:
+        error = None
+        for _ in range(self.retries + 1):
+            try:
+                txn_info = active_chain.api.CreateTransaction(params)
+                return {"index": index, "status": STATUS_SENT, "txn_id": txn_info["TranID"]}
+            except Exception as e:
+                error = e
+        return {"index": index, "status": STATUS_FAILED, "error": str(error)}
+
+    def _send_chunk(self, pool: ThreadPoolExecutor, checkpoint: PayoutCheckpoint,
+                    chunk: Dict[int, dict]) -> None:
+        results = list(pool.map(lambda item: self._send(*item), chunk.items()))
+        checkpoint.write(results)
+
+        for result in results:
+            if result["status"] == STATUS_SENT:
+                self.stats.sent += 1
+                self.stats.amount_sent += int(chunk[result["index"]]["amount"])
+            else:
+                self.stats.failed += 1
+        self.stats.elapsed = time.time() - self.stats.started
+        if self.progress:
+            self.progress(self.stats)
+
+    def run(self, recipients: Iterable[Tuple[str, object]]) -> PayoutStats:
+        """Pay recipients of (to_addr, amount), return PayoutStats."""
+        self.stats = PayoutStats()
+        checkpoint = PayoutCheckpoint(self.checkpoint_file)
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                self._run(pool, checkpoint, recipients)
+        finally:
+            checkpoint.close()
+        self.stats.elapsed = time.time() - self.stats.started
+        return self.stats
+
+    def _run(self, pool, checkpoint, recipients):
+        nonce = self.account.get_balance_nonce()["nonce"] + 1
+        if checkpoint.last_nonce is not None:
+            nonce = max(nonce, checkpoint.last_nonce + 1)
+
+        gas_price = self.gas_price
+        if gas_price is None:
+            gas_price = self.account.get_min_gas_price(refresh=False)
+
+        def is_valid(index, to_addr, zils):
+            try:
+                check_transfer(to_addr, zils)
+            except ValueError as e:
+                self.stats.invalid += 1
+                if index not in checkpoint.invalid:
+                    invalid.append({"index": index, "status": STATUS_INVALID, "error": str(e)})
+                return False
+            return True
+
+        def iter_new():
+            for index, (to_addr, zils) in enumerate(recipients):
+                self.stats.total += 1
+                if index in checkpoint.sent:
+                    self.stats.skipped += 1
+                elif index in checkpoint.pending:
+                    resend[index] = checkpoint.pending.pop(index)
+                elif is_valid(index, to_addr, zils):
+                    # rows without a record are new, invalid ones are checked again
+                    yield index, (to_addr, zils)
+
+        resend = {}
+        invalid = []
+        new_items = iter_new()
+        while True:
+            chunk = []
+            for item in new_items:
+                chunk.append(item)
+                if len(chunk) >= self.chunk_size:
+                    break
+
+            if invalid:
+                checkpoint.write(invalid)
+                invalid = []
+
+            if resend:
+                pending, resend = resend, {}
+                self._send_chunk(pool, checkpoint, pending)
+
+            if not chunk:
+                break
+
+            signed = self.account.sign_transfers(
+                (transfer for _, transfer in chunk),
+                gas_price=gas_price, gas_limit=self.gas_limit, nonce=nonce
+            )
+            params = {index: txn.to_params() for (index, _), txn in zip(chunk, signed)}
+            nonce += len(params)
+
+            checkpoint.write(
+                {"index": index, "status": STATUS_SIGNED, "params": p}
+                for index, p in params.items()
+            )
+            self._send_chunk(pool, checkpoint, params)
+
+        # pending records of recipients not seen in this run
+        if checkpoint.pending:
+            pending, checkpoint.pending = checkpoint.pending, {}
+            self._send_chunk(pool, checkpoint, pending)
+
+
+def run_payout(account: Account, recipients_file: str,
+               checkpoint_file: Optional[str]=None, fmt: Optional[str]=None,
+               unit: str="zil", **kwargs) -> PayoutStats:
+    """Pay recipients in csv/jsonl file, checkpoint defaults to <file>.checkpoint."""
+    if checkpoint_file is None:
+        checkpoint_file = recipients_file + ".checkpoint"
+    runner = PayoutRunner(account, checkpoint_file, **kwargs)
+    return runner.run(read_recipients(recipients_file, fmt=fmt, unit=unit))
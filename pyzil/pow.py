@@ -13,18 +13,35 @@ This module implements Zilliqa PoW methods
 """
 
 
-from typing import List, Tuple, Optional, Union
+import os
+import mmap
+import array
+import struct
+import sys
+import tempfile
+import threading
+from typing import List, Dict, Tuple, Optional, Union, Callable, Sequence
+from functools import lru_cache
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 from pyzil.common import utils
 
 from pyethash import (
     EPOCH_LENGTH,
+    REVISION,
+    ACCESSES,
+    DATASET_PARENTS,
+    DATASET_BYTES_INIT,
+    DATASET_BYTES_GROWTH,
+    HASH_BYTES,
+    MIX_BYTES,
     hashimoto_light,
     get_seedhash,
     mkcache_bytes,
 )
 from eth_hash.auto import keccak
+from Crypto.Hash import keccak as keccak_hash
 
 
 MAX_EPOCH = 2048
@@ -52,10 +69,13 @@ def seed_to_block_num(seed: bytes) -> int:
 
 ZERO_MASK = [0xFF, 0x7F, 0x3F, 0x1F, 0x0F, 0x07, 0x03, 0x01]
 
+BOUNDARY_NUM_BYTES = 32
+BOUNDARY_BITS = BOUNDARY_NUM_BYTES * 8
+MAX_DIFFICULTY = 255
 
-def difficulty_to_boundary(difficulty: int) -> bytes:
-    """Zilliqa difficulty level to boundary."""
-    boundary = bytearray(b"\xFF" * 32)
+
+def _calc_boundary(difficulty: int) -> bytes:
+    boundary = bytearray(b"\xFF" * BOUNDARY_NUM_BYTES)
     n_bytes_to_zero = difficulty // 8
     n_bits_to_zero = difficulty % 8
 
@@ -65,6 +85,21 @@ def difficulty_to_boundary(difficulty: int) -> bytes:
     return bytes(boundary)
 
 
+BOUNDARY_TABLE = tuple(_calc_boundary(d) for d in range(MAX_DIFFICULTY + 1))
+
+
+def difficulty_to_boundary(difficulty: int) -> bytes:
+    """Zilliqa difficulty level to boundary."""
+    if 0 <= difficulty <= MAX_DIFFICULTY:
+        return BOUNDARY_TABLE[difficulty]
+    return _calc_boundary(difficulty)
+
+
+def difficulty_to_boundary_int(difficulty: int) -> int:
+    """Zilliqa difficulty level to integer boundary."""
+    return (1 << (BOUNDARY_BITS - difficulty)) - 1
+
+
 def boundary_to_difficulty(boundary) -> int:
     """Boundary to Zilliqa difficulty level."""
     if isinstance(boundary, str):
@@ -83,44 +118,85 @@ def boundary_to_difficulty(boundary) -> int:
 assert boundary_to_difficulty(difficulty_to_boundary(11)) == 11
 
 
-def difficulty_to_boundary_divided(difficulty: int, n_divided: int=8,
-                                   n_divided_start: int=32) -> bytes:
-    """Zilliqa divided difficulty to boundary."""
+def _calc_boundary_int_divided(difficulty: int, n_divided: int,
+                               n_divided_start: int) -> int:
     if difficulty < n_divided_start:
-        return difficulty_to_boundary(difficulty)
+        return difficulty_to_boundary_int(difficulty)
 
     n_level = (difficulty - n_divided_start) // n_divided
     m_sub_level = (difficulty - n_divided_start) % n_divided
     difficulty_level = n_divided_start + n_level
 
-    int_boundary = utils.bytes_to_int(difficulty_to_boundary(difficulty_level))
+    int_boundary = difficulty_to_boundary_int(difficulty_level)
     boundary_change_step = (int_boundary >> 1) // n_divided
 
-    int_boundary -= boundary_change_step * m_sub_level
+    return int_boundary - boundary_change_step * m_sub_level
 
-    return utils.int_to_bytes(int_boundary, n_bytes=32)
 
+@lru_cache(maxsize=64)
+def boundary_tables(n_divided: int=8,
+                    n_divided_start: int=32) -> Tuple[Tuple[int, ...], Tuple[bytes, ...]]:
+    """Return (int boundaries, bytes boundaries) of all divided difficulties."""
+    int_table = tuple(
+        _calc_boundary_int_divided(d, n_divided, n_divided_start)
+        for d in range(MAX_DIFFICULTY + 1)
+    )
+    bytes_table = tuple(
+        b.to_bytes(BOUNDARY_NUM_BYTES, byteorder="big") for b in int_table
+    )
+    return int_table, bytes_table
+
+
+def difficulty_to_boundary_int_divided(difficulty: int, n_divided: int=8,
+                                       n_divided_start: int=32) -> int:
+    """Zilliqa divided difficulty to integer boundary."""
+    if 0 <= difficulty <= MAX_DIFFICULTY:
+        return boundary_tables(n_divided, n_divided_start)[0][difficulty]
+    return _calc_boundary_int_divided(difficulty, n_divided, n_divided_start)
 
-def boundary_to_difficulty_divided(boundary, n_divided: int=8,
-                                   n_divided_start: int=32) -> int:
-    """Boundary to divided difficulty."""
-    if isinstance(boundary, str):
-        boundary = utils.hex_str_to_bytes(boundary)
 
-    difficulty_level = boundary_to_difficulty(boundary)
+def difficulty_to_boundary_divided(difficulty: int, n_divided: int=8,
+                                   n_divided_start: int=32) -> bytes:
+    """Zilliqa divided difficulty to boundary."""
+    if 0 <= difficulty <= MAX_DIFFICULTY:
+        return boundary_tables(n_divided, n_divided_start)[1][difficulty]
+    int_boundary = _calc_boundary_int_divided(difficulty, n_divided, n_divided_start)
+    return utils.int_to_bytes(int_boundary, n_bytes=BOUNDARY_NUM_BYTES)
+
+
+def _calc_difficulty_divided(int_boundary: int, difficulty_level: int,
+                             n_divided: int, n_divided_start: int) -> int:
     if difficulty_level < n_divided_start:
         return difficulty_level
 
     n_level = difficulty_level - n_divided_start
 
-    int_cur_boundary = utils.bytes_to_int(boundary)
-    int_cur_level = utils.bytes_to_int(difficulty_to_boundary(difficulty_level))
+    int_cur_level = difficulty_to_boundary_int(difficulty_level)
 
     step = (int_cur_level >> 1) // n_divided
-    m_sub_level = (int_cur_level - int_cur_boundary) // step
+    m_sub_level = (int_cur_level - int_boundary) // step
+
+    return n_divided_start + n_level * n_divided + m_sub_level
+
+
+def boundary_int_to_difficulty_divided(int_boundary: int, n_divided: int=8,
+                                       n_divided_start: int=32) -> int:
+    """Integer boundary to divided difficulty."""
+    difficulty_level = BOUNDARY_BITS - int_boundary.bit_length()
+    return _calc_difficulty_divided(int_boundary, difficulty_level,
+                                    n_divided, n_divided_start)
+
+
+def boundary_to_difficulty_divided(boundary, n_divided: int=8,
+                                   n_divided_start: int=32) -> int:
+    """Boundary to divided difficulty."""
+    if isinstance(boundary, str):
+        boundary = utils.hex_str_to_bytes(boundary)
 
-    new_difficulty = n_divided_start + n_level * n_divided + m_sub_level
-    return new_difficulty
+    int_boundary = utils.bytes_to_int(boundary)
+    difficulty_level = len(boundary) * 8 - int_boundary.bit_length()
+    return _calc_difficulty_divided(int_boundary, difficulty_level,
+                                    n_divided, n_divided_start)
 
 
 assert boundary_to_difficulty_divided(difficulty_to_boundary_divided(31)) == 31
@@ -130,26 +206,28 @@ assert boundary_to_difficulty_divided(difficulty_to_boundary_divided(255)) == 25
 assert boundary_to_difficulty_divided(difficulty_to_boundary(31)) == 31
 
 
-def boundary_to_hashpower(boundary: Union[str, bytes]) -> int:
+def boundary_to_hashpower(boundary: Union[str, bytes, int]) -> int:
     """boundary to hashrate."""
     dividend = 0xffff000000000000000000000000000000000000000000000000000000000000
+    if isinstance(boundary, int):
+        return dividend // boundary
     if isinstance(boundary, str):
         return dividend // utils.hex_str_to_int(boundary)
     elif isinstance(boundary, bytes):
         return dividend // utils.bytes_to_int(boundary)
-    raise TypeError("Type of boundary should be str or bytes")
+    raise TypeError("Type of boundary should be str, bytes or int")
 
 
 def difficulty_to_hashpower(difficulty: int) -> int:
     """difficulty level to hashrate."""
-    return boundary_to_hashpower(difficulty_to_boundary(difficulty))
+    return boundary_to_hashpower(difficulty_to_boundary_int(difficulty))
 
 
 def difficulty_to_hashpower_divided(difficulty: int, n_divided: int=8,
                                     n_divided_start: int=32) -> int:
     """divided difficulty to hashrate."""
     return boundary_to_hashpower(
-        difficulty_to_boundary_divided(
+        difficulty_to_boundary_int_divided(
             difficulty, n_divided=n_divided, n_divided_start=n_divided_start
         )
     )
@@ -165,19 +243,30 @@ def is_less_or_equal(hash_1: Union[str, bytes],
     assert isinstance(hash_1, bytes)
     assert isinstance(hash_2, bytes)
 
+    # big-endian bytes of same length compare as integers
+    if len(hash_1) == len(hash_2):
+        return hash_1 <= hash_2
     return utils.bytes_to_int(hash_1) <= utils.bytes_to_int(hash_2)
 
 
+def is_less_or_equal_int(hash_result: bytes, int_boundary: int) -> bool:
+    """check hash result with integer boundary."""
+    return int.from_bytes(hash_result, byteorder="big") <= int_boundary
+
+
 # for pow verify
 def verify_pow_work(block_number: int, header: bytes, mix_digest: bytes,
-                    nonce: int, boundary: bytes) -> Optional[bytes]:
+                    nonce: int, boundary: Union[bytes, int]) -> Optional[bytes]:
     """Return hash rate if it less than boundary."""
     calc_mix_digest, calc_result = pow_hash(block_number, header, nonce)
 
     if mix_digest != calc_mix_digest:
         return None
 
-    ok = is_less_or_equal(calc_result, boundary)
+    if isinstance(boundary, int):
+        ok = is_less_or_equal_int(calc_result, boundary)
+    else:
+        ok = is_less_or_equal(calc_result, boundary)
     if not ok:
         return None
     return calc_result
@@ -206,7 +295,313 @@ def get_cache(block_number: int) -> bytes:
 
 
 def pow_hash(block_number, header, nonce) -> Tuple[bytes, bytes]:
-    """search for hash result using hashimoto_light."""
+    """search for hash result using hashimoto_light or hashimoto_full,
+    hashimoto_light is used until the DAG of the epoch is built.
+    """
+    if select_pow_mode(block_number) == POW_MODE_FULL:
+        dataset = get_dataset(block_number)
+        if dataset is not None:
+            return hashimoto_full(dataset, header, nonce)
+        if pow_settings["build_dag"]:
+            build_dataset(block_number, background=True)
+
     cache_bytes = get_cache(block_number)
     hash_ret = hashimoto_light(block_number, cache_bytes, header, nonce)
     return hash_ret[b"mix digest"], hash_ret[b"result"]
+
+
+def pow_hash_full(block_number, header, nonce) -> Tuple[bytes, bytes]:
+    """search for hash result using hashimoto_full, the DAG must be built."""
+    dataset = get_dataset(block_number)
+    if dataset is None:
+        raise ValueError("DAG of block {} is not built, call build_dataset first".format(block_number))
+    return hashimoto_full(dataset, header, nonce)
+
+
+# full dataset settings
+POW_MODE_LIGHT = "light"
+POW_MODE_FULL = "full"
+POW_MODE_AUTO = "auto"
+
+WORD_BYTES = 4
+HASH_WORDS = HASH_BYTES // WORD_BYTES
+MIX_WORDS = MIX_BYTES // WORD_BYTES
+MIX_HASHES = MIX_BYTES // HASH_BYTES
+FNV_PRIME = 0x01000193
+
+DAG_MAGIC_NUM = b"\xfe\xca\xdd\xba\xad\xde\xe1\xfe"
+DAG_GENERATE_CHUNK = 4096
+DATASET_MAX_ITEMS = 2
+
+# hashes per second from which the full dataset pays off
+FULL_MODE_MIN_RATE = 100
+
+pow_settings = {
+    "mode": POW_MODE_LIGHT,
+    "verify_rate": 0,
+    "dag_dir": os.path.join(os.path.expanduser("~"), ".pyzil", "ethash"),
+    "workers": None,
+    "build_dag": False,
+}
+dataset_by_seed = OrderedDict()          # type: OrderedDict[bytes, Dataset]
+dataset_builds = {}                      # type: Dict[bytes, threading.Thread]
+dataset_builds_lock = threading.Lock()
+
+
+def set_pow_mode(mode: str=POW_MODE_AUTO, verify_rate: Optional[int]=None,
+                 dag_dir: Optional[str]=None, workers: Optional[int]=None,
+                 build_dag: Optional[bool]=None) -> None:
+    """Set verification mode, "light", "full" or "auto".
+
+    In "auto" mode the full dataset is used when verify_rate (hashes per
+    second) is at least FULL_MODE_MIN_RATE and the available memory can
+    hold the dataset of the epoch.
+
+    The full dataset is only used if its DAG file exists. DAG files are
+    built by build_dataset, or in a background thread on first use if
+    build_dag; building the 1 GB DAG takes hours of CPU.
+    """
+    if mode not in (POW_MODE_LIGHT, POW_MODE_FULL, POW_MODE_AUTO):
+        raise ValueError("unknown pow mode: {}".format(mode))
+    pow_settings["mode"] = mode
+    if verify_rate is not None:
+        pow_settings["verify_rate"] = verify_rate
+    if dag_dir is not None:
+        pow_settings["dag_dir"] = dag_dir
+    if workers is not None:
+        pow_settings["workers"] = workers
+    if build_dag is not None:
+        pow_settings["build_dag"] = build_dag
+
+
+def available_memory() -> int:
+    """Return bytes of available physical memory, 0 if unknown."""
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return 0
+
+
+def select_pow_mode(block_number: int) -> str:
+    """Return "light" or "full" for block_number by the pow settings."""
+    mode = pow_settings["mode"]
+    if mode != POW_MODE_AUTO:
+        return mode
+
+    if pow_settings["verify_rate"] < FULL_MODE_MIN_RATE:
+        return POW_MODE_LIGHT
+    if block_number // EPOCH_LENGTH in [d.epoch for d in dataset_by_seed.values()]:
+        return POW_MODE_FULL
+    if available_memory() < get_full_size(block_number):
+        return POW_MODE_LIGHT
+    return POW_MODE_FULL
+
+
+def _is_prime(x: int) -> bool:
+    for i in range(2, int(x ** 0.5) + 1):
+        if x % i == 0:
+            return False
+    return True
+
+
+def get_full_size(block_number: int) -> int:
+    """Return bytes of full dataset for block_number."""
+    size = DATASET_BYTES_INIT + DATASET_BYTES_GROWTH * (block_number // EPOCH_LENGTH)
+    size -= MIX_BYTES
+    while not _is_prime(size // MIX_BYTES):
+        size -= 2 * MIX_BYTES
+    return size
+
+
+def keccak_512(data: bytes) -> bytes:
+    return keccak_hash.new(data=data, digest_bits=512).digest()
+
+
+def fnv(v1: int, v2: int) -> int:
+    return ((v1 * FNV_PRIME) ^ v2) & 0xFFFFFFFF
+
+
+def bytes_to_words(data: bytes) -> array.array:
+    """Convert little-endian bytes to array of uint32 words."""
+    words = array.array("I", data)
+    if sys.byteorder != "little":
+        words.byteswap()
+    return words
+
+
+def words_to_bytes(words: Sequence[int]) -> bytes:
+    """Convert uint32 words to little-endian bytes."""
+    return struct.pack("<{}I".format(len(words)), *words)
+
+
+def calc_dataset_item(cache_words: array.array, i: int) -> bytes:
+    """Compute item i of full dataset from the cache words."""
+    n = len(cache_words) // HASH_WORDS
+    offset = (i % n) * HASH_WORDS
+    mix = list(cache_words[offset:offset + HASH_WORDS])
+    mix[0] ^= i
+    mix = bytes_to_words(keccak_512(words_to_bytes(mix)))
+    for j in range(DATASET_PARENTS):
+        parent = fnv(i ^ j, mix[j % HASH_WORDS]) % n * HASH_WORDS
+        mix = [fnv(a, b) for a, b in zip(mix, cache_words[parent:parent + HASH_WORDS])]
+    return keccak_512(words_to_bytes(mix))
+
+
+def hashimoto(header: bytes, nonce: int, full_size: int,
+              dataset_lookup: Callable[[int], Sequence[int]]) -> Tuple[bytes, bytes]:
+    """ethash hashimoto, return (mix digest, result)."""
+    n = full_size // HASH_BYTES
+    seed = keccak_512(header + nonce.to_bytes(8, byteorder="little"))
+    s = bytes_to_words(seed)
+    mix = list(s) * MIX_HASHES
+    for i in range(ACCESSES):
+        p = fnv(i ^ s[0], mix[i % MIX_WORDS]) % (n // MIX_HASHES) * MIX_HASHES
+        new_data = []
+        for j in range(MIX_HASHES):
+            new_data.extend(dataset_lookup(p + j))
+        mix = [fnv(a, b) for a, b in zip(mix, new_data)]
+
+    cmix = [
+        fnv(fnv(fnv(mix[i], mix[i + 1]), mix[i + 2]), mix[i + 3])
+        for i in range(0, MIX_WORDS, 4)
+    ]
+    mix_digest = words_to_bytes(cmix)
+    return mix_digest, keccak(seed + mix_digest)
+
+
+class Dataset:
+    """Memory-mapped ethash full dataset (DAG) of an epoch."""
+    def __init__(self, epoch: int, full_size: int, dag_file: str):
+        self.epoch = epoch
+        self.full_size = full_size
+        self.dag_file = dag_file
+
+        self._file = open(dag_file, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        if self._mmap[:len(DAG_MAGIC_NUM)] != DAG_MAGIC_NUM or \
+                len(self._mmap) != len(DAG_MAGIC_NUM) + full_size:
+            self.close()
+            raise ValueError("invalid DAG file: {}".format(dag_file))
+
+        self._unpack = struct.Struct("<{}I".format(HASH_WORDS)).unpack_from
+
+    def __str__(self):
+        return "<Dataset epoch: {} size: {}>".format(self.epoch, self.full_size)
+
+    def lookup(self, i: int) -> Tuple[int, ...]:
+        """Return words of dataset item i."""
+        return self._unpack(self._mmap, len(DAG_MAGIC_NUM) + i * HASH_BYTES)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+def dag_file_path(block_number: int, dag_dir: Optional[str]=None) -> str:
+    """Return path of DAG file for block_number."""
+    seed = block_num_to_seed(block_number)
+    name = "full-R{}-{}".format(REVISION, utils.bytes_to_hex_str(seed[:8]))
+    return os.path.join(dag_dir or pow_settings["dag_dir"], name)
+
+
+_generate_cache_words = None
+
+
+def _init_generate_worker(cache_bytes: bytes):
+    global _generate_cache_words
+    _generate_cache_words = bytes_to_words(cache_bytes)
+
+
+def _generate_chunk(chunk: Tuple[int, int]) -> bytes:
+    start, end = chunk
+    return b"".join(calc_dataset_item(_generate_cache_words, i) for i in range(start, end))
+
+
+def generate_dataset(cache_bytes: bytes, full_size: int, dag_file: str,
+                     workers: Optional[int]=None) -> str:
+    """Generate full dataset from cache to dag_file, using worker processes."""
+    n_items = full_size // HASH_BYTES
+    chunks = [
+        (start, min(start + DAG_GENERATE_CHUNK, n_items))
+        for start in range(0, n_items, DAG_GENERATE_CHUNK)
+    ]
+
+    dag_dir = os.path.dirname(os.path.abspath(dag_file))
+    os.makedirs(dag_dir, exist_ok=True)
+    # unique temp file, processes building the same DAG do not clash
+    fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(dag_file) + ".", suffix=".tmp",
+                                    dir=dag_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(DAG_MAGIC_NUM)
+            if workers == 1:
+                _init_generate_worker(cache_bytes)
+                for chunk in chunks:
+                    f.write(_generate_chunk(chunk))
+            else:
+                with ProcessPoolExecutor(max_workers=workers,
+                                         initializer=_init_generate_worker,
+                                         initargs=(cache_bytes, )) as pool:
+                    for data in pool.map(_generate_chunk, chunks):
+                        f.write(data)
+        os.replace(tmp_file, dag_file)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+    return dag_file
+
+
+def get_dataset(block_number: int) -> Optional[Dataset]:
+    """Load full dataset of block_number, None if the DAG file is not built."""
+    seed = block_num_to_seed(block_number)
+    if seed in dataset_by_seed:
+        d = dataset_by_seed.pop(seed)  # pop and append at end
+        dataset_by_seed[seed] = d
+        return d
+
+    dag_file = dag_file_path(block_number)
+    if not os.path.exists(dag_file):
+        return None
+
+    d = Dataset(block_number // EPOCH_LENGTH, get_full_size(block_number), dag_file)
+    dataset_by_seed[seed] = d
+    if len(dataset_by_seed) > DATASET_MAX_ITEMS:
+        _, old = dataset_by_seed.popitem(last=False)
+        old.close()
+    return d
+
+
+def _build_dag_file(block_number: int) -> None:
+    dag_file = dag_file_path(block_number)
+    if not os.path.exists(dag_file):
+        generate_dataset(get_cache(block_number), get_full_size(block_number), dag_file,
+                         workers=pow_settings["workers"])
+
+
+def build_dataset(block_number: int, background=False) -> Optional[Dataset]:
+    """Build DAG file of block_number if not exists and load the dataset.
+    If background, start building in a thread (once per epoch) and return None.
+    """
+    if not background:
+        _build_dag_file(block_number)
+        return get_dataset(block_number)
+
+    seed = block_num_to_seed(block_number)
+    with dataset_builds_lock:
+        thread = dataset_builds.get(seed)
+        if thread is None:
+            thread = threading.Thread(target=_build_dag_file, args=(block_number, ),
+                                      name="dag-build-{}".format(block_number // EPOCH_LENGTH),
+                                      daemon=True)
+            dataset_builds[seed] = thread
+            thread.start()
+    return None
+
+
+def hashimoto_full(dataset: Dataset, header: bytes, nonce: int) -> Tuple[bytes, bytes]:
+    """hashimoto with lookups in memory-mapped dataset."""
+    return hashimoto(header, nonce, dataset.full_size, dataset.lookup)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+
+import os
+import json
+import timeit
+
+from pyzil.common import utils
+from pyzil.crypto import bech32
+
+cur_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestBech32:
+    def test_zil_codec(self):
+        for addr in json.load(open(os.path.join(cur_dir, "bech32.fixtures.json"))):
+            address = utils.hex_str_to_bytes(addr["b16"])
+            assert bech32.zil_encode(address) == addr["b32"]
+            assert bech32.zil_decode(addr["b32"]) == address
+            assert bech32.zil_decode(addr["b32"].upper()) == address
+
+        for i in range(1000):
+            address = utils.rand_bytes(20)
+            encoded = bech32.encode("zil", address)
+            assert bech32.zil_encode(address) == encoded
+            assert bech32.zil_decode(encoded) == bytes(bech32.decode("zil", encoded))
+
+            pos = 4 + i % (len(encoded) - 4)
+            for c in bech32.CHARSET:
+                mutated = encoded[:pos] + c + encoded[pos + 1:]
+                expected = bech32.decode("zil", mutated)
+                expected = expected and bytes(expected)
+                assert bech32.zil_decode(mutated) == expected
+
+        assert bech32.zil_encode(utils.rand_bytes(19)) is None
+        assert bech32.zil_decode(bech32.encode("zil", utils.rand_bytes(19))) is None
+        assert bech32.zil_decode(bech32.encode("tzil", utils.rand_bytes(20))) is None
+        assert bech32.zil_decode("zil1r5verznnwvrzrz6uhveyrlxuhkvccwnjU4aehf") is None
+        assert bech32.zil_decode("zil1r5verznnwvrzrz6uhveyrlxuhkvccwnjb4aehf") is None
+
+    def test_zil_codec_benchmark(self):
+        address = utils.rand_bytes(20)
+        encoded = bech32.zil_encode(address)
+        number = 5000
+
+        results = {
+            "encode (reference)": timeit.timeit(lambda: bech32.encode("zil", address), number=number),
+            "zil_encode": timeit.timeit(lambda: bech32.zil_encode(address), number=number),
+            "decode (reference)": timeit.timeit(lambda: bech32.decode("zil", encoded), number=number),
+            "zil_decode": timeit.timeit(lambda: bech32.zil_decode(encoded), number=number),
+        }
+        for name, seconds in results.items():
+            print("{:<24} {:>10.0f} ops/s".format(name, number / seconds))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+
+import os
+import time
+
+import pytest
+
+from pyzil.common import utils
+from pyzil.crypto import tools, zilkey
+
+cur_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestTools:
+    def test_derived_key_cache(self):
+        params = {"salt": utils.rand_hex_str(64), "c": 1024, "n": 1024, "r": 8, "p": 1, "dklen": 32}
+        cache = tools.DerivedKeyCache(max_size=2, ttl=0.5)
+
+        assert cache.get(b"1234", "pbkdf2", params) is None
+        derived_key = tools.gen_derived_key("1234", "pbkdf2", params)
+        cache.put(b"1234", "pbkdf2", params, derived_key)
+        assert cache.get(b"1234", "pbkdf2", params) == derived_key
+        assert cache.get(b"12345", "pbkdf2", params) is None
+        assert cache.get(b"1234", "scrypt", params) is None
+        assert cache.get(b"1234", "pbkdf2", dict(params, salt=utils.hex_str_to_bytes(params["salt"]))) == derived_key
+
+        stored = cache._keys[cache._digest(b"1234", "pbkdf2", params)][0]
+        cache.put(b"a", "pbkdf2", params, b"\x01" * 32)
+        cache.put(b"b", "pbkdf2", params, b"\x02" * 32)
+        assert len(cache) == 2
+        assert stored == bytearray(32)
+        assert cache.get(b"1234", "pbkdf2", params) is None
+
+        time.sleep(0.6)
+        assert cache.get(b"a", "pbkdf2", params) is None
+        assert len(cache) == 0
+
+        cache.put(b"a", "pbkdf2", params, b"\x01" * 32)
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_keystore_with_cache(self):
+        key_file = os.path.join(cur_dir, "zilliqa_keystore.json")
+        cache = tools.enable_derived_key_cache(max_size=4, ttl=60)
+        try:
+            start = time.time()
+            key = zilkey.ZilKey.load_keystore("zxcvbnm,", key_file)
+            first = time.time() - start
+            assert len(cache) == 1
+
+            start = time.time()
+            assert zilkey.ZilKey.load_keystore("zxcvbnm,", key_file) == key
+            second = time.time() - start
+            print("load keystore {:.3f}s, cached {:.3f}s".format(first, second))
+            assert second < first
+        finally:
+            tools.disable_derived_key_cache()
+        assert tools.derived_key_cache is None
+        assert len(cache) == 0
+
+    def test_calibrate_kdf(self, tmp_path):
+        params = tools.calibrate_kdf("pbkdf2", target_time=0.05)
+        assert params["c"] >= tools.PBKDF2_MIN_COUNT
+        assert params["dklen"] == 32
+
+        params = tools.calibrate_kdf("scrypt", target_time=0.05, max_memory=8 * 1024 * 1024)
+        assert params["n"] >= tools.SCRYPT_MIN_N
+        assert params["n"] & (params["n"] - 1) == 0
+        assert tools.scrypt_memory(params["n"], params["r"], params["p"]) <= 8 * 1024 * 1024
+
+        key = zilkey.ZilKey.generate_new()
+        key_file = str(tmp_path / "keystore.json")
+        keystore = key.save_keystore("1234", kdf_method="scrypt", keystore_file=key_file, kdfparams=params)
+        assert keystore["crypto"]["kdfparams"]["n"] == params["n"]
+        assert zilkey.ZilKey.load_keystore("1234", key_file) == key
+
+        keystore = key.save_keystore("1234", kdf_method="scrypt", kdfparams={"n": 1 << 15})
+        assert keystore["crypto"]["kdfparams"]["n"] == 1 << 15
+        assert keystore["crypto"]["kdfparams"]["c"] == tools.DEFAULT_KDF_PARAMS["c"]
+
+        with pytest.raises(ValueError):
+            tools.calibrate_kdf("bcrypt")
+
+    def test_benchmark_kdf(self):
+        report = tools.benchmark_kdf_report([{"c": 1 << 14}, {"c": 1 << 16}], kdf_method="pbkdf2")
+        report += tools.benchmark_kdf_report([{"n": 1 << 12}, {"n": 1 << 13}], kdf_method="scrypt")
+        for result in report:
+            print("{:<8} n={:<6} c={:<7} {:>8.3f}s {:>10} bytes".format(
+                result.kdf_method, result.params["n"], result.params["c"],
+                result.seconds, result.memory
+            ))
+        assert report[0].seconds < report[1].seconds
+        assert report[2].memory < report[3].memory
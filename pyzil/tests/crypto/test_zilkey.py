@@ -6,7 +6,9 @@
 import os
 import re
 import json
+import time
 import pytest
+import threading
 
 from pyzil.common import utils
 from pyzil import crypto
@@ -141,3 +143,177 @@ class TestZilKey:
 
             assert crypto.zilkey.is_bech32_address(addr["b32"])
             assert not crypto.zilkey.is_bech32_address(addr["b16"])
+
+    def test_bulk_addresses(self):
+        fixtures = json.load(open(path_join("bech32.fixtures.json")))
+        b16 = [addr["b16"] for addr in fixtures]
+        b32 = [addr["b32"] for addr in fixtures]
+        invalid = ["", "0x1234", "zil1invalid", "g" * 40, None]
+
+        results, errors = crypto.zilkey.to_checksum_addresses(b16 + b32 + invalid)
+        assert results == [crypto.zilkey.to_checksum_address(a) for a in b16 + b32] + [None] * len(invalid)
+        assert errors == [False] * (len(b16) + len(b32)) + [True] * len(invalid)
+
+        results, errors = crypto.zilkey.to_bech32_addresses(b16 + b32)
+        assert results == b32 + [None] * len(b32)
+        assert errors == [False] * len(b16) + [True] * len(b32)
+
+        results, errors = crypto.zilkey.from_bech32_addresses(b32 + b16)
+        assert results == [crypto.zilkey.to_valid_address(a) for a in b16] + [None] * len(b16)
+        assert errors == [False] * len(b32) + [True] * len(b16)
+
+        checksum = [crypto.zilkey.to_checksum_address(a) for a in b16]
+        lower = [a.lower() for a in checksum]
+        results, errors = crypto.zilkey.normalise_addresses(checksum + b32 + lower)
+        assert results == checksum + checksum + [None] * len(lower)
+        assert errors == [False] * (len(checksum) + len(b32)) + [True] * len(lower)
+
+        addresses = (b16 + b32) * 5
+        results, errors = crypto.zilkey.to_checksum_addresses(addresses, workers=2, chunk_size=7)
+        assert results == crypto.zilkey.to_checksum_addresses(addresses, workers=1).results
+        assert not any(errors)
+
+    def test_address_cache(self):
+        crypto.zilkey.clear_address_cache()
+        info = crypto.zilkey.address_cache_info()
+        assert info.hits == info.misses == info.size == 0
+
+        address = "526a2719b5855ef7d396a62b912a0dfa08e6ae63"
+        checksum_address = crypto.zilkey.to_checksum_address(address)
+        bech32_address = crypto.zilkey.to_bech32_address(address)
+        assert crypto.zilkey.to_checksum_address(address, prefix="") == checksum_address[2:]
+        assert crypto.zilkey.is_valid_checksum_address(checksum_address)
+        assert crypto.zilkey.normalise_address(bech32_address) == checksum_address
+        assert crypto.zilkey.from_bech32_address(bech32_address) == address
+
+        info = crypto.zilkey.address_cache_info()
+        assert info.misses == 1
+        assert info.hits == 5
+        assert info.size == 1
+
+        forms = crypto.zilkey.address_forms(checksum_address)
+        assert forms == (address, checksum_address, bech32_address)
+        assert crypto.zilkey.address_forms("0x1234") is None
+
+        cache = crypto.zilkey.AddressCache(max_size=2)
+        keys = [utils.rand_bytes(20) for _ in range(3)]
+        for key in keys:
+            cache.get(key)
+        cache.get(keys[2])
+        info = cache.info()
+        assert info == (1, 3, 1, 2, 2)
+        cache.clear()
+        assert cache.info() == (0, 0, 0, 0, 2)
+
+        crypto.zilkey.clear_address_cache()
+        assert crypto.zilkey.address_cache_info().size == 0
+
+    def test_vanity_range(self):
+        assert crypto.zilkey.vanity_range("") == (b"\x00" * 20, None)
+        assert crypto.zilkey.vanity_range("0xab") == (b"\xab" + b"\x00" * 19, b"\xac" + b"\x00" * 19)
+        assert crypto.zilkey.vanity_range("F") == (b"\xf0" + b"\x00" * 19, None)
+        assert crypto.zilkey.vanity_range("zil1q") == (b"\x00" * 20, b"\x08" + b"\x00" * 19)
+
+        with pytest.raises(ValueError):
+            crypto.zilkey.vanity_range("xyz")
+        with pytest.raises(ValueError):
+            crypto.zilkey.vanity_range("zil1b")
+        with pytest.raises(ValueError):
+            crypto.zilkey.vanity_range("a" * 41)
+
+    def test_search_vanity(self):
+        key = crypto.zilkey.search_vanity("0xa1", workers=2)
+        assert key.address.startswith("a1")
+
+        key = crypto.zilkey.search_vanity("zil1ze", workers=1)
+        assert key.bech32_address.startswith("zil1ze")
+
+        reports = []
+        key = crypto.zilkey.search_vanity("0x" + "0" * 40, workers=1, timeout=1.5,
+                                          progress=reports.append, progress_interval=0.2)
+        assert key is None
+        assert reports and reports[-1].checked >= 0
+
+        cancel = threading.Event()
+        cancel.set()
+        assert crypto.zilkey.search_vanity("0" * 40, workers=1, cancel=cancel) is None
+
+    def test_generate_keys(self, tmp_path):
+        keys = list(crypto.zilkey.generate_keys(300, batch=128))
+        assert len(keys) == 300
+        assert len(set(key.private for key in keys)) == 300
+        for key in keys[:5] + keys[125:131] + keys[-5:]:
+            zil_key = crypto.ZilKey(private_key=key.private)
+            assert zil_key.address == key.address
+            assert zil_key.keypair_str == (key.public, key.private)
+
+        keys = list(crypto.zilkey.generate_keys(10, workers=2, batch=3))
+        assert len(keys) == 10
+        for key in keys:
+            assert crypto.ZilKey(private_key=key.private).address == key.address
+
+        key_file = str(tmp_path / "keys.txt")
+        assert crypto.zilkey.generate_keys_to_file(key_file, 5) == 5
+        assert os.stat(key_file).st_mode & 0o777 == 0o600
+        with open(key_file) as f:
+            lines = f.read().splitlines()
+        assert len(lines) == 5
+        address, public, private = lines[0].split()
+        assert crypto.ZilKey(public_key=public, private_key=private).address == address
+
+    def test_generate_keys_benchmark(self):
+        number = 200
+        start = time.time()
+        for _ in range(number):
+            key = crypto.ZilKey.generate_new()
+            _ = key.address, key.keypair_str
+        old_rate = number / (time.time() - start)
+
+        number = 2000
+        start = time.time()
+        for _ in crypto.zilkey.generate_keys(number):
+            pass
+        new_rate = number / (time.time() - start)
+
+        print("ZilKey.generate_new  {:>10.0f} keys/s".format(old_rate))
+        print("generate_keys        {:>10.0f} keys/s".format(new_rate))
+
+    def test_bulk_keystores(self, tmp_path):
+        key = crypto.ZilKey.load_keystore("zxcvbnm,", path_join("zilliqa_keystore.json"))
+        passwords = {
+            path_join("zilliqa_keystore.json"): "zxcvbnm,",
+            path_join("zilliqa_keystore2.json"): "1234",
+            str(tmp_path / "missing.json"): "1234",
+        }
+        results = list(crypto.zilkey.load_keystores(passwords, passwords.get, workers=2))
+        assert sorted(r.keystore_file for r in results) == sorted(passwords)
+        for result in results:
+            if result.keystore_file.endswith("missing.json"):
+                assert result.zil_key is None
+                assert isinstance(result.error, FileNotFoundError)
+            else:
+                assert result.error is None
+                assert result.zil_key == key
+
+        new_keys = [crypto.ZilKey.generate_new() for _ in range(2)]
+        files = [str(tmp_path / "keystore{}.json".format(i)) for i in range(2)]
+        results = list(crypto.zilkey.save_keystores(zip(new_keys, files), "pass", workers=2))
+        assert sorted(r.keystore_file for r in results) == files
+        assert all(r.error is None for r in results)
+
+        results = {r.keystore_file: r for r in crypto.zilkey.load_keystores(files, "pass", workers=1)}
+        for zil_key, keystore_file in zip(new_keys, files):
+            assert results[keystore_file].zil_key == zil_key
+
+        results = list(crypto.zilkey.load_keystores(files, "wrong", workers=1))
+        assert all(isinstance(r.error, ValueError) for r in results)
+
+        # a failed password lookup fails its file only
+        passwords = {files[0]: "pass"}
+        results = {r.keystore_file: r for r in crypto.zilkey.load_keystores(files, passwords.__getitem__)}
+        assert results[files[0]].zil_key == new_keys[0]
+        assert isinstance(results[files[1]].error, KeyError)
+        results = {r.keystore_file: r for r in crypto.zilkey.save_keystores(
+            zip(new_keys, files), passwords.__getitem__, workers=1)}
+        assert results[files[0]].error is None
+        assert isinstance(results[files[1]].error, KeyError) and results[files[1]].zil_key == new_keys[1]
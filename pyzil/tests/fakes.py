@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+"""Fake HTTP session and api objects shared by offline tests."""
+
+import json
+
+from pyzil.zilliqa.api import APIError
+
+
+class FakeHTTPResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+
+class FakeSession:
+    """Return queued responses in order, an exception in queue is raised."""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def post(self, url, data=None, **kwargs):
+        self.requests.append(json.loads(data))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class FakeRPCSession:
+    """Serve json-rpc requests by methods of subclass."""
+    def __init__(self):
+        self.num_posts = 0
+
+    def _result(self, request):
+        try:
+            result = getattr(self, request["method"])(*request["params"])
+        except APIError as e:
+            return {"error": {"code": -1, "message": str(e)}}
+        return {"result": result}
+
+    def post(self, url, data=None, **kwargs):
+        self.num_posts += 1
+        request = json.loads(data)
+        if isinstance(request, list):
+            resp = [dict(self._result(r), jsonrpc="2.0", id=r["id"]) for r in reversed(request)]
+        else:
+            resp = dict(self._result(request), jsonrpc="2.0", id=request["id"])
+        return FakeHTTPResponse(json.dumps(resp).encode())
+
+
+class FakeAPI:
+    """Stand-in of ZilliqaAPI with api methods of subclass, call_batch
+    returns results in order and APIError of failed calls.
+    """
+    def __init__(self):
+        self.batches = []
+
+    def _result(self, method, params):
+        try:
+            return getattr(self, method)(*params)
+        except APIError as e:
+            return e
+
+    def call_batch(self, calls):
+        calls = list(calls)
+        self.batches.append(len(calls))
+        return [self._result(method, params) for method, params in calls]
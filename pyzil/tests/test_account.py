@@ -11,6 +11,7 @@ from pyzil.crypto import zilkey
 from pyzil.zilliqa import chain
 from pyzil.account import Account, BatchTransfer
 from pyzil.zilliqa.units import Zil, Qa
+from pyzil.tests.fakes import FakeAPI
 
 
 def path_join(*path):
@@ -207,6 +208,61 @@ class TestAccount:
         txn_info = account2.transfer(account.bech32_address, total_zils, confirm=True)
         pprint(txn_info)
 
+    def test_sign_transfers(self):
+        account = Account(private_key="d0b47febbef2bd0c4a4ee04aa20b60d61eb02635e8df5e7fd62409a2b1f5ddf8")
+        to_account = Account(address="b50c2404e699fd985f71b2c3f032059f13d6543b")
+
+        batch = (BatchTransfer(to_account.bech32_address, Zil(i)) for i in range(3))
+        txns = list(account.sign_transfers(batch, gas_price=1000000000, nonce=5))
+        assert [txn.nonce for txn in txns] == [5, 6, 7]
+        assert all(txn.sender is txns[0].sender for txn in txns)
+        assert not hasattr(txns[0], "__dict__")
+
+        params = chain.IsolatedServer.build_transaction_params(
+            account.zil_key, to_account.checksum_address,
+            Zil(2).toQa(), 7, 1000000000, 1
+        )
+        txn_params = txns[2].to_params()
+        assert txn_params.pop("signature") and params.pop("signature")
+        assert txn_params == params
+
+        payload = txns[0].to_payload(request_id=3)
+        assert payload["method"] == "CreateTransaction" and payload["id"] == 3
+        assert payload["params"][0]["nonce"] == 5
+
+        with pytest.raises(ValueError):
+            list(account.sign_transfers([(to_account.address, 1)], gas_price=1, nonce=1))
+
+    def test_transfer_batch_invalid(self):
+        class FakeTransferAPI(FakeAPI):
+            def __init__(self):
+                super().__init__()
+                self.nonces = []
+
+            def GetBalance(self, address):
+                return {"balance": "0", "nonce": 10}
+
+            def CreateTransaction(self, params):
+                self.nonces.append(params["nonce"])
+                return {"TranID": "{:064x}".format(params["nonce"])}
+
+        fake_chain = chain.BlockChain("http://localhost:4201", version=65537, network_id=1)
+        fake_chain.api = FakeTransferAPI()
+        chain.set_active_chain(fake_chain)
+
+        account = Account(private_key="d0b47febbef2bd0c4a4ee04aa20b60d61eb02635e8df5e7fd62409a2b1f5ddf8")
+        to_addr = Account(address="b50c2404e699fd985f71b2c3f032059f13d6543b").bech32_address
+        batch = [(to_addr, Zil(1)), ("not an address", Zil(1)), (to_addr, "abc"), (to_addr, Qa(5))]
+
+        with pytest.raises(ValueError):
+            account.transfer_batch(batch, gas_price=1000)
+        assert fake_chain.api.nonces == []
+
+        # invalid transfers of a streamed batch get None and use no nonce
+        results = account.transfer_batch(iter(batch), gas_price=1000, max_workers=2)
+        assert len(results) == 4 and results.count(None) == 2
+        assert sorted(fake_chain.api.nonces) == [11, 12]
+
     def test_transfer_qa(self):
         account = Account(address="b50c2404e699fd985f71b2c3f032059f13d6543b")
         print(account)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+
+import json
+
+import pytest
+
+from pyzil.zilliqa.archive import TxnArchive, TxnArchiveWriter, ArchiveError, txn_to_proto, proto_to_txn
+from pyzil.zilliqa.archive import RECORD_LEN, BLOCK_ENTRY
+from pyzil.tests.test_index import SENDER_KEY, make_blocks
+
+
+def zilliqa_txn(txn):
+    """Fill fields as returned by GetTransaction."""
+    return dict(
+        txn, version="65537", gasPrice="1000000000", gasLimit="1",
+        senderPubKey="0x" + SENDER_KEY.keypair_str.public.upper(),
+        signature="0x" + "AB" * 64,
+        receipt=dict(txn["receipt"], cumulative_gas="1"),
+    )
+
+
+def archive_blocks(start, end):
+    return [
+        block._replace(txns=[zilliqa_txn(txn) for txn in block.txns])
+        for block in make_blocks(start, end)
+    ]
+
+
+class TestTxnArchive:
+    def test_proto(self):
+        txn = archive_blocks(1, 2)[0].txns[5]
+        proto = txn_to_proto(txn)
+        assert proto.receipt.cumgas == 1
+        assert proto_to_txn(proto) == txn
+
+    def test_archive(self, tmp_path):
+        archive_file = str(tmp_path / "txns.archive")
+        blocks = archive_blocks(0, 200)
+        blocks[150] = blocks[150]._replace(txns=[])
+        with TxnArchiveWriter(archive_file, run_size=64) as writer:
+            assert writer.add_blocks(blocks[:150]) == 150
+            writer.add_blocks(blocks[150:151])
+        # append to existing archive
+        with TxnArchiveWriter(archive_file) as writer:
+            writer.add_blocks(blocks[151:])
+
+        all_txns = [txn for block in blocks for txn in block.txns]
+        with TxnArchive(archive_file) as archive:
+            assert len(archive) == len(all_txns)
+            assert list(archive) == all_txns
+            assert archive.block_txns(7) == blocks[7].txns
+            assert archive.block_txns(150) == []
+            assert archive.block_txns(1000) == []
+            for txn in all_txns[::97]:
+                assert archive.get(txn["ID"]) == txn
+                assert archive.get("0x" + txn["ID"].upper()) == txn
+            assert archive.get("ff" * 32) is None
+
+        json_size = sum(len(json.dumps(txn)) for txn in all_txns)
+        archive_size = (tmp_path / "txns.archive").stat().st_size
+        print("json {} bytes, archive {} bytes".format(json_size, archive_size))
+        assert archive_size < json_size
+        assert sorted(p.name for p in tmp_path.iterdir()) == \
+            ["txns.archive", "txns.archive.blocks", "txns.archive.txns"]
+
+    def test_recover(self, tmp_path):
+        archive_file = str(tmp_path / "txns.archive")
+        blocks = archive_blocks(0, 30)
+        with TxnArchiveWriter(archive_file) as writer:
+            writer.add_blocks(blocks[:10])
+
+        # crash without close: no index of blocks 10-19, block 20 has
+        # no block entry and a torn record follows it
+        writer = TxnArchiveWriter(archive_file, run_size=16)
+        writer.add_blocks(blocks[10:20])
+        for txn in blocks[20].txns:
+            record = txn_to_proto(txn).SerializeToString()
+            writer._file.write(RECORD_LEN.pack(len(record)) + record)
+        writer._file.write(RECORD_LEN.pack(1000) + b"torn")
+        writer._file.close()
+        writer._blocks.close()
+        with open(archive_file + ".blocks", "ab") as f:
+            f.write(BLOCK_ENTRY.pack(20, 0, 0)[:7])
+
+        with TxnArchive(archive_file) as archive:
+            assert archive.get(blocks[15].txns[0]["ID"]) is None
+            # the torn tail ends iteration
+            assert len(list(archive)) == 210
+
+        # reopen repairs the archive and index
+        with TxnArchiveWriter(archive_file) as writer:
+            writer.add_blocks(blocks[20:])
+
+        all_txns = [txn for block in blocks for txn in block.txns]
+        with TxnArchive(archive_file) as archive:
+            assert len(archive) == len(all_txns)
+            assert list(archive) == all_txns
+            assert sorted(archive.blocks) == list(range(30))
+            assert archive.get(blocks[15].txns[0]["ID"]) == blocks[15].txns[0]
+            assert archive.block_txns(20) == blocks[20].txns
+            for txn in all_txns[::7]:
+                assert archive.get(txn["ID"]) == txn
+        assert not list(tmp_path.glob("*.run"))
+
+        # records are never dropped without a block index
+        size = (tmp_path / "txns.archive").stat().st_size
+        (tmp_path / "txns.archive.blocks").unlink()
+        with pytest.raises(ArchiveError):
+            TxnArchiveWriter(archive_file)
+        assert (tmp_path / "txns.archive").stat().st_size == size
+
+    def test_not_archive(self, tmp_path):
+        bad_file = tmp_path / "bad.archive"
+        bad_file.write_bytes(b"not an archive")
+        with pytest.raises(ArchiveError):
+            TxnArchive(str(bad_file))
+        with pytest.raises(ArchiveError):
+            TxnArchiveWriter(str(bad_file))
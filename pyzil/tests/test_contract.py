@@ -3,12 +3,19 @@
 # Copyright (C) 2019  Gully Chen
 # MIT License
 
+import json
 import pytest
 from pprint import pprint
 
 from pyzil.zilliqa import chain
 from pyzil.account import Account
-from pyzil.contract import Contract
+from pyzil.crypto import zilkey
+from pyzil.contract import Contract, ContractStateMirror, StateChange, ContractDeployer
+from pyzil.contract import ContractStateView, scilla_field_types, parse_scilla_type
+from pyzil.common import utils
+from pyzil.zilliqa.api import APIError
+from pyzil.zilliqa.proto import messages_pb2 as pb2
+from pyzil.tests.fakes import FakeRPCSession
 
 
 def path_join(*path):
@@ -159,3 +166,401 @@ class TestContract:
         assert contract.last_receipt["event_logs"][0]["params"][0]["value"] == "hi contract."
 
 
+def verify_params(params):
+    txn_proto = pb2.ProtoTransactionCoreInfo()
+    txn_proto.version = params["version"]
+    txn_proto.nonce = params["nonce"]
+    txn_proto.toaddr = utils.hex_str_to_bytes(params["toAddr"])
+    txn_proto.senderpubkey.data = utils.hex_str_to_bytes(params["pubKey"])
+    txn_proto.amount.data = utils.int_to_bytes(int(params["amount"]), n_bytes=16)
+    txn_proto.gasprice.data = utils.int_to_bytes(int(params["gasPrice"]), n_bytes=16)
+    txn_proto.gaslimit = int(params["gasLimit"])
+    if params["code"]:
+        txn_proto.code = params["code"].encode("utf-8")
+    if params["data"]:
+        txn_proto.data = params["data"].encode("utf-8")
+    zil_key = zilkey.ZilKey(public_key=params["pubKey"])
+    return zil_key.verify(params["signature"], txn_proto.SerializeToString())
+
+
+class FakeSession(FakeRPCSession):
+    """Serve contract state and TxBlocks of a fake chain."""
+    def __init__(self, state):
+        super().__init__()
+        self.state = state
+        self.blocks = [[]]
+        self.txns = {}
+        self.deployed = []
+        self.nonce = 41
+
+    def add_block(self, *txns):
+        for txn in txns:
+            self.txns[txn["ID"]] = txn
+        self.blocks.append([txn["ID"] for txn in txns])
+
+    def GetSmartContractSubState(self, address, variable, indices):
+        if variable not in self.state:
+            return None
+        value = self.state[variable]
+        for index in indices:
+            if index not in value:
+                return None
+            value = value[index]
+        for index in reversed(indices):
+            value = {index: value}
+        return {variable: value}
+
+    def GetSmartContractState(self, address):
+        return json.loads(json.dumps(self.state))
+
+    def GetNumTxBlocks(self):
+        return str(len(self.blocks))
+
+    def GetTransactionsForTxBlock(self, block_num):
+        if not self.blocks[int(block_num)]:
+            raise APIError("TxBlock has no transactions")
+        return [self.blocks[int(block_num)]]
+
+    def GetBalance(self, address):
+        return {"balance": "1000000000000000", "nonce": self.nonce}
+
+    def CreateTransaction(self, params):
+        if not verify_params(params):
+            raise APIError("Invalid signature")
+        txn_id = "{:064x}".format(params["nonce"])
+        data = json.loads(params["data"])
+        if params["code"]:
+            # deploy, fails if init has a "fail" param
+            success = all(item["vname"] != "fail" for item in data)
+            self.deployed.append((params["nonce"], data))
+        else:
+            success = data["_tag"] != "Fail"
+        self.txns[txn_id] = {
+            "ID": txn_id, "nonce": str(params["nonce"]), "toAddr": params["toAddr"][2:].lower(),
+            "receipt": {"success": success, "event_logs": []},
+        }
+        if params["code"]:
+            sender = zilkey.ZilKey(public_key=params["pubKey"]).address
+            return {"TranID": txn_id, "Info": "Contract Creation txn, sent to shard",
+                    "ContractAddress": zilkey.contract_address(sender, params["nonce"] - 1)}
+        return {"TranID": txn_id, "Info": "Non-contract txn, sent to shard"}
+
+    def GetTransaction(self, txn_id):
+        if txn_id not in self.txns:
+            raise APIError("Txn Hash not Present")
+        return self.txns[txn_id]
+
+
+class TestContractSubState:
+    holder1 = "0x1d19918a737306218b5cbb3241fcdcbd998c3a72"
+    holder2 = "0xb50c2404e699fd985f71b2c3f032059f13d6543b"
+
+    def setup_method(self, method):
+        self.chain = chain.BlockChain("http://localhost:4201", version=65537, network_id=1)
+        self.session = FakeSession({
+            "total_supply": "1000",
+            "balances": {self.holder1: "300", self.holder2: "700"},
+            "allowances": {self.holder1: {self.holder2: "50"}},
+        })
+        self.chain.api.session = self.session
+        chain.set_active_chain(self.chain)
+
+    def teardown_method(self, method):
+        chain.set_active_chain(None)
+
+    def test_get_substate(self):
+        contract = Contract(address="c341f2767efc6bbfbeba0c830b8433addd1885f8",
+                            status=Contract.Status.Deployed)
+        assert contract.get_substate("total_supply") == "1000"
+        assert contract.get_substate("balances", [self.holder1]) == {self.holder1: "300"}
+        assert contract.get_substate("unknown") is None
+
+        substates = contract.get_substates([("total_supply", None), ("balances", [self.holder2])])
+        assert substates == ["1000", {self.holder2: "700"}]
+
+    def test_map(self):
+        contract = Contract(address="c341f2767efc6bbfbeba0c830b8433addd1885f8",
+                            status=Contract.Status.Deployed)
+        balances = contract.map("balances", ["ByStr20"], "Uint128")
+        assert balances.get("zil1r5verznnwvrzrz6uhveyrlxuhkvccwnju4aehf") == 300
+        assert balances[self.holder2.upper().replace("0X", "0x")] == 700
+        assert balances.get("0x" + "0" * 40, default=0) == 0
+        assert "0x" + "0" * 40 not in balances
+        with pytest.raises(KeyError):
+            balances["0x" + "0" * 40]
+        with pytest.raises(ValueError):
+            balances.get("not an address")
+
+        num_posts = self.session.num_posts
+        holders = [self.holder1, self.holder2, "0x" + "0" * 40] * 70
+        assert balances.get_many(holders, default=0) == [300, 700, 0] * 70
+        assert self.session.num_posts == num_posts + 3
+
+        allowances = contract.map("allowances", ["ByStr20", "ByStr20"], "Uint128")
+        assert allowances.get(self.holder1, self.holder2) == 50
+        assert allowances.get(self.holder1) == {self.holder2: "50"}
+        assert allowances.get_many([(self.holder1, self.holder2), (self.holder2, self.holder1)]) == [50, None]
+
+    def test_state_mirror(self):
+        contract = Contract(address="c341f2767efc6bbfbeba0c830b8433addd1885f8",
+                            status=Contract.Status.Deployed)
+        mirror = ContractStateMirror(contract, map_fields=["balances"])
+        feed = []
+        mirror.add_listener(feed.extend)
+
+        assert mirror.sync() == []
+        assert mirror.state["balances"][self.holder1] == "300"
+        assert mirror.block_num == 0
+
+        # holder1 sends 100 to holder2 through the contract
+        self.session.state["balances"][self.holder1] = "200"
+        self.session.state["balances"][self.holder2] = "800"
+        self.session.add_block()
+        self.session.add_block({
+            "ID": "01" * 32, "toAddr": contract.address,
+            "receipt": {"success": True, "event_logs": [{
+                "address": contract.address0x, "_eventname": "TransferSuccess",
+                "params": [{"vname": "sender", "type": "ByStr20", "value": self.holder1},
+                           {"vname": "recipient", "type": "ByStr20", "value": self.holder2}],
+            }]},
+        }, {
+            "ID": "02" * 32, "toAddr": "0" * 40, "receipt": {"success": True},
+        })
+
+        changes = mirror.sync()
+        assert sorted(changes) == [
+            StateChange(2, "balances", (self.holder1, ), "300", "200"),
+            StateChange(2, "balances", (self.holder2, ), "700", "800"),
+        ]
+        assert feed == changes
+        assert mirror.block_num == 2 and mirror.full_reloads == 0
+        assert mirror.state["balances"] == self.session.state["balances"]
+
+        # missing transaction falls back to full reload
+        self.session.state["total_supply"] = "2000"
+        self.session.blocks.append(["03" * 32])
+        changes = mirror.sync()
+        assert changes == [StateChange(3, "total_supply", (), "1000", "2000")]
+        assert mirror.full_reloads == 1 and mirror.block_num == 3
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_call_batch(self, workers):
+        contract = Contract(address="c341f2767efc6bbfbeba0c830b8433addd1885f8",
+                            status=Contract.Status.Deployed)
+        contract.account = Account(private_key="d0b47febbef2bd0c4a4ee04aa20b60d61eb02635e8df5e7fd62409a2b1f5ddf8")
+
+        calls = [("Transfer", [Contract.value_dict("amount", "Uint128", str(i))]) for i in range(5)]
+        calls.append(("Fail", [], "0.5"))
+        num_posts = self.session.num_posts
+        results = contract.call_batch(calls, gas_price=1000000000, sleep=0, workers=workers)
+
+        # sign and send in one batch, confirm in one batch
+        assert self.session.num_posts == num_posts + 3
+        assert [r.txn_id for r in results] == ["{:064x}".format(n) for n in range(42, 48)]
+        assert [r.receipt["success"] for r in results] == [True] * 5 + [False]
+        assert all(r.error is None for r in results)
+        assert contract.last_receipt == results[-1].receipt
+
+        results = contract.call_batch([("Transfer", [])], nonce=100, gas_price=1000000000, confirm=False)
+        assert results[0].txn_id == "{:064x}".format(100) and results[0].receipt is None
+
+        self.session.GetTransaction = lambda txn_id: None
+        results = contract.call_batch([("Transfer", [])], gas_price=1000000000, timeout=0, sleep=0)
+        assert isinstance(results[0].error, APIError) and results[0].receipt is None
+
+    def test_call_batch_errors(self):
+        contract = Contract(address="c341f2767efc6bbfbeba0c830b8433addd1885f8",
+                            status=Contract.Status.Deployed)
+        contract.account = Account(private_key="d0b47febbef2bd0c4a4ee04aa20b60d61eb02635e8df5e7fd62409a2b1f5ddf8")
+
+        create = self.session.CreateTransaction
+        get_txn = self.session.GetTransaction
+        post = self.session.post
+
+        def create_transaction(params):
+            if json.loads(params["data"])["_tag"] == "Drop":
+                raise APIError("Txn rejected")
+            return create(params)
+
+        def get_transaction(txn_id):
+            # the chain stops at the nonce gap
+            if int(txn_id, 16) > 43:
+                raise APIError("Txn Hash not Present")
+            return get_txn(txn_id)
+
+        failures = [ConnectionError("connection reset")]
+
+        def flaky_post(url, data=None, **kwargs):
+            if failures and b"GetTransaction" in data:
+                raise failures.pop()
+            return post(url, data=data, **kwargs)
+
+        self.session.CreateTransaction = create_transaction
+        self.session.GetTransaction = get_transaction
+        self.session.post = flaky_post
+
+        calls = [("Transfer", []), ("Transfer", []), ("Drop", []), ("Transfer", [])]
+        results = contract.call_batch(calls, gas_price=1000000000, timeout=1, sleep=0.1)
+        assert not failures
+        assert [r.receipt is not None for r in results] == [True, True, False, False]
+        assert results[2].txn_id is None and "rejected" in str(results[2].error)
+        assert results[3].txn_id and "nonce gap at 44" in str(results[3].error)
+
+    def test_deploy(self):
+        account = Account(private_key="d0b47febbef2bd0c4a4ee04aa20b60d61eb02635e8df5e7fd62409a2b1f5ddf8")
+        contract = Contract.new_from_code(open(path_join("contracts", "HelloWorld.scilla")).read())
+        contract.account = account
+
+        wait_txn_confirm = account.wait_txn_confirm
+
+        def transfer_and_wait(txn_id, **kwargs):
+            # another transfer of the account while the deploy is pending
+            account.transfer(zilkey.to_checksum_address(self.holder1), 1, nonce=50,
+                             gas_price=1000000000, data=json.dumps({"_tag": "Transfer"}))
+            return wait_txn_confirm(txn_id, **kwargs)
+
+        account.wait_txn_confirm = transfer_and_wait
+        contract.deploy(gas_price=1000000000, sleep=0)
+        assert account.last_params["nonce"] == 50
+        assert contract.status == Contract.Status.Deployed
+        assert contract.address == Contract.predict_address(account.address, 41)
+
+    def test_deployer(self):
+        account = Account(private_key="d0b47febbef2bd0c4a4ee04aa20b60d61eb02635e8df5e7fd62409a2b1f5ddf8")
+        code = open(path_join("contracts", "HelloWorld.scilla")).read()
+        version = Contract.value_dict("_scilla_version", "Uint32", "0")
+
+        deployer = ContractDeployer(account, gas_price=1000000000, sleep=0)
+        token = deployer.add(Contract.new_from_code(code))
+        bad = deployer.add(Contract.new_from_code(code), [version, Contract.value_dict("fail", "Bool", "True")])
+        market = deployer.add(Contract.new_from_code(code), [
+            version, Contract.value_dict("token", "ByStr20", token)
+        ])
+        orphan = deployer.add(Contract.new_from_code(code), [version], depends_on=[bad, token])
+        assert [len(wave) for wave in deployer.waves()] == [2, 2]
+
+        # nonce is carried to the next wave, GetBalance is read once
+        deployer.deploy()
+
+        assert token.status == Contract.Status.Deployed
+        assert token.address == Contract.predict_address(account.address, 41)
+        assert bad.status == Contract.Status.Rejected and bad.address is None
+        assert market.status == Contract.Status.Deployed
+        assert market.address == Contract.predict_address(account.address, 43)
+        assert orphan.status == Contract.Status.Failed
+        assert market.init[1]["value"] == token.address0x
+        assert token.account is account and market.account is account
+        result = market.call("Transfer", [], nonce=45, gas_price=1000000000, sleep=0)
+        assert result["receipt"]["success"]
+        assert sorted(nonce for nonce, _ in self.session.deployed) == [42, 43, 44]
+
+        # all in one wave with predicted addresses
+        self.session.deployed = []
+        deployer = ContractDeployer(account, gas_price=1000000000, sleep=0, predict_addresses=True)
+        market = deployer.add(Contract.new_from_code(code), [
+            version, Contract.value_dict("token", "ByStr20", token)
+        ])
+        token = deployer.add(Contract.new_from_code(code), depends_on=[market])
+        app = deployer.add(Contract.new_from_code(code), [
+            version, Contract.value_dict("market", "ByStr20", market)
+        ])
+        self.session.nonce = nonce = 44
+        deployer.deploy()
+        assert sorted(nonce for nonce, _ in self.session.deployed) == [nonce + 1, nonce + 2, nonce + 3]
+        assert app.init[1]["value"] == market.address0x
+        assert app.address == Contract.predict_address(account.address, nonce + 2)
+        assert all(c.status == Contract.Status.Deployed for c in (market, token, app))
+
+        with pytest.raises(ValueError):
+            deployer = ContractDeployer(account)
+            deployer.add(Contract.new_from_code(code), depends_on=[Contract.new_from_code(code)])
+            deployer.waves()
+
+
+class TestContractAddress:
+    def test_predict_address(self):
+        # contracts deployed by tests/crypto/zilliqa_keystore.json
+        owner = "526a2719b5855ef7d396a62b912a0dfa08e6ae63"
+        assert Contract.predict_address(owner, 9) == TestContract.contracts["hello"]
+        assert Contract.predict_address(zilkey.to_bech32_address(owner), 10) == TestContract.contracts["test"]
+        assert zilkey.contract_address("0x" + owner.upper(), 9) == TestContract.contracts["hello"]
+        with pytest.raises(ValueError):
+            Contract.predict_address("not an address", 1)
+
+
+class TestContractStateView:
+    code = """
+    field total_supply : Uint128 = init_supply
+    field owner : ByStr20 = init_owner
+    field balances : Map ByStr20 Uint128 = Emp ByStr20 Uint128
+    field allowances : Map ByStr20 (Map ByStr20 Uint128)
+      = Emp ByStr20 (Map ByStr20 Uint128)
+    field names : Map Uint32 String = Emp Uint32 String
+    """
+
+    def test_types(self):
+        types = scilla_field_types(self.code)
+        assert types == {
+            "total_supply": "Uint128", "owner": "ByStr20",
+            "balances": "Map ByStr20 Uint128",
+            "allowances": "Map ByStr20 (Map ByStr20 Uint128)",
+            "names": "Map Uint32 String",
+        }
+        assert parse_scilla_type(types["allowances"]) == ("Map", "ByStr20", ("Map", "ByStr20", "Uint128"))
+        assert parse_scilla_type("List Uint128") == "List Uint128"
+        with pytest.raises(ValueError):
+            parse_scilla_type("Map ByStr20")
+
+    def test_view(self):
+        holders = ["0x{:040x}".format(i * 7919) for i in range(1, 1001)]
+        state = {
+            "_balance": "0",
+            "total_supply": str(sum(range(1, 1001)) * 10 ** 18),
+            "owner": holders[0],
+            "balances": {holder: str((i + 1) * 10 ** 18) for i, holder in enumerate(holders)},
+            "allowances": {holders[0]: {holders[1]: "5"}},
+            "names": {"2": "two", "10": "ten"},
+        }
+        contract = Contract(address="c341f2767efc6bbfbeba0c830b8433addd1885f8",
+                            code=self.code, state=state, status=Contract.Status.Deployed)
+        view = ContractStateView.from_contract(contract)
+        assert view.decoded_fields == []
+
+        assert view["total_supply"] == sum(range(1, 1001)) * 10 ** 18
+        assert view["owner"] == bytes.fromhex(holders[0][2:])
+        assert view.decoded_fields == ["total_supply", "owner"]
+        assert view["_balance"] == "0"
+
+        balances = view["balances"]
+        assert len(balances) == 1000
+        assert balances[holders[9]] == 10 * 10 ** 18
+        assert balances.get(zilkey.to_bech32_address(holders[9])) == 10 * 10 ** 18
+        assert "0x" + "f" * 40 not in balances
+        assert balances.total() == view["total_supply"]
+        assert view.top("balances", 3) == [
+            (bytes.fromhex(holders[i][2:]), (i + 1) * 10 ** 18) for i in (999, 998, 997)
+        ]
+
+        assert view["allowances"][holders[0]][holders[1]] == 5
+        assert view["names"][10] == "ten" and list(view["names"].keys()) == [2, 10]
+        with pytest.raises(ValueError):
+            view.top("total_supply", 1)
+
+    def test_uint256(self):
+        holders = ["0x{:040x}".format(i) for i in range(1, 4)]
+        big = 2 ** 200
+        view = ContractStateView(
+            {"balances": {holders[0]: str(big), holders[1]: str(2 ** 128), holders[2]: "1"}},
+            {"balances": "Map ByStr20 Uint256"}
+        )
+        balances = view["balances"]
+        assert balances[holders[0]] == big
+        assert balances.total() == big + 2 ** 128 + 1
+        assert balances.top(2) == [(bytes.fromhex(holders[0][2:]), big),
+                                   (bytes.fromhex(holders[1][2:]), 2 ** 128)]
+
+        zilkey.clear_address_cache()
+        holders = ["0x{:040x}".format(i) for i in range(1000)]
+        ContractStateView({"balances": {h: "1" for h in holders}},
+                          {"balances": "Map ByStr20 Uint128"})["balances"]
+        assert zilkey.address_cache_info().size == 0
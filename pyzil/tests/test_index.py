@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+
+import time
+
+import pytest
+
+from pyzil.crypto import zilkey
+from pyzil.zilliqa.index import ChainIndex, txn_relations, ROLE_SENDER, ROLE_CONTRACT, ROLE_DEPLOY
+from pyzil.zilliqa.sync import BlockSync, SyncedBlock
+
+
+SENDER_KEY = zilkey.ZilKey(private_key="d0b47febbef2bd0c4a4ee04aa20b60d61eb02635e8df5e7fd62409a2b1f5ddf8")
+TOKEN = "c341f2767efc6bbfbeba0c830b8433addd1885f8"
+
+
+def make_txn(block_num, i):
+    to_addr = "{:040x}".format(i % 50 + 1)
+    txn = {
+        "ID": "{:032x}{:032x}".format(block_num, i),
+        "senderPubKey": "0x" + SENDER_KEY.keypair_str.public,
+        "toAddr": to_addr, "amount": str(i), "nonce": str(block_num * 1000 + i + 1),
+        "receipt": {"success": True, "epoch_num": str(block_num)},
+    }
+    if i % 5 == 0:
+        txn.update(toAddr=TOKEN, amount="0", data='{"_tag": "Transfer", "params": []}')
+        txn["receipt"]["event_logs"] = [{
+            "address": "0x" + TOKEN, "_eventname": "TransferSuccess",
+            "params": [{"vname": "recipient", "type": "ByStr20", "value": "0x" + to_addr}],
+        }]
+    return txn
+
+
+def make_blocks(start, end, txns_per_block=10):
+    return [
+        SyncedBlock(n, {"header": {"BlockNum": str(n), "Timestamp": str(1600000000 + n)},
+                        "body": {"BlockHash": "{:064x}".format(n)}},
+                    [make_txn(n, i) for i in range(txns_per_block)])
+        for n in range(start, end)
+    ]
+
+
+class FakeSync(BlockSync):
+    def __init__(self, blocks):
+        super().__init__(api=object())
+        self.synced = blocks
+
+    def blocks(self, start=None, end=None, follow=False, poll_interval=10.0):
+        end = len(self.synced) if end is None else end
+        return iter(self.synced[start:end])
+
+
+class TestChainIndex:
+    def test_relations(self):
+        txn = make_txn(1, 5)
+        relations = dict((role, address) for address, role in txn_relations(txn))
+        assert relations[ROLE_SENDER] == SENDER_KEY.address
+        assert relations[ROLE_CONTRACT] == TOKEN
+
+        deploy = dict(make_txn(1, 1), toAddr="0" * 40, nonce="10", code="scilla")
+        relations = dict((role, address) for address, role in txn_relations(deploy))
+        assert relations[ROLE_DEPLOY] == zilkey.contract_address(SENDER_KEY.address, 9)
+
+    def test_index(self, tmp_path):
+        db_file = str(tmp_path / "chain.db")
+        with ChainIndex(db_file) as index:
+            assert index.last_block is None
+            assert index.sync(FakeSync(make_blocks(0, 300)), end=200, commit_every=64) == 200
+            assert index.last_block == 199
+            # resume after the last indexed block
+            assert index.sync(FakeSync(make_blocks(0, 300))) == 100
+            assert index.stats()["txns"] == 3000
+
+        # offline queries on reopened index
+        with ChainIndex(db_file) as index:
+            assert index.last_block == 299
+            assert index.block(7)["header"]["BlockNum"] == "7"
+            assert index.block(300) is None
+
+            txns = index.txns_in_block(7)
+            assert [txn["ID"] for txn in txns] == [make_txn(7, i)["ID"] for i in range(10)]
+            assert index.transaction(txns[3]["ID"]) == txns[3]
+
+            recipient = "{:040x}".format(3)
+            history = index.history(zilkey.to_bech32_address(recipient), limit=5)
+            assert [int(txn["receipt"]["epoch_num"]) for txn in history] == [299, 298, 297, 296, 295]
+            assert all(txn["toAddr"] == recipient for txn in history)
+
+            calls = index.contract_calls(TOKEN, limit=1000)
+            assert len(calls) == 600
+            assert calls[0]["ID"] == make_txn(299, 5)["ID"]
+
+            # pages are in nonce order inside blocks
+            pages = index.history(SENDER_KEY.address, limit=15) + \
+                index.history(SENDER_KEY.address, limit=15, offset=15)
+            assert [txn["ID"] for txn in pages] == \
+                [make_txn(n, i)["ID"] for n in (299, 298, 297) for i in range(9, -1, -1)]
+
+            # a transfer to self is listed once
+            self_txn = dict(make_txn(300, 1), toAddr=SENDER_KEY.address)
+            index.add_blocks([make_blocks(300, 301)[0]._replace(txns=[self_txn])])
+            assert [txn["ID"] for txn in index.history(SENDER_KEY.address, limit=2)] == \
+                [self_txn["ID"], make_txn(299, 9)["ID"]]
+
+            start = time.perf_counter()
+            for _ in range(100):
+                index.history(SENDER_KEY.address, limit=20)
+            print("history query: {:.3f}ms".format((time.perf_counter() - start) * 10))
+
+            with pytest.raises(ValueError):
+                index.history("not an address")
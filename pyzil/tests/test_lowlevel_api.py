@@ -3,10 +3,13 @@
 # Copyright (C) 2019  Gully Chen
 # MIT License
 
+import json
 import pytest
 
 from pprint import pprint
 from pyzil.zilliqa.api import ZilliqaAPI, APIError
+from pyzil.zilliqa.api import JSON_CODECS, get_json_codec, available_json_codecs, benchmark_json_codecs
+from pyzil.tests.fakes import FakeHTTPResponse, FakeSession
 
 
 class TestAPI:
@@ -139,5 +142,73 @@ class TestAPI:
             api.GetBalance("b50c2404e699fd985f71b2c3f032059f13d6543c")
 
 
-
-
+class TestJsonCodec:
+    def test_codecs(self):
+        assert get_json_codec().name == get_json_codec("fastest").name
+        assert get_json_codec().name in JSON_CODECS
+        assert get_json_codec("json").name == "json"
+        with pytest.raises(ValueError):
+            get_json_codec("xml")
+
+        obj = {"balance": "340282366920938463463374607431768211455", "nonce": 2 ** 70, "s": "ΞΘ"}
+        for codec in available_json_codecs():
+            assert json.loads(codec.dumps(obj)) == obj
+            assert codec.loads(json.dumps(obj))["s"] == "ΞΘ"
+            # integers beyond 64 bits are decoded exactly
+            assert codec.loads(json.dumps(obj)) == obj
+            assert codec.loads(b'[123456789012345678901234567890, -18446744073709551616]') == \
+                [123456789012345678901234567890, -18446744073709551616]
+            assert codec.loads("123456789012345678901234567890") == 123456789012345678901234567890
+
+    def test_request(self):
+        api = ZilliqaAPI("http://localhost:4201", codec="json")
+        api.session = FakeSession(
+            FakeHTTPResponse(b'{"jsonrpc":"2.0","result":"333","id":"1"}'),
+            FakeHTTPResponse(b'{"jsonrpc":"2.0","result":{"nonce":1},"id":"1"}'),
+            FakeHTTPResponse(b'{"jsonrpc":"2.0","error":{"code":-5,"message":"Account is not created"},"id":"1"}'),
+            FakeHTTPResponse(b"Bad Gateway", status_code=502),
+        )
+        assert api.GetNetworkId() == "333"
+        assert api.GetBalance("b50c2404e699fd985f71b2c3f032059f13d6543b") == {"nonce": 1}
+        with pytest.raises(APIError, match="Account is not created"):
+            api.GetBalance("0000000000000000000000000000000000000000")
+        with pytest.raises(APIError, match="502"):
+            api.GetNetworkId()
+
+        assert api.session.requests[:2] == [
+            {"jsonrpc": "2.0", "method": "GetNetworkId", "params": [], "id": "1"},
+            {"jsonrpc": "2.0", "method": "GetBalance",
+             "params": ["b50c2404e699fd985f71b2c3f032059f13d6543b"], "id": "1"},
+        ]
+        assert api.request_template("GetNetworkId") is api.request_template("GetNetworkId")
+
+    def test_call_batch(self):
+        from requests import ConnectionError
+
+        api = ZilliqaAPI("http://localhost:4201", codec="json")
+        api.session = FakeSession(
+            FakeHTTPResponse(b'[{"jsonrpc":"2.0","result":"1","id":1},{"jsonrpc":"2.0","result":"0","id":0}]'),
+            ConnectionError("connection reset"),
+            FakeHTTPResponse(b"Bad Gateway", status_code=502),
+            FakeHTTPResponse(b'[{"jsonrpc":"2.0","error":{"code":-1,"message":"failed"},"id":0}]'),
+        )
+        results = api.call_batch([("GetBalance", (str(i), )) for i in range(7)], batch_size=2)
+        # a failed chunk does not lose the results of other chunks
+        assert results[:2] == ["0", "1"]
+        assert all(isinstance(r, APIError) for r in results[2:])
+        assert "connection reset" in str(results[2]) and "502" in str(results[5])
+        assert str(results[6]) == "failed"
+
+    def test_benchmark(self):
+        # recorded shape of GetSmartContractState of a token with many holders
+        state = {
+            "_balance": "0",
+            "balances": {"0x{:040x}".format(i): str(i * 10 ** 12) for i in range(20000)},
+            "total_supply": "1000000000000000000000",
+        }
+        response = json.dumps({"id": "1", "jsonrpc": "2.0", "result": state}).encode()
+
+        results = benchmark_json_codecs(response, number=3)
+        for result in results:
+            print("{}: dumps {:.4f}s loads {:.4f}s".format(*result))
+        assert {result.name for result in results} >= {"json"}
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from pyzil import cli
+from pyzil.account import Account
+from pyzil.payout import PayoutRunner, read_recipients
+from pyzil.zilliqa import chain
+from pyzil.zilliqa.units import Zil, Qa
+from pyzil.tests.fakes import FakeAPI
+
+
+PRIVATE_KEY = "d0b47febbef2bd0c4a4ee04aa20b60d61eb02635e8df5e7fd62409a2b1f5ddf8"
+TO_ADDR = "zil1r5verznnwvrzrz6uhveyrlxuhkvccwnju4aehf"
+
+
+class FakeTransferAPI(FakeAPI):
+    def __init__(self):
+        super().__init__()
+        self.fail_nonces = set()
+        self.accepted = {}
+
+    def GetBalance(self, address):
+        return {"balance": "0", "nonce": 10}
+
+    def CreateTransaction(self, params):
+        nonce = params["nonce"]
+        if nonce in self.fail_nonces:
+            raise RuntimeError("node is busy")
+        if nonce in self.accepted:
+            raise RuntimeError("nonce is used")
+        self.accepted[nonce] = params
+        return {"TranID": "{:064x}".format(nonce)}
+
+
+class TestPayout:
+    def setup_method(self, method):
+        self.api = FakeTransferAPI()
+        self.chain = chain.BlockChain("http://localhost:4201", version=65537, network_id=1)
+        self.chain.api = self.api
+        chain.set_active_chain(self.chain)
+
+    def teardown_method(self, method):
+        chain.set_active_chain(None)
+
+    def test_read_recipients(self, tmp_path):
+        csv_file = tmp_path / "payout.csv"
+        csv_file.write_text("address,amount\n{},1.5\n\n{},0.000000000001\n".format(TO_ADDR, TO_ADDR))
+        assert list(read_recipients(str(csv_file))) == [(TO_ADDR, Zil("1.5")), (TO_ADDR, Qa(1))]
+
+        jsonl_file = tmp_path / "payout.jsonl"
+        jsonl_file.write_text(json.dumps({"address": TO_ADDR, "amount": 3}) + "\n")
+        recipients = list(read_recipients(str(jsonl_file), unit="qa"))
+        assert recipients == [(TO_ADDR, Qa(3))] and isinstance(recipients[0][1], Qa)
+
+        with pytest.raises(ValueError):
+            list(read_recipients(str(csv_file), fmt="xml"))
+
+    def test_resume(self, tmp_path):
+        account = Account(private_key=PRIVATE_KEY)
+        checkpoint_file = str(tmp_path / "payout.checkpoint")
+        recipients = [(TO_ADDR, Zil(i + 1)) for i in range(7)]
+
+        self.api.fail_nonces = {13, 14}
+        runner = PayoutRunner(account, checkpoint_file, gas_price=1000, chunk_size=3,
+                              max_workers=4, retries=1)
+        stats = runner.run(recipients)
+        assert (stats.total, stats.sent, stats.failed) == (7, 5, 2)
+        assert stats.amount_sent == Zil(1 + 2 + 5 + 6 + 7).toQa()
+        assert sorted(self.api.accepted) == [11, 12, 15, 16, 17]
+
+        # resume resends the same signed txns and does not pay twice
+        self.api.fail_nonces = set()
+        stats = runner.run(recipients + [(TO_ADDR, Zil(8))])
+        assert (stats.total, stats.sent, stats.failed, stats.skipped) == (8, 3, 0, 5)
+        assert sorted(self.api.accepted) == list(range(11, 19))
+        assert int(self.api.accepted[13]["amount"]) == Zil(3).toQa()
+        assert int(self.api.accepted[18]["amount"]) == Zil(8).toQa()
+
+        stats = runner.run(recipients + [(TO_ADDR, Zil(8))])
+        assert (stats.sent, stats.skipped) == (0, 8)
+
+    def test_invalid_rows(self, tmp_path):
+        account = Account(private_key=PRIVATE_KEY)
+        csv_file = tmp_path / "payout.csv"
+        csv_file.write_text("{},1\nnot an address,2\n{},abc\n{}\n{},5\n".format(
+            TO_ADDR, TO_ADDR, TO_ADDR, TO_ADDR))
+        assert [amount for _, amount in read_recipients(str(csv_file))] == \
+            [Zil(1), Zil(2), None, None, Zil(5)]
+
+        checkpoint_file = str(tmp_path / "payout.checkpoint")
+        runner = PayoutRunner(account, checkpoint_file, gas_price=1000, chunk_size=2)
+        stats = runner.run(read_recipients(str(csv_file)))
+        assert (stats.total, stats.sent, stats.invalid) == (5, 2, 3)
+        assert sorted(self.api.accepted) == [11, 12]
+        assert int(self.api.accepted[12]["amount"]) == Zil(5).toQa()
+
+        # fixed rows are paid on resume, invalid records are not duplicated
+        csv_file.write_text("{},1\n{},2\n{},abc\n{}\n{},5\n".format(
+            TO_ADDR, TO_ADDR, TO_ADDR, TO_ADDR, TO_ADDR))
+        stats = runner.run(read_recipients(str(csv_file)))
+        assert (stats.sent, stats.skipped, stats.invalid) == (1, 2, 2)
+        assert int(self.api.accepted[13]["amount"]) == Zil(2).toQa()
+        with open(checkpoint_file) as f:
+            statuses = [json.loads(line)["status"] for line in f]
+        assert statuses.count("invalid") == 3
+
+    def test_crash_resume(self, tmp_path, monkeypatch):
+        account = Account(private_key=PRIVATE_KEY)
+        recipients = [(TO_ADDR, Zil(1)), ("not an address", Zil(2)), (TO_ADDR, Zil(3))]
+        checkpoint_file = str(tmp_path / "payout.checkpoint")
+
+        def crash(*args, **kwargs):
+            raise RuntimeError("crash")
+
+        with monkeypatch.context() as m:
+            m.setattr(account, "sign_transfers", crash)
+            with pytest.raises(RuntimeError):
+                PayoutRunner(account, checkpoint_file, gas_price=1000).run(recipients)
+        assert self.api.accepted == {}
+
+        # rows without a signed record are paid on resume
+        stats = PayoutRunner(account, checkpoint_file, gas_price=1000).run(recipients)
+        assert (stats.total, stats.sent, stats.invalid, stats.skipped) == (3, 2, 1, 0)
+        assert [int(params["amount"]) for _, params in sorted(self.api.accepted.items())] == \
+            [Zil(1).toQa(), Zil(3).toQa()]
+
+    def test_cli(self, tmp_path, monkeypatch):
+        csv_file = tmp_path / "payout.csv"
+        csv_file.write_text("{},1\n{},2\n".format(TO_ADDR, TO_ADDR))
+        monkeypatch.setitem(cli.CHAINS, "isolated", self.chain)
+
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, ["payout", str(csv_file), "--chain", "isolated",
+                                         "--private-key", PRIVATE_KEY, "--gas-price", "1000"])
+        assert result.exit_code == 0, result.output
+        assert "sent 2" in result.output
+        assert sorted(self.api.accepted) == [11, 12]
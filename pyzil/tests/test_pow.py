@@ -3,6 +3,9 @@
 # Copyright (C) 2019  Gully Chen
 # MIT License
 
+import timeit
+import pytest
+
 from pyzil.common import utils
 from pyzil import pow
 
@@ -27,6 +30,61 @@ class TestPoW:
 
         assert pow.difficulty_to_boundary_divided(33, 4, 32) != pow.difficulty_to_boundary_divided(33, 8, 32)
 
+    def test_boundary_int(self):
+        for n_divided, n_divided_start in [(8, 32), (4, 32), (16, 20)]:
+            for i in range(256):
+                boundary = pow.difficulty_to_boundary_divided(i, n_divided, n_divided_start)
+                int_boundary = pow.difficulty_to_boundary_int_divided(i, n_divided, n_divided_start)
+                assert int_boundary == utils.bytes_to_int(boundary)
+                assert pow.boundary_int_to_difficulty_divided(
+                    int_boundary, n_divided, n_divided_start
+                ) == i
+
+        for i in range(256):
+            int_boundary = pow.difficulty_to_boundary_int(i)
+            assert int_boundary == utils.bytes_to_int(pow.difficulty_to_boundary(i))
+            assert pow.difficulty_to_hashpower(i) == pow.boundary_to_hashpower(int_boundary)
+
+        hash_1 = utils.hex_str_to_bytes("00000b184f1fdd88bfd94c86c39e65db0c36144d5e43f745f722196e730cb614")
+        boundary20 = pow.difficulty_to_boundary(20)
+        boundary21 = pow.difficulty_to_boundary(21)
+        assert pow.is_less_or_equal(hash_1, boundary20)
+        assert not pow.is_less_or_equal(hash_1, boundary21)
+        assert pow.is_less_or_equal(hash_1, hash_1)
+        assert pow.is_less_or_equal(utils.bytes_to_hex_str(hash_1), boundary20)
+        assert pow.is_less_or_equal(hash_1[1:], boundary20)
+        assert pow.is_less_or_equal_int(hash_1, pow.difficulty_to_boundary_int(20))
+        assert not pow.is_less_or_equal_int(hash_1, pow.difficulty_to_boundary_int(21))
+
+    def test_boundary_benchmark(self):
+        def old_boundary_divided(difficulty, n_divided=8, n_divided_start=32):
+            n_level = (difficulty - n_divided_start) // n_divided
+            m_sub_level = (difficulty - n_divided_start) % n_divided
+            int_boundary = utils.bytes_to_int(pow._calc_boundary(n_divided_start + n_level))
+            int_boundary -= ((int_boundary >> 1) // n_divided) * m_sub_level
+            return utils.int_to_bytes(int_boundary, n_bytes=32)
+
+        def old_is_less_or_equal(hash_1, hash_2):
+            return utils.bytes_to_int(hash_1) <= utils.bytes_to_int(hash_2)
+
+        hash_1 = utils.rand_bytes(32)
+        boundary = pow.difficulty_to_boundary_divided(100)
+        int_boundary = pow.difficulty_to_boundary_int_divided(100)
+        number = 20000
+
+        results = {
+            "boundary_divided (old)": timeit.timeit(lambda: old_boundary_divided(100), number=number),
+            "boundary_divided (table)": timeit.timeit(lambda: pow.difficulty_to_boundary_divided(100), number=number),
+            "boundary_int_divided (table)": timeit.timeit(lambda: pow.difficulty_to_boundary_int_divided(100), number=number),
+            "is_less_or_equal (old)": timeit.timeit(lambda: old_is_less_or_equal(hash_1, boundary), number=number),
+            "is_less_or_equal (bytes)": timeit.timeit(lambda: pow.is_less_or_equal(hash_1, boundary), number=number),
+            "is_less_or_equal_int": timeit.timeit(lambda: pow.is_less_or_equal_int(hash_1, int_boundary), number=number),
+        }
+        for name, seconds in results.items():
+            print("{:<32} {:>10.0f} ops/s".format(name, number / seconds))
+
+        assert old_boundary_divided(100) == pow.difficulty_to_boundary_divided(100)
+
     def test_pow(self):
         block_num = 22
         header = utils.hex_str_to_bytes("372eca2454ead349c3df0ab5d00b0b706b23e49d469387db91811cee0358fc6d")
@@ -50,3 +108,90 @@ class TestPoW:
         assert not pow.verify_pow_work(30000, header, excepted_mix, nonce, boundary20)
         assert not pow.verify_pow_work(30001, header, excepted_mix, nonce, boundary20)
 
+    def test_pow_full(self, tmp_path):
+        cache_bytes = utils.rand_bytes(pow.HASH_BYTES * 97)
+        cache_words = pow.bytes_to_words(cache_bytes)
+        full_size = pow.MIX_BYTES * 131
+        dag_file = str(tmp_path / "full-test")
+
+        pow.generate_dataset(cache_bytes, full_size, dag_file, workers=2)
+        dataset = pow.Dataset(0, full_size, dag_file)
+
+        for i in range(full_size // pow.HASH_BYTES):
+            assert pow.words_to_bytes(dataset.lookup(i)) == pow.calc_dataset_item(cache_words, i)
+
+        header = utils.rand_bytes(32)
+        for nonce in [0, 1, 0x495732e0ed7a801c]:
+            light = pow.hashimoto(
+                header, nonce, full_size,
+                lambda i: pow.bytes_to_words(pow.calc_dataset_item(cache_words, i))
+            )
+            assert pow.hashimoto_full(dataset, header, nonce) == light
+        dataset.close()
+
+        with open(dag_file, "r+b") as f:
+            f.write(b"\x00")
+        with pytest.raises(ValueError):
+            pow.Dataset(0, full_size, dag_file)
+
+    def test_pow_full_vector(self, tmp_path):
+        block_num = 22
+        header = utils.hex_str_to_bytes("372eca2454ead349c3df0ab5d00b0b706b23e49d469387db91811cee0358fc6d")
+        nonce = 0x495732e0ed7a801c
+        cache_bytes = pow.get_cache(block_num)
+        cache_words = pow.bytes_to_words(cache_bytes)
+        full_size = pow.get_full_size(block_num)
+
+        # sparse DAG file with only the items accessed by this nonce
+        items = {}
+
+        def lookup(i):
+            items[i] = pow.calc_dataset_item(cache_words, i)
+            return pow.bytes_to_words(items[i])
+
+        pow.hashimoto(header, nonce, full_size, lookup)
+        dag_file = str(tmp_path / "full-sparse")
+        with open(dag_file, "wb") as f:
+            f.write(pow.DAG_MAGIC_NUM)
+            f.truncate(len(pow.DAG_MAGIC_NUM) + full_size)
+            for i, item in items.items():
+                f.seek(len(pow.DAG_MAGIC_NUM) + i * pow.HASH_BYTES)
+                f.write(item)
+
+        dataset = pow.Dataset(block_num // pow.EPOCH_LENGTH, full_size, dag_file)
+        light = pow.hashimoto_light(block_num, cache_bytes, header, nonce)
+        mix_digest, result = pow.hashimoto_full(dataset, header, nonce)
+        dataset.close()
+        assert (mix_digest, result) == (light[b"mix digest"], light[b"result"])
+        assert result == utils.hex_str_to_bytes("00000b184f1fdd88bfd94c86c39e65db0c36144d5e43f745f722196e730cb614")
+
+    def test_pow_mode(self):
+        assert pow.get_full_size(0) == 1073739904
+        assert pow.get_full_size(30000) == 1082130304
+
+        try:
+            pow.set_pow_mode(pow.POW_MODE_AUTO, verify_rate=0)
+            assert pow.select_pow_mode(22) == pow.POW_MODE_LIGHT
+
+            pow.set_pow_mode(pow.POW_MODE_FULL)
+            assert pow.select_pow_mode(22) == pow.POW_MODE_FULL
+
+            with pytest.raises(ValueError):
+                pow.set_pow_mode("unknown")
+        finally:
+            pow.set_pow_mode(pow.POW_MODE_LIGHT, verify_rate=0)
+
+    def test_pow_without_dag(self, tmp_path):
+        dag_dir = pow.pow_settings["dag_dir"]
+        try:
+            pow.set_pow_mode(pow.POW_MODE_FULL, dag_dir=str(tmp_path))
+            # DAG is never built implicitly, light mode is used until it exists
+            header = utils.rand_bytes(32)
+            assert pow.get_dataset(22) is None
+            with pytest.raises(ValueError):
+                pow.pow_hash_full(22, header, 1)
+            light = pow.hashimoto_light(22, pow.get_cache(22), header, 1)
+            assert pow.pow_hash(22, header, 1) == (light[b"mix digest"], light[b"result"])
+            assert list(tmp_path.iterdir()) == []
+        finally:
+            pow.set_pow_mode(pow.POW_MODE_LIGHT, dag_dir=dag_dir)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+
+import threading
+
+import pytest
+
+from pyzil.zilliqa.api import APIError
+from pyzil.zilliqa.sync import BlockSync, BlockSyncError, DS_BLOCK
+from pyzil.tests.fakes import FakeAPI
+
+
+class FakeChainAPI(FakeAPI):
+    """Chain of num_blocks blocks, block n has n % 3 transactions."""
+    def __init__(self, num_blocks, flaky_every=0):
+        super().__init__()
+        self.num_blocks = num_blocks
+        self.flaky_every = flaky_every
+        self.num_calls = 0
+        self.lock = threading.Lock()
+
+    def GetNumTxBlocks(self):
+        return str(self.num_blocks)
+
+    GetNumDSBlocks = GetNumTxBlocks
+
+    def _result(self, method, params):
+        with self.lock:
+            self.num_calls += 1
+            if self.flaky_every and self.num_calls % self.flaky_every == 0:
+                return APIError("node is busy")
+        n = params[0]
+        if method in ("GetTxBlock", "GetDsBlock"):
+            return {"header": {"BlockNum": n}}
+        if method == "GetTransactionsForTxBlock":
+            num_txns = int(n) % 3
+            if not num_txns:
+                return APIError("TxBlock has no transactions")
+            return [["{}-{}".format(n, i) for i in range(num_txns)], None]
+        if method == "GetTransaction":
+            return {"ID": n}
+        return APIError("unknown method")
+
+
+class TestBlockSync:
+    def test_ordered(self):
+        api = FakeChainAPI(500, flaky_every=7)
+        sync = BlockSync(api, workers=4, batch_size=9, retry_sleep=0)
+        blocks = list(sync.blocks())
+        assert [b.block_num for b in blocks] == list(range(500))
+        assert all(b.block["header"]["BlockNum"] == str(b.block_num) for b in blocks)
+        assert [len(b.txns) for b in blocks[:6]] == [0, 1, 2, 0, 1, 2]
+        assert blocks[5].txns == [{"ID": "5-0"}, {"ID": "5-1"}]
+        assert sync.cursor == 500
+
+        blocks = list(BlockSync(api, kind=DS_BLOCK, retry_sleep=0).blocks(10, 20))
+        assert [b.block_num for b in blocks] == list(range(10, 20))
+        assert all(b.txns is None for b in blocks)
+
+    def test_cursor(self, tmp_path):
+        cursor_file = str(tmp_path / "sync.cursor")
+        api = FakeChainAPI(100)
+        sync = BlockSync(api, workers=2, batch_size=7, cursor_file=cursor_file, cursor_interval=10)
+        for block in sync.blocks():
+            if block.block_num == 41:
+                break
+        assert sync.cursor == 41
+
+        sync = BlockSync(api, cursor_file=cursor_file)
+        assert sync.cursor == 41
+        assert [b.block_num for b in sync.blocks()] == list(range(41, 100))
+        assert BlockSync(api, cursor_file=cursor_file).cursor == 100
+
+    def test_retry_error(self):
+        api = FakeChainAPI(50, flaky_every=1)
+        sync = BlockSync(api, retries=2, retry_sleep=0)
+        with pytest.raises(BlockSyncError):
+            list(sync.blocks(0, 50))
+        assert sync.cursor == 0
@@ -3,7 +3,9 @@
 # Copyright (C) 2019  Gully Chen
 # MIT License
 
-from pyzil.zilliqa.units import Zil, Qa
+import pytest
+
+from pyzil.zilliqa.units import Zil, Qa, QaArray
 
 
 class TestUnits:
@@ -61,3 +63,74 @@ class TestUnits:
         print(repr(Zil(1234566789215.987654321)))
 
 
+    def test_fixed_point(self):
+        qa = Qa(2 ** 53 + 1)
+        assert qa.toZil().toQa() == qa
+        assert Zil("9007.199254740993") == qa
+        assert str(Zil("9007.199254740993")) == "9007.199254740993"
+        assert str(Zil("-0.000000000001")) == "-0.000000000001"
+        assert "{:.12f}".format(Zil("123456789012.000000000001")) == "123456789012.000000000001"
+
+        balances = [Qa(10 ** 12 + 1).toZil()] * 1000
+        assert sum(balances) == Qa((10 ** 12 + 1) * 1000)
+        assert sum(balances, Qa(0)) == Qa((10 ** 12 + 1) * 1000)
+
+        assert Zil(0.1) + Zil(0.2) == Zil("0.3")
+        assert Zil("0.0000000000005") == Qa(0)
+        assert Zil("0.0000000000015") == Qa(2)
+        assert Zil(1) / 3 == Qa(333333333333)
+        assert Zil(2) / 3 == Qa(666666666667)
+        assert Zil(5) // 2 == Zil(2)
+        assert Qa(5) < Zil(1)
+        assert int(Zil("-3.7")) == -3
+        assert round(Zil("1.235"), 2) == Zil("1.24")
+        assert isinstance(Zil(1), float)
+
+        with pytest.raises(ValueError):
+            Zil("abc")
+        with pytest.raises(ValueError):
+            Zil(float("nan"))
+
+        # Zil hashes as the equal number
+        assert hash(Zil(1)) == hash(1) == hash(Zil("1.0"))
+        assert {1.0: "x"}.get(Zil(1)) == "x"
+        assert Zil(0.5) in {0.5} and Zil("-2.25") in {-2.25}
+        assert len({Zil(1), Zil("1.0"), Zil(2)}) == 2
+
+    def test_qa_array(self):
+        amounts = QaArray.from_zils([Zil("1.5"), "0.000000000001", 2, Qa(3), 0.25])
+        assert len(amounts) == 5
+        assert list(amounts) == [Qa(1500000000000), Qa(1), Qa(2000000000000), Qa(3), Qa(250000000000)]
+        assert amounts.sum() == Zil("3.750000000004")
+        assert amounts.sum_zil() == Zil("3.750000000004")
+        assert amounts.to_zils()[0] == Zil("1.5")
+        assert amounts[1:3] == [Qa(1), Qa(2000000000000)]
+        assert isinstance(amounts[0], Qa)
+
+        big = QaArray([2 ** 128 - 1, 2 ** 64, 2 ** 64 - 1])
+        assert big.sum() == 2 ** 128 - 1 + 2 ** 64 + 2 ** 64 - 1
+        with pytest.raises(ValueError):
+            big.append(2 ** 128)
+        with pytest.raises(ValueError):
+            big.append(-1)
+
+        assert big.nlargest(2) == [0, 1]
+        assert QaArray([5, 2 ** 64, 7, 2 ** 64]).nlargest(3) == [3, 1, 2]
+
+        amounts = QaArray([1, 2, 3])
+        amounts[1] = 2 ** 100
+        assert amounts.pop() == 3
+        assert list(amounts) == [1, 2 ** 100]
+        with pytest.raises(ValueError):
+            amounts[0] = -1
+
+        shares = QaArray.split(Qa(100), [1, 1, 1])
+        assert list(shares) == [34, 33, 33]
+        assert shares.sum() == 100
+
+        shares = QaArray.split(Zil(1), [Zil("0.5"), 0.3, 2])
+        assert shares.sum() == Zil(1)
+        assert list(shares) == [178571428571, 107142857143, 714285714286]
+
+        with pytest.raises(ValueError):
+            QaArray.split(Qa(100), [0, 0])
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+
+import time
+
+import pytest
+
+from pyzil.crypto import zilkey
+from pyzil.zilliqa.api import APIError
+from pyzil.zilliqa.units import Qa
+from pyzil.zilliqa.watcher import BalanceWatcher, BalanceChange
+from pyzil.tests.test_index import SENDER_KEY, make_blocks
+from pyzil.tests.fakes import FakeAPI
+
+
+def make_address(i):
+    return "{:040x}".format(i)
+
+
+class FakeBalanceAPI(FakeAPI):
+    """Accounts 1..num_accounts have balance i * 100 and nonce i."""
+    def __init__(self, num_accounts):
+        super().__init__()
+        self.accounts = {make_address(i): {"balance": str(i * 100), "nonce": i}
+                         for i in range(1, num_accounts + 1)}
+        self.busy = set()
+        self.errors = {}    # type: dict
+
+    def GetBalance(self, address):
+        if address in self.busy:
+            raise APIError("node is busy")
+        if address not in self.accounts:
+            raise APIError("Account is not created")
+        return dict(self.accounts[address])
+
+    def call_batch(self, calls):
+        if len(self.batches) + 1 in self.errors:
+            self.batches.append(len(list(calls)))
+            raise self.errors.pop(len(self.batches))
+        return super().call_batch(calls)
+
+
+class TestBalanceWatcher:
+    def test_refresh(self):
+        api = FakeBalanceAPI(300)
+        watcher = BalanceWatcher((make_address(i) for i in range(1, 302)), api=api,
+                                 batch_size=100, max_rate=None)
+        watcher.add("0x" + make_address(1).upper())
+        assert len(watcher) == 301
+        assert zilkey.to_bech32_address(make_address(5)) in watcher
+        assert watcher.balance(make_address(5)) is None
+
+        received = []
+        watcher.add_listener(received.append)
+        assert watcher.refresh() == []
+        assert api.batches == [100, 100, 100, 1]
+        assert watcher.balance(make_address(5)) == Qa(500)
+        assert watcher.nonce(make_address(5)) == 5
+        assert watcher.balance(make_address(301)) == Qa(0)
+
+        api.accounts[make_address(5)] = {"balance": "450", "nonce": 6}
+        api.accounts[make_address(301)] = {"balance": "10", "nonce": 0}
+        changes = watcher.refresh()
+        assert changes == [
+            BalanceChange(make_address(5), Qa(500), Qa(450), 5, 6, None),
+            BalanceChange(make_address(301), Qa(0), Qa(10), 0, 0, None),
+        ]
+        assert received == [changes]
+
+        # failed address is retried by the next refresh
+        api.accounts[make_address(7)]["balance"] = "1"
+        api.busy.add(make_address(7))
+        assert watcher.refresh([make_address(7)]) == []
+        api.busy.clear()
+        changes = watcher.refresh([make_address(8)])
+        assert [change.address for change in changes] == [make_address(7)]
+
+        # a transport error fails its chunk only
+        api.accounts[make_address(1)]["balance"] = "0"
+        api.accounts[make_address(250)]["balance"] = "0"
+        api.errors[len(api.batches) + 3] = ConnectionError("connection reset")
+        changes = watcher.refresh()
+        assert changes == [BalanceChange(make_address(1), Qa(100), Qa(0), 1, 1, None)]
+        assert received[-1] == changes
+        changes = watcher.refresh([])
+        assert [change.address for change in changes] == [make_address(250)]
+
+        watcher.remove(make_address(5))
+        assert make_address(5) not in watcher
+        assert len(watcher) == 300
+        assert watcher.balance(make_address(301)) == Qa(10)
+        with pytest.raises(ValueError):
+            watcher.add("not an address")
+
+    def test_refresh_blocks(self):
+        api = FakeBalanceAPI(100)
+        watched = [make_address(i) for i in range(1, 101)] + [SENDER_KEY.address]
+        watcher = BalanceWatcher(watched, api=api, max_rate=None, emit_initial=True)
+        assert len(watcher.refresh()) == 101
+
+        # block 1 sends to addresses 2..10 except 6, token transfers to 1 and 6
+        # are not related to their native balances
+        api.batches = []
+        for address in watched:
+            if address in api.accounts:
+                api.accounts[address]["nonce"] += 1
+        changes = watcher.refresh_blocks(make_blocks(1, 2))
+        touched = {make_address(i + 1) for i in range(10) if i % 5} | {SENDER_KEY.address}
+        assert api.batches == [len(touched)]
+        assert {change.address for change in changes} == touched - {SENDER_KEY.address}
+        assert all(change.block_num == 1 for change in changes)
+        assert watcher.block_num == 1
+
+    def test_rate(self):
+        api = FakeBalanceAPI(300)
+        watcher = BalanceWatcher((make_address(i) for i in range(1, 301)), api=api,
+                                 batch_size=100, max_rate=1000)
+        start = time.monotonic()
+        watcher.refresh()
+        # the first batch is sent at once, the next two wait 0.1s each
+        assert time.monotonic() - start >= 0.19
+        assert watcher.num_calls == 300
@@ -12,10 +12,20 @@ Json-RPC interface of Zilliqa APIs.
 :license: MIT License, see LICENSE for more details.
 """
 
-from jsonrpcclient.exceptions import JsonRpcClientError
+import re
+import json
+import time
+from functools import lru_cache
+from collections import namedtuple, OrderedDict
+from typing import Optional, Union, List, Tuple, Sequence, Iterable
+
+from requests import RequestException
+from jsonrpcclient.response import SuccessResponse
 from jsonrpcclient.clients.http_client import HTTPClient
 
 
+BATCH_SIZE = 100
+
 INVALID_PARAMS = "INVALID_PARAMS: Invalid method parameters (invalid name and/or type) recognised"
 
 
@@ -23,6 +33,142 @@ class APIError(Exception):
     pass
 
 
+# dumps returns bytes
+JsonCodec = namedtuple("JsonCodec", ["name", "dumps", "loads"])
+APIResponse = namedtuple("APIResponse", ["data", "raw"])
+CodecBenchmark = namedtuple("CodecBenchmark", ["name", "dumps_time", "loads_time"])
+
+
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _json_codec() -> JsonCodec:
+    return JsonCodec("json", _json_dumps, json.loads)
+
+
+# integer number of 19+ digits, may be out of 64 bits range
+_BIG_INT_BYTES = re.compile(rb"(?:^|[:,\[])\s*-?\d{19,}")
+_BIG_INT_STR = re.compile(r"(?:^|[:,\[])\s*-?\d{19,}")
+
+
+def _exact_loads(fast_loads):
+    """Wrap loads of orjson/ujson, which turn integers beyond 64 bits into
+    float or fail, json is used if the document may have such integers.
+    """
+    def loads(data):
+        pattern = _BIG_INT_STR if isinstance(data, str) else _BIG_INT_BYTES
+        if pattern.search(data):
+            return json.loads(data)
+        return fast_loads(data)
+
+    return loads
+
+
+def _orjson_codec() -> JsonCodec:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # int out of 64 bits range
+            return _json_dumps(obj)
+
+    return JsonCodec("orjson", dumps, _exact_loads(orjson.loads))
+
+
+def _ujson_codec() -> JsonCodec:
+    import ujson
+
+    def dumps(obj) -> bytes:
+        try:
+            return ujson.dumps(obj, ensure_ascii=False).encode("utf-8")
+        except OverflowError:
+            return _json_dumps(obj)
+
+    return JsonCodec("ujson", dumps, _exact_loads(ujson.loads))
+
+
+FASTEST_JSON_CODEC = "fastest"
+DEFAULT_JSON_CODEC = FASTEST_JSON_CODEC
+
+# in order of preference for "fastest"
+JSON_CODECS = OrderedDict([
+    ("orjson", _orjson_codec),
+    ("ujson", _ujson_codec),
+    ("json", _json_codec),
+])
+
+
+@lru_cache(maxsize=None)
+def get_json_codec(name: Optional[str]=None) -> JsonCodec:
+    """Return json codec by name, default is "fastest", the fastest
+    installed one of orjson, ujson and json. Integers beyond 64 bits are
+    decoded exactly by every codec.
+    """
+    if name is None:
+        name = DEFAULT_JSON_CODEC
+    if name == FASTEST_JSON_CODEC:
+        for codec_factory in JSON_CODECS.values():
+            try:
+                return codec_factory()
+            except ImportError:
+                continue
+        raise RuntimeError("no json codec")    # pragma: no cover
+
+    if name not in JSON_CODECS:
+        raise ValueError("unknown json codec: {}".format(name))
+    return JSON_CODECS[name]()
+
+
+def available_json_codecs() -> List[JsonCodec]:
+    codecs = []
+    for name in JSON_CODECS:
+        try:
+            codecs.append(get_json_codec(name))
+        except ImportError:
+            continue
+    return codecs
+
+
+def benchmark_json_codecs(response_text: Union[str, bytes], number=5) -> List[CodecBenchmark]:
+    """Time loads/dumps of a recorded response with every installed codec,
+    return the best time of number runs in seconds.
+    """
+    obj = json.loads(response_text)
+    results = []
+    for codec in available_json_codecs():
+        dumps_time = loads_time = float("inf")
+        for _ in range(number):
+            start = time.perf_counter()
+            codec.loads(response_text)
+            loads_time = min(loads_time, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            codec.dumps(obj)
+            dumps_time = min(dumps_time, time.perf_counter() - start)
+        results.append(CodecBenchmark(codec.name, dumps_time, loads_time))
+    return results
+
+
+class RequestTemplate:
+    """Pre-serialised json-rpc request of a method, only params are encoded per call."""
+    __slots__ = ("method_name", "prefix", "suffix", "no_params")
+
+    def __init__(self, method_name: str, request_id="1"):
+        self.method_name = method_name
+        self.prefix = '{{"jsonrpc":"2.0","method":{},"params":'.format(
+            json.dumps(method_name)).encode("utf-8")
+        self.suffix = ',"id":{}}}'.format(json.dumps(request_id)).encode("utf-8")
+        self.no_params = self.prefix + b"[]" + self.suffix
+
+    def encode(self, params_bytes: bytes, request_id: Optional[int]=None) -> bytes:
+        if request_id is None:
+            return b"".join((self.prefix, params_bytes, self.suffix))
+        return b"".join((self.prefix, params_bytes, b',"id":%d}' % request_id))
+
+
 class ZilliqaAPI:
     """Json-RPC interface of Zilliqa APIs."""
     class APIMethod:
@@ -34,35 +180,110 @@ class ZilliqaAPI:
             resp = self.api.call(self.method_name, *params, **kwargs)
             return resp and resp.data and resp.data.result
 
-    def __init__(self, endpoint: str):
+    def __init__(self, endpoint: str, codec: Union[str, JsonCodec, None]=None):
         self.endpoint = endpoint
         self.api_client = HTTPClient(self.endpoint)
+        self.session = self.api_client.session
+        if not isinstance(codec, JsonCodec):
+            codec = get_json_codec(codec)
+        self.codec = codec
+        self._templates = {}
 
     def __getattr__(self, item: str):
         return ZilliqaAPI.APIMethod(self, method_name=item)
 
+    def request_template(self, method_name: str) -> RequestTemplate:
+        template = self._templates.get(method_name)
+        if template is None:
+            template = self._templates[method_name] = RequestTemplate(method_name)
+        return template
+
+    def encode_request(self, method_name: str, *params) -> bytes:
+        template = self.request_template(method_name)
+        if not params:
+            return template.no_params
+        return template.encode(self.codec.dumps(list(params)))
+
+    def encode_batch_request(self, calls: List[Tuple[str, Sequence]]) -> bytes:
+        dumps = self.codec.dumps
+        return b"[" + b",".join(
+            self.request_template(method_name).encode(dumps(list(params)), request_id=i)
+            for i, (method_name, params) in enumerate(calls)
+        ) + b"]"
+
+    def decode_response(self, content: bytes) -> SuccessResponse:
+        try:
+            data = self.codec.loads(content)
+        except ValueError as e:
+            raise APIError("invalid json response: {}".format(e))
+        if not isinstance(data, dict):
+            raise APIError("invalid json-rpc response")
+        if "error" in data:
+            raise APIError((data["error"] or {}).get("message"))
+        return SuccessResponse(result=data.get("result"),
+                               jsonrpc=data.get("jsonrpc", "2.0"), id=data.get("id"))
+
     def call(self, method_name: str, *params, **kwargs):
 
         def send_request(*_params):
-            try:
-                return self.api_client.request(
-                    method_name, *_params,
-                    request_id="1",
-                    trim_log_values=True, **kwargs
-                )
-            except JsonRpcClientError as _e:
-                raise APIError(_e)
+            resp = self.session.post(
+                self.endpoint, data=self.encode_request(method_name, *_params), **kwargs
+            )
+            if not 200 <= resp.status_code <= 299:
+                raise APIError("Received {} status code".format(resp.status_code))
+            return APIResponse(self.decode_response(resp.content), resp)
 
         try:
             return send_request(*params)
         except APIError as e:
-            # fix for jsonrpcclient < 3.3.1
+            # some servers only accept params in nested list
             if str(e) == INVALID_PARAMS:
                 if len(params) == 1 and isinstance(params[0], (dict, list)):
                     params = (list(params),)
                     return send_request(*params)
             raise e
 
+    def _post_batch(self, chunk: List[Tuple[str, Sequence]], **kwargs) -> List:
+        resp = self.session.post(self.endpoint, data=self.encode_batch_request(chunk), **kwargs)
+        if not 200 <= resp.status_code <= 299:
+            raise APIError("Received {} status code".format(resp.status_code))
+        try:
+            data = self.codec.loads(resp.content)
+        except ValueError as e:
+            raise APIError("invalid json response: {}".format(e))
+        if isinstance(data, dict):
+            # whole batch is rejected
+            raise APIError((data.get("error") or {}).get("message", "invalid batch response"))
+
+        results = [APIError("missing response")] * len(chunk)
+        for item in data:
+            request_id = item.get("id")
+            if not isinstance(request_id, int) or not 0 <= request_id < len(chunk):
+                continue
+            if "error" in item:
+                results[request_id] = APIError((item["error"] or {}).get("message"))
+            else:
+                results[request_id] = item.get("result")
+        return results
+
+    def call_batch(self, calls: Iterable[Tuple[str, Sequence]],
+                   batch_size=BATCH_SIZE, **kwargs) -> List:
+        """Send calls of (method_name, params) in json-rpc batch requests,
+        return results in order, a failed call gets APIError as result.
+        A failed request fails its chunk only, results of other chunks are kept.
+        """
+        calls = list(calls)
+        results = []
+        for start in range(0, len(calls), batch_size):
+            chunk = calls[start:start + batch_size]
+            try:
+                results.extend(self._post_batch(chunk, **kwargs))
+            except RequestException as e:
+                results.extend([APIError("batch request failed: {}".format(e))] * len(chunk))
+            except APIError as e:
+                results.extend([e] * len(chunk))
+        return results
+
 
 if "__main__" == __name__:
     _api = ZilliqaAPI("https://dev-api.zilliqa.com/")
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+"""
+pyzil.zilliqa.archive
+~~~~~~~~~~~~
+
+Append-only archive of transactions with receipts.
+
+The archive file is a header followed by records of a 4 bytes little-endian
+length and a serialized ProtoTransactionWithReceipt. Two index files are
+kept beside it, <archive>.blocks with (block_num, offset, count) of every
+block, and <archive>.txns with (txn id, offset) sorted by txn id.
+
+A writer that was not closed leaves a torn tail and no index entries for
+its blocks, opening a writer on the archive repairs both.
+
+:copyright: (c) 2019 by Gully Chen.
+:license: MIT License, see LICENSE for more details.
+"""
+
+import os
+import glob
+import json
+import mmap
+import heapq
+import struct
+import tempfile
+from typing import Optional, Iterable, Iterator, List, Dict, Tuple
+
+from pyzil.common import utils
+from pyzil.zilliqa.proto import messages_pb2 as pb2
+
+
+ARCHIVE_MAGIC = b"ZILTXA1\n"
+
+RECORD_LEN = struct.Struct("<I")
+BLOCK_ENTRY = struct.Struct("<QQI")
+TXN_ENTRY = struct.Struct("<32sQ")
+
+# index entries kept in memory before a sorted run is written to disk
+TXN_RUN_SIZE = 1 << 20
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _hex_bytes(value: Optional[str]) -> bytes:
+    return utils.hex_str_to_bytes(value) if value else b""
+
+
+def _upper_hex(value: bytes) -> str:
+    return "0x" + value.hex().upper()
+
+
+def txn_to_proto(txn: dict) -> pb2.ProtoTransactionWithReceipt:
+    """Convert transaction json of GetTransaction to protobuf message."""
+    proto = pb2.ProtoTransactionWithReceipt()
+    proto.transaction.tranid = _hex_bytes(txn["ID"])
+
+    info = proto.transaction.info
+    info.version = int(txn.get("version") or 0)
+    info.nonce = int(txn.get("nonce") or 0)
+    info.toaddr = _hex_bytes(txn.get("toAddr"))
+    info.senderpubkey.data = _hex_bytes(txn.get("senderPubKey"))
+    info.amount.data = utils.int_to_bytes(int(txn.get("amount") or 0), n_bytes=16)
+    info.gasprice.data = utils.int_to_bytes(int(txn.get("gasPrice") or 0), n_bytes=16)
+    info.gaslimit = int(txn.get("gasLimit") or 0)
+    if txn.get("code"):
+        info.code = txn["code"].encode("utf-8")
+    if txn.get("data"):
+        info.data = txn["data"].encode("utf-8")
+    proto.transaction.signature.data = _hex_bytes(txn.get("signature"))
+
+    receipt = txn.get("receipt") or {}
+    proto.receipt.receipt = json.dumps(receipt, separators=(",", ":")).encode("utf-8")
+    proto.receipt.cumgas = int(receipt.get("cumulative_gas") or 0)
+    return proto
+
+
+def proto_to_txn(proto: pb2.ProtoTransactionWithReceipt) -> dict:
+    """Convert protobuf message to transaction json as GetTransaction,
+    public key and signature are uppercase hex with 0x.
+    """
+    info = proto.transaction.info
+    txn = {
+        "ID": proto.transaction.tranid.hex(),
+        "version": str(info.version),
+        "nonce": str(info.nonce),
+        "toAddr": info.toaddr.hex(),
+        "senderPubKey": _upper_hex(info.senderpubkey.data),
+        "amount": str(utils.bytes_to_int(info.amount.data)),
+        "gasPrice": str(utils.bytes_to_int(info.gasprice.data)),
+        "gasLimit": str(info.gaslimit),
+        "signature": _upper_hex(proto.transaction.signature.data),
+        "receipt": json.loads(proto.receipt.receipt.decode("utf-8")),
+    }
+    if info.code:
+        txn["code"] = info.code.decode("utf-8")
+    if info.data:
+        txn["data"] = info.data.decode("utf-8")
+    return txn
+
+
+def _read_txn_index(txn_index_file: str) -> Iterator[Tuple[bytes, int]]:
+    if not os.path.isfile(txn_index_file):
+        return
+    with open(txn_index_file, "rb") as f:
+        while True:
+            entry = f.read(TXN_ENTRY.size)
+            if len(entry) < TXN_ENTRY.size:
+                return
+            yield TXN_ENTRY.unpack(entry)
+
+
+class TxnArchiveWriter:
+    """Append blocks of transactions to archive, the sorted txn index is
+    rewritten on close.
+
+    On open, records after the last complete block are truncated and
+    index entries of blocks appended since the last close are rebuilt,
+    ArchiveError is raised if the block index of records is missing.
+    Index entries are written to sorted run files every run_size
+    transactions and merged on close.
+    """
+
+    def __init__(self, archive_file: str, run_size=TXN_RUN_SIZE):
+        self.archive_file = archive_file
+        self.run_size = run_size
+        self._txn_entries = []    # type: List[Tuple[bytes, int]]
+        self._runs = []    # type: List[str]
+        for run_file in glob.glob(glob.escape(archive_file) + ".txns.*.run"):
+            # left by a writer that was not closed, rebuilt below
+            os.remove(run_file)
+
+        if not os.path.isfile(archive_file) or os.path.getsize(archive_file) == 0:
+            with open(archive_file, "wb") as f:
+                f.write(ARCHIVE_MAGIC)
+        else:
+            with open(archive_file, "rb") as f:
+                if f.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+                    raise ArchiveError("not a transaction archive: {}".format(archive_file))
+        self._recover()
+        self._file = open(archive_file, "ab")
+        self._blocks = open(archive_file + ".blocks", "ab")
+
+    @staticmethod
+    def _records_end(f, offset: int, count: int, size: int) -> Optional[int]:
+        """Return end offset of count records from offset, None if torn."""
+        for _ in range(count):
+            if offset + RECORD_LEN.size > size:
+                return None
+            f.seek(offset)
+            length, = RECORD_LEN.unpack(f.read(RECORD_LEN.size))
+            offset += RECORD_LEN.size + length
+        return offset if offset <= size else None
+
+    def _recover(self) -> None:
+        blocks_file = self.archive_file + ".blocks"
+        size = os.path.getsize(self.archive_file)
+        blocks = []
+        if os.path.isfile(blocks_file):
+            with open(blocks_file, "rb") as f:
+                data = f.read()
+            blocks = list(BLOCK_ENTRY.iter_unpack(data[:len(data) - len(data) % BLOCK_ENTRY.size]))
+        elif size > len(ARCHIVE_MAGIC):
+            # block numbers are not in records, the block index can not be rebuilt
+            raise ArchiveError("missing block index: {}".format(blocks_file))
+
+        # blocks are contiguous, only the last one may be torn
+        end = len(ARCHIVE_MAGIC)
+        with open(self.archive_file, "rb") as f:
+            while blocks:
+                _, offset, count = blocks[-1]
+                if offset <= size:
+                    block_end = self._records_end(f, offset, count, size)
+                    if block_end is not None:
+                        end = block_end
+                        break
+                blocks.pop()
+        if size != end:
+            os.truncate(self.archive_file, end)
+        with open(blocks_file, "ab") as f:
+            f.truncate(len(blocks) * BLOCK_ENTRY.size)
+
+        # the index covers the blocks written before the last close
+        txn_index_file = self.archive_file + ".txns"
+        num_indexed = 0
+        if os.path.isfile(txn_index_file):
+            num_indexed = os.path.getsize(txn_index_file) // TXN_ENTRY.size
+        offset, num_txns = None, 0
+        for _, block_offset, count in blocks:
+            if num_txns == num_indexed:
+                offset = block_offset
+                break
+            num_txns += count
+        else:
+            if num_txns == num_indexed:
+                offset = end
+        if offset is None:
+            # index does not match the blocks, rebuild it
+            os.remove(txn_index_file)
+            offset = len(ARCHIVE_MAGIC)
+
+        with open(self.archive_file, "rb") as f:
+            f.seek(offset)
+            while offset < end:
+                length, = RECORD_LEN.unpack(f.read(RECORD_LEN.size))
+                proto = pb2.ProtoTransactionWithReceipt()
+                proto.ParseFromString(f.read(length))
+                self._add_entry((proto.transaction.tranid.rjust(32, b"\0"), offset))
+                offset += RECORD_LEN.size + length
+
+    def _add_entry(self, entry: Tuple[bytes, int]) -> None:
+        self._txn_entries.append(entry)
+        if len(self._txn_entries) >= self.run_size:
+            self._write_run()
+
+    def _write_run(self) -> None:
+        self._txn_entries.sort()
+        fd, run_file = tempfile.mkstemp(
+            prefix=os.path.basename(self.archive_file) + ".txns.", suffix=".run",
+            dir=os.path.dirname(os.path.abspath(self.archive_file))
+        )
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"".join(TXN_ENTRY.pack(*entry) for entry in self._txn_entries))
+        self._runs.append(run_file)
+        self._txn_entries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add_block(self, block_num: int, txns: Iterable[dict]) -> int:
+        """Append transactions of block, return number of transactions."""
+        offset = self._file.tell()
+        pos = offset
+        count = 0
+        chunks = []
+        for txn in txns:
+            record = txn_to_proto(txn).SerializeToString()
+            chunks.append(RECORD_LEN.pack(len(record)))
+            chunks.append(record)
+            self._add_entry((_hex_bytes(txn["ID"]).rjust(32, b"\0"), pos))
+            pos += RECORD_LEN.size + len(record)
+            count += 1
+        self._file.write(b"".join(chunks))
+        self._blocks.write(BLOCK_ENTRY.pack(block_num, offset, count))
+        return count
+
+    def add_blocks(self, blocks: Iterable) -> int:
+        """Append SyncedBlock of BlockSync, return number of blocks."""
+        num_blocks = 0
+        for synced in blocks:
+            self.add_block(synced.block_num, synced.txns or [])
+            num_blocks += 1
+        return num_blocks
+
+    def flush(self) -> None:
+        self._file.flush()
+        self._blocks.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+        self._blocks.close()
+
+        txn_index_file = self.archive_file + ".txns"
+        tmp_file = txn_index_file + ".tmp"
+        self._txn_entries.sort()
+        runs = [_read_txn_index(run_file) for run_file in self._runs]
+        with open(tmp_file, "wb") as f:
+            for entry in heapq.merge(_read_txn_index(txn_index_file), self._txn_entries, *runs):
+                f.write(TXN_ENTRY.pack(*entry))
+        os.replace(tmp_file, txn_index_file)
+        for run_file in self._runs:
+            os.remove(run_file)
+        self._runs = []
+        self._txn_entries = []
+
+
+class TxnArchive:
+    """Read archive by memory map, random access by txn id or block."""
+
+    def __init__(self, archive_file: str):
+        self.archive_file = archive_file
+        self._files = []
+        self._data = self._mmap(archive_file)
+        if self._data[:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC:
+            raise ArchiveError("not a transaction archive: {}".format(archive_file))
+        self._txn_index = self._mmap(archive_file + ".txns")
+
+        self.blocks = {}    # type: Dict[int, Tuple[int, int]]
+        blocks_data = self._mmap(archive_file + ".blocks")
+        for block_num, offset, count in BLOCK_ENTRY.iter_unpack(
+                blocks_data[:len(blocks_data) - len(blocks_data) % BLOCK_ENTRY.size]):
+            self.blocks[block_num] = (offset, count)
+
+    def _mmap(self, file_name: str):
+        if not os.path.isfile(file_name) or os.path.getsize(file_name) == 0:
+            return b""
+        f = open(file_name, "rb")
+        self._files.append(f)
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        for data in (self._data, self._txn_index):
+            if isinstance(data, mmap.mmap):
+                data.close()
+        for f in self._files:
+            f.close()
+        self._files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return len(self._txn_index) // TXN_ENTRY.size
+
+    def _read_proto(self, offset: int) -> Tuple[pb2.ProtoTransactionWithReceipt, int]:
+        length, = RECORD_LEN.unpack_from(self._data, offset)
+        start = offset + RECORD_LEN.size
+        proto = pb2.ProtoTransactionWithReceipt()
+        proto.ParseFromString(self._data[start:start + length])
+        return proto, start + length
+
+    def iter_protos(self) -> Iterator[pb2.ProtoTransactionWithReceipt]:
+        """Yield all protobuf messages in archive order."""
+        offset = len(ARCHIVE_MAGIC)
+        end = len(self._data)
+        while offset + RECORD_LEN.size <= end:
+            length, = RECORD_LEN.unpack_from(self._data, offset)
+            if offset + RECORD_LEN.size + length > end:
+                # torn tail of a writer that was not closed
+                return
+            proto, offset = self._read_proto(offset)
+            yield proto
+
+    def __iter__(self) -> Iterator[dict]:
+        return (proto_to_txn(proto) for proto in self.iter_protos())
+
+    def _find_offset(self, txn_id: bytes) -> Optional[int]:
+        index = self._txn_index
+        lo, hi = 0, len(index) // TXN_ENTRY.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = mid * TXN_ENTRY.size
+            if index[pos:pos + 32] < txn_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        pos = lo * TXN_ENTRY.size
+        if lo * TXN_ENTRY.size < len(index) and index[pos:pos + 32] == txn_id:
+            return TXN_ENTRY.unpack_from(index, pos)[1]
+        return None
+
+    def get(self, txn_id: str) -> Optional[dict]:
+        """Return transaction by id, None if not in archive."""
+        offset = self._find_offset(_hex_bytes(txn_id).rjust(32, b"\0"))
+        if offset is None:
+            return None
+        return proto_to_txn(self._read_proto(offset)[0])
+
+    def block_txns(self, block_num: int) -> List[dict]:
+        """Return transactions of block, empty list if not in archive."""
+        offset, count = self.blocks.get(block_num, (0, 0))
+        txns = []
+        for _ in range(count):
+            proto, offset = self._read_proto(offset)
+            txns.append(proto_to_txn(proto))
+        return txns
@@ -12,9 +12,12 @@ Zilliqa Blockchain.
 :license: MIT License, see LICENSE for more details.
 """
 
+import os
 import time
 import logging
-from typing import Union, Optional
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union, Optional, List, Dict, Iterable
 
 from pyzil.common import utils
 from pyzil.common.local import LocalProxy
@@ -27,6 +30,13 @@ class BlockChainError(Exception):
     pass
 
 
+SIGN_PARALLEL_MIN_SIZE = 256
+
+# unsigned transaction of sign_transactions
+TxnSpec = namedtuple("TxnSpec", ["to_addr", "amount", "nonce", "code", "data", "priority"])
+TxnSpec.__new__.__defaults__ = ("", "", False)
+
+
 _active_chain: Optional["BlockChain"] = None
 
 
@@ -44,6 +54,103 @@ def set_active_chain(chain: Optional["BlockChain"]) -> None:
 active_chain = LocalProxy(get_active_chain)
 
 
+def _sign_transaction(sender: "TxnSender", to_addr: str, amount: int, nonce: int,
+                      code="", data="", priority=False) -> "SignedTransaction":
+    txn_proto = pb2.ProtoTransactionCoreInfo()
+    txn_proto.CopyFrom(sender.proto)
+    txn_proto.nonce = nonce
+    txn_proto.toaddr = utils.hex_str_to_bytes(to_addr)
+    txn_proto.amount.data = utils.int_to_bytes(amount, n_bytes=16)
+    if code:
+        txn_proto.code = code.encode("utf-8")
+    if data:
+        txn_proto.data = data.encode("utf-8")
+
+    data_to_sign = txn_proto.SerializeToString()
+    signature = sender.zil_key.sign_str(data_to_sign)
+
+    return SignedTransaction(sender, to_addr, amount, nonce, signature,
+                             code=code or None, data=data or None,
+                             priority=priority)
+
+
+def _sign_spec(sender: "TxnSender", txn: TxnSpec) -> "SignedTransaction":
+    return _sign_transaction(sender, txn.to_addr, int(txn.amount), int(txn.nonce),
+                             code=txn.code, data=txn.data, priority=txn.priority)
+
+
+def _sign_chunk(private_key: bytes, version: int, gas_price, gas_limit,
+                txns: List[TxnSpec]) -> List[str]:
+    sender = TxnSender(ZilKey(private_key=private_key), version, gas_price, gas_limit)
+    return [_sign_spec(sender, txn).signature for txn in txns]
+
+
+class TxnSender:
+    """Fields shared by all transactions of one sender."""
+    __slots__ = ("zil_key", "version", "pub_key", "gas_price", "gas_limit", "proto")
+
+    def __init__(self, zil_key: ZilKey, version: Union[str, int],
+                 gas_price: Union[str, int], gas_limit: Union[str, int]):
+        self.zil_key = zil_key
+        self.version = int(version)
+        self.pub_key = zil_key.keypair_str.public
+        self.gas_price = str(gas_price)
+        self.gas_limit = str(gas_limit)
+
+        self.proto = pb2.ProtoTransactionCoreInfo()
+        self.proto.version = self.version
+        self.proto.senderpubkey.data = zil_key.keypair_bytes.public
+        self.proto.gasprice.data = utils.int_to_bytes(int(gas_price), n_bytes=16)
+        self.proto.gaslimit = int(gas_limit)
+
+
+class SignedTransaction:
+    """Compact signed transaction, sender fields are shared via TxnSender."""
+    __slots__ = ("sender", "to_addr", "amount", "nonce", "signature",
+                 "code", "data", "priority")
+
+    def __init__(self, sender: TxnSender, to_addr: str, amount: int, nonce: int,
+                 signature: str, code: Optional[str]=None, data: Optional[str]=None,
+                 priority=False):
+        self.sender = sender
+        self.to_addr = to_addr
+        self.amount = amount
+        self.nonce = nonce
+        self.signature = signature
+        self.code = code
+        self.data = data
+        self.priority = priority
+
+    def __repr__(self):
+        return "<SignedTransaction: nonce {} to {}>".format(self.nonce, self.to_addr)
+
+    def to_params(self) -> dict:
+        """Return CreateTransaction params."""
+        sender = self.sender
+        return {
+            "version": sender.version,
+            "nonce": self.nonce,
+            "toAddr": self.to_addr,
+            "amount": str(self.amount),
+            "pubKey": sender.pub_key,
+            "gasPrice": sender.gas_price,
+            "gasLimit": sender.gas_limit,
+            "code": self.code,
+            "data": self.data,
+            "signature": self.signature,
+            "priority": self.priority,
+        }
+
+    def to_payload(self, request_id=1) -> dict:
+        """Return JSON-RPC CreateTransaction request."""
+        return {
+            "jsonrpc": "2.0",
+            "method": "CreateTransaction",
+            "params": [self.to_params()],
+            "id": request_id,
+        }
+
+
 class BlockChain:
     """Zilliqa Block Chain."""
     def __init__(self, api_url: str, version: Union[str, int], network_id: Union[str, int]):
@@ -55,45 +162,84 @@ class BlockChain:
     def __str__(self):
         return "<BlockChain: {}>".format(self.api_url)
 
+    def transaction_sender(self, zil_key: ZilKey,
+                           gas_price: Union[str, int],
+                           gas_limit: Union[str, int]) -> "TxnSender":
+        """Return shared sender fields for transactions signed by zil_key."""
+        return TxnSender(zil_key, self.version, gas_price, gas_limit)
+
+    def sign_transaction(self, sender: "TxnSender", to_addr: str,
+                         amount: Union[str, int], nonce: Union[str, int],
+                         code="", data="", priority=False) -> "SignedTransaction":
+        if not is_valid_checksum_address(to_addr):
+            raise ValueError("invalid checksum address")
+        return _sign_transaction(sender, to_addr, int(amount), int(nonce),
+                                 code=code, data=data, priority=priority)
+
+    def sign_transactions(self, zil_key: ZilKey, txns: List[TxnSpec],
+                          gas_price: Union[str, int], gas_limit: Union[str, int],
+                          workers: Optional[int]=None) -> List["SignedTransaction"]:
+        """Sign many transactions of one sender, in a process pool if workers
+        is not 1 (default only for SIGN_PARALLEL_MIN_SIZE or more).
+        """
+        sender = self.transaction_sender(zil_key, gas_price, gas_limit)
+        for txn in txns:
+            if not is_valid_checksum_address(txn.to_addr):
+                raise ValueError("invalid checksum address")
+
+        if workers == 1 or (workers is None and len(txns) < SIGN_PARALLEL_MIN_SIZE):
+            return [_sign_spec(sender, txn) for txn in txns]
+
+        workers = workers or os.cpu_count()
+        chunk_size = max(1, -(-len(txns) // workers))
+        chunks = [txns[i:i + chunk_size] for i in range(0, len(txns), chunk_size)]
+        private_key = zil_key.keypair_bytes.private
+        signatures = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk_signatures in pool.map(
+                    _sign_chunk, [private_key] * len(chunks), [self.version] * len(chunks),
+                    [gas_price] * len(chunks), [gas_limit] * len(chunks), chunks):
+                signatures.extend(chunk_signatures)
+
+        return [
+            SignedTransaction(sender, txn.to_addr, int(txn.amount), int(txn.nonce), signature,
+                              code=txn.code or None, data=txn.data or None, priority=txn.priority)
+            for txn, signature in zip(txns, signatures)
+        ]
+
     def build_transaction_params(self, zil_key: ZilKey, to_addr: str,
                                  amount: Union[str, int], nonce: Union[str, int],
                                  gas_price: Union[str, int], gas_limit: Union[str, int],
                                  code="", data="", priority=False):
+        sender = self.transaction_sender(zil_key, gas_price, gas_limit)
+        txn = self.sign_transaction(sender, to_addr, amount, nonce,
+                                    code=code, data=data, priority=priority)
+        return txn.to_params()
 
-        if not is_valid_checksum_address(to_addr):
-            raise ValueError("invalid checksum address")
-
-        txn_proto = pb2.ProtoTransactionCoreInfo()
-        txn_proto.version = self.version
-        txn_proto.nonce = int(nonce)
-        txn_proto.toaddr = utils.hex_str_to_bytes(to_addr)
-        txn_proto.senderpubkey.data = zil_key.keypair_bytes.public
-        txn_proto.amount.data = utils.int_to_bytes(int(amount), n_bytes=16)
-        txn_proto.gasprice.data = utils.int_to_bytes(int(gas_price), n_bytes=16)
-        txn_proto.gaslimit = int(gas_limit)
-        if code:
-            txn_proto.code = code.encode("utf-8")
-        if data:
-            txn_proto.data = data.encode("utf-8")
-
-        data_to_sign = txn_proto.SerializeToString()
-        signature = zil_key.sign_str(data_to_sign)
-        # assert zil_key.verify(signature, data_to_sign)
-
-        params = {
-            "version": txn_proto.version,
-            "nonce": txn_proto.nonce,
-            "toAddr": to_addr,
-            "amount": str(int(amount)),
-            "pubKey": zil_key.keypair_str.public,
-            "gasPrice": str(gas_price),
-            "gasLimit": str(gas_limit),
-            "code": code or None,
-            "data": data or None,
-            "signature": signature,
-            "priority": priority,
-        }
-        return params
+    def wait_txns_confirm(self, txn_ids: Iterable[str], timeout=300, sleep=10) -> Dict[str, dict]:
+        """Poll unconfirmed transactions in batched requests until all are
+        confirmed or timeout, return {txn_id: txn_details} of confirmed ones.
+        Failed batch requests are retried until timeout.
+        """
+        pending = list(dict.fromkeys(txn_ids))
+        confirmed = {}
+        start = time.time()
+        while pending:
+            try:
+                results = self.api.call_batch(("GetTransaction", (txn_id, )) for txn_id in pending)
+            except Exception as e:
+                logging.debug("Retry batch request: {}".format(e))
+                results = []
+            for txn_id, txn_details in zip(pending, results):
+                if isinstance(txn_details, APIError):
+                    logging.debug("Retry GetTransaction: {}".format(txn_details))
+                elif txn_details:
+                    confirmed[txn_id] = txn_details
+            pending = [txn_id for txn_id in pending if txn_id not in confirmed]
+            if not pending or time.time() - start + sleep > timeout:
+                break
+            time.sleep(sleep)
+        return confirmed
 
     def wait_txn_confirm(self, txn_id, timeout=60, sleep=5):
         start = time.time()
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+"""
+pyzil.zilliqa.index
+~~~~~~~~~~~~
+
+SQLite index of TxBlocks, transactions and address relations.
+
+:copyright: (c) 2019 by Gully Chen.
+:license: MIT License, see LICENSE for more details.
+"""
+
+import json
+import sqlite3
+from typing import Optional, Iterable, List, Dict, Tuple
+
+from pyzil.crypto import zilkey
+from pyzil.zilliqa.sync import BlockSync, SyncedBlock
+
+
+# relations of address and transaction
+ROLE_SENDER = "sender"
+ROLE_RECIPIENT = "recipient"
+ROLE_CONTRACT = "contract"
+ROLE_DEPLOY = "deploy"
+ROLE_EVENT = "event"
+ROLE_TRANSITION = "transition"
+
+DEPLOY_ADDRESS = "0" * zilkey.ADDRESS_STR_LENGTH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    block_num INTEGER PRIMARY KEY,
+    block_hash TEXT,
+    timestamp INTEGER,
+    num_txns INTEGER,
+    block TEXT
+);
+CREATE TABLE IF NOT EXISTS txns (
+    txn_id TEXT PRIMARY KEY,
+    block_num INTEGER NOT NULL,
+    sender TEXT,
+    to_addr TEXT,
+    amount TEXT,
+    nonce INTEGER,
+    success INTEGER,
+    txn TEXT
+);
+CREATE INDEX IF NOT EXISTS txns_block ON txns (block_num);
+CREATE TABLE IF NOT EXISTS addresses (
+    address TEXT NOT NULL,
+    txn_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    block_num INTEGER NOT NULL,
+    PRIMARY KEY (address, txn_id, role)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS addresses_block ON addresses (address, block_num);
+CREATE INDEX IF NOT EXISTS addresses_role ON addresses (address, role, block_num);
+"""
+
+
+def _hex_address(value) -> Optional[str]:
+    """Return lowercase hex address without 0x, None if not an address."""
+    if not isinstance(value, str):
+        return None
+    value = value.lower()
+    if value.startswith("0x"):
+        value = value[2:]
+    if len(value) != zilkey.ADDRESS_STR_LENGTH:
+        return None
+    try:
+        bytes.fromhex(value)
+    except ValueError:
+        return None
+    return value
+
+
+def txn_relations(txn: dict) -> List[Tuple[str, str]]:
+    """Return (address, role) relations of a transaction."""
+    relations = set()
+
+    def add(address, role):
+        address = _hex_address(address)
+        if address:
+            relations.add((address, role))
+
+    sender = None
+    if txn.get("senderPubKey"):
+        sender = zilkey.address_from_public_key(txn["senderPubKey"])
+        add(sender, ROLE_SENDER)
+
+    receipt = txn.get("receipt") or {}
+    to_addr = _hex_address(txn.get("toAddr"))
+    if to_addr == DEPLOY_ADDRESS:
+        if sender and receipt.get("success") and txn.get("nonce") is not None:
+            add(zilkey.contract_address(sender, int(txn["nonce"]) - 1), ROLE_DEPLOY)
+    elif to_addr:
+        is_call = bool(txn.get("data") or receipt.get("event_logs") or receipt.get("transitions"))
+        add(to_addr, ROLE_CONTRACT if is_call else ROLE_RECIPIENT)
+
+    for event in receipt.get("event_logs") or []:
+        add(event.get("address"), ROLE_EVENT)
+    for transition in receipt.get("transitions") or []:
+        add(transition.get("addr"), ROLE_TRANSITION)
+        add((transition.get("msg") or {}).get("_recipient"), ROLE_TRANSITION)
+    return sorted(relations)
+
+
+class ChainIndex:
+    """SQLite index of synced TxBlocks, answers queries offline."""
+
+    def __init__(self, db_file: str=":memory:"):
+        self.db_file = db_file
+        self.db = sqlite3.connect(db_file)
+        self.db.row_factory = sqlite3.Row
+        if db_file != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def last_block(self) -> Optional[int]:
+        """Return the last indexed block number."""
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'last_block'").fetchone()
+        return int(row["value"]) if row else None
+
+    def add_blocks(self, blocks: Iterable[SyncedBlock]) -> int:
+        """Index blocks in one sqlite transaction, return number of blocks."""
+        block_rows, txn_rows, address_rows = [], [], []
+        last_block = self.last_block
+        for synced in blocks:
+            header = (synced.block or {}).get("header", {})
+            body = (synced.block or {}).get("body", {})
+            timestamp = header.get("Timestamp")
+            block_rows.append((
+                synced.block_num, body.get("BlockHash"),
+                int(timestamp) if timestamp is not None else None,
+                len(synced.txns or []), json.dumps(synced.block, separators=(",", ":"))
+            ))
+            for txn in synced.txns or []:
+                txn_id = txn["ID"]
+                relations = txn_relations(txn)
+                sender = next((a for a, role in relations if role == ROLE_SENDER), None)
+                receipt = txn.get("receipt") or {}
+                txn_rows.append((
+                    txn_id, synced.block_num, sender, _hex_address(txn.get("toAddr")),
+                    txn.get("amount"), int(txn["nonce"]) if txn.get("nonce") else None,
+                    int(bool(receipt.get("success"))), json.dumps(txn, separators=(",", ":"))
+                ))
+                address_rows.extend((a, txn_id, role, synced.block_num) for a, role in relations)
+            if last_block is None or synced.block_num > last_block:
+                last_block = synced.block_num
+
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?, ?)", block_rows)
+            self.db.executemany("INSERT OR REPLACE INTO txns VALUES (?, ?, ?, ?, ?, ?, ?, ?)", txn_rows)
+            self.db.executemany("INSERT OR REPLACE INTO addresses VALUES (?, ?, ?, ?)", address_rows)
+            if last_block is not None:
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('last_block', ?)",
+                                (str(last_block), ))
+        return len(block_rows)
+
+    def sync(self, block_sync: BlockSync, start: Optional[int]=None,
+             end: Optional[int]=None, commit_every=500) -> int:
+        """Index blocks streamed by block_sync, from start (default after
+        the last indexed block), commit every commit_every blocks.
+        Return number of blocks indexed.
+        """
+        if start is None:
+            last_block = self.last_block
+            start = 0 if last_block is None else last_block + 1
+
+        num_blocks = 0
+        pending = []
+        for synced in block_sync.blocks(start, end):
+            pending.append(synced)
+            if len(pending) >= commit_every:
+                num_blocks += self.add_blocks(pending)
+                pending = []
+        if pending:
+            num_blocks += self.add_blocks(pending)
+        return num_blocks
+
+    @staticmethod
+    def _txns(rows) -> List[dict]:
+        return [json.loads(row["txn"]) for row in rows]
+
+    def transaction(self, txn_id: str) -> Optional[dict]:
+        row = self.db.execute("SELECT txn FROM txns WHERE txn_id = ?",
+                              (txn_id.lower().replace("0x", ""), )).fetchone()
+        return row and json.loads(row["txn"])
+
+    def block(self, block_num: int) -> Optional[dict]:
+        row = self.db.execute("SELECT block FROM blocks WHERE block_num = ?",
+                              (block_num, )).fetchone()
+        return row and json.loads(row["block"])
+
+    def txns_in_block(self, block_num: int) -> List[dict]:
+        return self._txns(self.db.execute(
+            "SELECT txn FROM txns WHERE block_num = ? ORDER BY nonce", (block_num, )
+        ))
+
+    def _address_txns(self, address: str, roles: Optional[Iterable[str]],
+                      limit: int, offset: int) -> List[dict]:
+        address = zilkey.to_valid_address(address)
+        if not address:
+            raise ValueError("invalid address")
+        params = {"address": address, "limit": limit, "offset": offset}
+        roles = None if roles is None else list(roles)
+        if roles is not None and len(roles) == 1:
+            # (address, txn_id, role) is unique, addresses_role is in block order
+            params["role"] = roles[0]
+            where = "a.address = :address AND a.role = :role"
+        else:
+            # one row per transaction for addresses in several roles
+            role_sql = ""
+            if roles is not None:
+                params.update(("role{}".format(i), role) for i, role in enumerate(roles))
+                role_sql = " AND role IN ({})".format(
+                    ", ".join(":role{}".format(i) for i in range(len(roles))))
+            where = ("a.address = :address AND a.role = ("
+                     "SELECT MIN(role) FROM addresses "
+                     "WHERE address = :address AND txn_id = a.txn_id{})").format(role_sql)
+        # walk the address index latest first, so only the requested page
+        # is joined with txns and sorted by nonce within blocks
+        sql = ("SELECT t.txn FROM addresses a JOIN txns t ON t.txn_id = a.txn_id "
+               "WHERE {} ORDER BY a.block_num DESC, t.nonce DESC "
+               "LIMIT :limit OFFSET :offset").format(where)
+        return self._txns(self.db.execute(sql, params))
+
+    def history(self, address: str, limit=100, offset=0) -> List[dict]:
+        """Return transactions related to address, latest first."""
+        return self._address_txns(address, None, limit, offset)
+
+    def contract_calls(self, address: str, limit=100, offset=0) -> List[dict]:
+        """Return transactions calling contract address, latest first."""
+        return self._address_txns(address, (ROLE_CONTRACT, ), limit, offset)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            table: self.db.execute("SELECT COUNT(*) FROM {}".format(table)).fetchone()[0]
+            for table in ("blocks", "txns", "addresses")
+        }
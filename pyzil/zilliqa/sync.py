@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+"""
+pyzil.zilliqa.sync
+~~~~~~~~~~~~
+
+Parallel block sync with ordered stream and persisted cursor.
+
+:copyright: (c) 2019 by Gully Chen.
+:license: MIT License, see LICENSE for more details.
+"""
+
+import os
+import time
+import logging
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Iterator, List
+
+from pyzil.zilliqa.api import ZilliqaAPI, APIError
+from pyzil.zilliqa.chain import active_chain
+
+
+TX_BLOCK = "tx"
+DS_BLOCK = "ds"
+
+SYNC_BATCH_SIZE = 20
+SYNC_WORKERS = 8
+
+# txns is None for DS blocks or if transactions are not fetched
+SyncedBlock = namedtuple("SyncedBlock", ["block_num", "block", "txns"])
+
+
+class BlockSyncError(Exception):
+    pass
+
+
+def _no_transactions(error) -> bool:
+    return isinstance(error, APIError) and "no transactions" in str(error).lower()
+
+
+class BlockSync:
+    """Fetch blocks of a range concurrently, yield them in order.
+
+    Blocks are fetched in batches of batch_size blocks by batched json-rpc
+    requests, at most workers batches are in flight. Failed requests are
+    retried, the sync stops with BlockSyncError if a block still can not be
+    fetched. The next block number is saved to cursor_file, so a new sync
+    resumes from it.
+    """
+
+    def __init__(self, api: Optional[ZilliqaAPI]=None, kind: str=TX_BLOCK,
+                 with_txns=True, workers=SYNC_WORKERS, batch_size=SYNC_BATCH_SIZE,
+                 retries=5, retry_sleep=1.0, cursor_file: Optional[str]=None,
+                 cursor_interval=100):
+        if kind not in (TX_BLOCK, DS_BLOCK):
+            raise ValueError("invalid block kind: {}".format(kind))
+        self._api = api
+        self.kind = kind
+        self.with_txns = with_txns and kind == TX_BLOCK
+        self.workers = workers
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_sleep = retry_sleep
+        self.cursor_file = cursor_file
+        self.cursor_interval = cursor_interval
+        self.cursor = self.load_cursor()
+
+    @property
+    def api(self) -> ZilliqaAPI:
+        return self._api or active_chain.api
+
+    def load_cursor(self) -> Optional[int]:
+        if not self.cursor_file or not os.path.isfile(self.cursor_file):
+            return None
+        with open(self.cursor_file, "r") as f:
+            return int(f.read().strip())
+
+    def save_cursor(self) -> None:
+        if not self.cursor_file or self.cursor is None:
+            return
+        tmp_file = self.cursor_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.write(str(self.cursor))
+        os.replace(tmp_file, self.cursor_file)
+
+    def latest_block_num(self) -> int:
+        if self.kind == TX_BLOCK:
+            return int(self.api.GetNumTxBlocks()) - 1
+        return int(self.api.GetNumDSBlocks()) - 1
+
+    def _call_batch(self, calls: List[tuple]) -> List:
+        """call_batch with retries of failed calls, "no transactions" error
+        of GetTransactionsForTxBlock is returned as empty list.
+        """
+        results = [None] * len(calls)
+        pending = list(range(len(calls)))
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.retry_sleep * attempt)
+            try:
+                batch_results = self.api.call_batch([calls[i] for i in pending])
+            except Exception as e:
+                logging.debug("Retry batch request: {}".format(e))
+                continue
+
+            failed = []
+            for i, result in zip(pending, batch_results):
+                if _no_transactions(result):
+                    results[i] = []
+                elif isinstance(result, APIError) or result is None:
+                    logging.debug("Retry {}: {}".format(calls[i], result))
+                    failed.append(i)
+                else:
+                    results[i] = result
+            pending = failed
+            if not pending:
+                return results
+        raise BlockSyncError("failed to fetch {}".format([calls[i] for i in pending]))
+
+    def fetch(self, start: int, end: int) -> List[SyncedBlock]:
+        """Fetch blocks in [start, end)."""
+        block_nums = list(range(start, end))
+        method = "GetTxBlock" if self.kind == TX_BLOCK else "GetDsBlock"
+        calls = [(method, (str(n), )) for n in block_nums]
+        if self.with_txns:
+            calls.extend(("GetTransactionsForTxBlock", (str(n), )) for n in block_nums)
+        results = self._call_batch(calls)
+        blocks = results[:len(block_nums)]
+        if not self.with_txns:
+            return [SyncedBlock(n, block, None) for n, block in zip(block_nums, blocks)]
+
+        block_txn_ids = [
+            [txn_id for shard in txn_ids or [] for txn_id in shard or []]
+            for txn_ids in results[len(block_nums):]
+        ]
+        all_txns = self._call_batch([
+            ("GetTransaction", (txn_id, )) for txn_ids in block_txn_ids for txn_id in txn_ids
+        ])
+        synced = []
+        pos = 0
+        for n, block, txn_ids in zip(block_nums, blocks, block_txn_ids):
+            synced.append(SyncedBlock(n, block, all_txns[pos:pos + len(txn_ids)]))
+            pos += len(txn_ids)
+        return synced
+
+    def blocks(self, start: Optional[int]=None, end: Optional[int]=None,
+               follow=False, poll_interval=10.0) -> Iterator[SyncedBlock]:
+        """Yield blocks from start (default saved cursor or 0) to end
+        (exclusive, default latest block), keep polling new blocks if follow.
+        """
+        if start is None:
+            start = self.cursor or 0
+        self.cursor = start
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                while True:
+                    last = end if end is not None else self.latest_block_num() + 1
+                    yield from self._sync_range(pool, self.cursor, last)
+                    if not follow or end is not None:
+                        break
+                    time.sleep(poll_interval)
+            finally:
+                self.save_cursor()
+
+    def _sync_range(self, pool: ThreadPoolExecutor, start: int, end: int) -> Iterator[SyncedBlock]:
+        ranges = iter(
+            (n, min(n + self.batch_size, end)) for n in range(start, end, self.batch_size)
+        )
+        in_flight = deque()
+        for batch_range in ranges:
+            in_flight.append(pool.submit(self.fetch, *batch_range))
+            if len(in_flight) >= self.workers * 2:
+                break
+
+        since_saved = 0
+        while in_flight:
+            future = in_flight.popleft()
+            try:
+                synced = future.result()
+            except BaseException:
+                for pending in in_flight:
+                    pending.cancel()
+                raise
+            for batch_range in ranges:
+                in_flight.append(pool.submit(self.fetch, *batch_range))
+                break
+
+            for block in synced:
+                yield block
+                self.cursor = block.block_num + 1
+                since_saved += 1
+                if since_saved >= self.cursor_interval:
+                    self.save_cursor()
+                    since_saved = 0
@@ -8,10 +8,22 @@ pyzil.zilliqa.units
 
 Zilliqa currencies units.
 
+Qa is the canonical integer amount, Zil keeps the exact amount in Qa and
+is a float view of it, so arithmetic never round-trips through floats.
+Float operands are read by their shortest decimal repr, Zil results are
+rounded half-even to 1 Qa, Qa results are truncated as int.
+
 :copyright: (c) 2019 by Gully Chen.
 :license: MIT License, see LICENSE for more details.
 """
 
+import math
+import heapq
+from array import array
+from typing import Iterable, List, Optional
+from fractions import Fraction
+from decimal import Decimal, Context, ROUND_HALF_EVEN, InvalidOperation
+
 
 class Units:
     prec = 12
@@ -19,7 +31,112 @@ class Units:
     units = pow(10, prec)
 
 
+_UNITS = Units.units
+_DECIMAL_CONTEXT = Context(prec=100, rounding=ROUND_HALF_EVEN)
+
+
+def _round_div(a: int, b: int) -> int:
+    """Return a / b rounded half-even."""
+    if b < 0:
+        a, b = -a, -b
+    q, r = divmod(a, b)
+    r2 = r * 2
+    if r2 > b or (r2 == b and q & 1):
+        q += 1
+    return q
+
+
+def _decimal_to_qa(d: Decimal) -> int:
+    """Zils in Decimal to Qa, rounded half-even."""
+    if not d.is_finite():
+        raise ValueError("invalid amount: {}".format(d))
+    qa = d.scaleb(Units.prec, context=_DECIMAL_CONTEXT)
+    return int(qa.to_integral_value(rounding=ROUND_HALF_EVEN, context=_DECIMAL_CONTEXT))
+
+
+_POW10 = tuple(10 ** i for i in range(Units.prec + 1))
+
+
+def _str_to_qa(value: str) -> int:
+    """Zils in decimal str to Qa."""
+    zils, _, qa = value.partition(".")
+    negative = zils[:1] == "-"
+    if zils[:1] in ("-", "+"):
+        zils = zils[1:]
+    if (zils or qa) and len(qa) <= Units.prec and \
+            (zils + qa).isdigit() and (zils + qa).isascii():
+        qa = int(zils or 0) * _UNITS + (int(qa) * _POW10[Units.prec - len(qa)] if qa else 0)
+        return -qa if negative else qa
+    try:
+        return _decimal_to_qa(Decimal(value))
+    except InvalidOperation:
+        raise ValueError("could not convert string to Zil: {!r}".format(value))
+
+
+def _rational(value) -> Fraction:
+    """Exact rational of a number, floats are read by their repr."""
+    t = type(value)
+    if t is int or t is Qa:
+        return Fraction(int(value))
+    if t is Zil:
+        return Fraction(value._qa, _UNITS)
+    if t is float:
+        return Fraction(Decimal(repr(value)))
+    if isinstance(value, (int, Fraction)):
+        return Fraction(value)
+    if isinstance(value, float):
+        return Fraction(Decimal(repr(float(value))))
+    if isinstance(value, Decimal):
+        if not value.is_finite():
+            raise ValueError("invalid amount: {}".format(value))
+        return Fraction(value)
+    raise TypeError("unsupported operand type: {}".format(t.__name__))
+
+
+def _number_to_qa(value) -> int:
+    """Zils in any number or str to Qa."""
+    t = type(value)
+    if t is int or t is Qa:
+        return int(value) * _UNITS
+    if t is Zil:
+        return value._qa
+    if t is float:
+        return _str_to_qa(repr(value))
+    if t is str:
+        return _str_to_qa(value.strip())
+    if isinstance(value, Decimal):
+        return _decimal_to_qa(value)
+    if isinstance(value, bytes):
+        return _number_to_qa(value.decode())
+    fraction = _rational(value)
+    return _round_div(fraction.numerator * _UNITS, fraction.denominator)
+
+
+def _zil_operand_to_qa(value) -> int:
+    """Operand of Zil arithmetic to Qa, Qa operands are taken as Qa."""
+    t = type(value)
+    if t is Zil:
+        return value._qa
+    if t is Qa:
+        return int(value)
+    if t is int:
+        return value * _UNITS
+    return _number_to_qa(value)
+
+
+def _qa_operand_to_int(value) -> int:
+    """Operand of Qa add/sub/eq to int, Zil operands are converted to Qa."""
+    t = type(value)
+    if t is int or t is Qa:
+        return int(value)
+    if t is Zil:
+        return value._qa
+    return int(value)
+
+
 class Qa(int):
+    __slots__ = ()
+
     def __str__(self):
         return str(int(self))
 
@@ -27,137 +144,342 @@ class Qa(int):
         return "{} Qa".format(int(self))
 
     def toZil(self):
-        zil = int(self) / Units.units
-        return Zil(zil)
+        return Zil._from_qa(int(self))
 
     @classmethod
     def fromZil(cls, zil):
         return Zil(zil).toQa()
 
     def __eq__(self, other):
-        if isinstance(other, Zil):
-            other = other.toQa()
-        return int(self) == int(other)
+        if type(other) is int or type(other) is Qa:
+            return int.__eq__(self, other)
+        try:
+            return int(self) == _qa_operand_to_int(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    __hash__ = int.__hash__
 
     def __add__(self, other):
         """Return self + other"""
-        if isinstance(other, Zil):
-            other = other.toQa()
-        return Qa(int(self) + int(other))
+        if type(other) is not Qa and type(other) is not int:
+            other = _qa_operand_to_int(other)
+        return Qa(int.__add__(self, other))
 
     def __radd__(self, other):
         """Return other + self"""
-        if isinstance(other, Zil):
-            other = other.toQa()
-        return Qa(int(other) + int(self))
+        if type(other) is not int:
+            other = _qa_operand_to_int(other)
+        return Qa(int.__add__(self, other))
 
     def __sub__(self, other):
         """Return self - other"""
-        if isinstance(other, Zil):
-            other = other.toQa()
-        return Qa(int(self) - int(other))
+        if type(other) is not Qa and type(other) is not int:
+            other = _qa_operand_to_int(other)
+        return Qa(int.__sub__(self, other))
 
     def __rsub__(self, other):
         """Return other - self"""
-        if isinstance(other, Zil):
-            other = other.toQa()
-        return Qa(int(other) - int(self))
+        return Qa(int.__rsub__(self, _qa_operand_to_int(other)))
 
     def __mul__(self, other):
         """Return self * other"""
-        return Qa(int(self) * other)
+        if type(other) is int:
+            return Qa(int.__mul__(self, other))
+        return Qa(int(Fraction(int(self)) * _rational(other)))
 
     def __rmul__(self, other):
         """Return other * self"""
-        return Qa(other * int(self))
+        return self.__mul__(other)
 
     def __truediv__(self, other):
         """Return self / other"""
-        return Qa(int(self) / other)
+        return Qa(int(Fraction(int(self)) / _rational(other)))
 
     def __rtruediv__(self, other):
         """Return other / self"""
-        return Qa(other / int(self))
+        return Qa(int(_rational(other) / int(self)))
 
     def __floordiv__(self, other):
         """Return self // other"""
-        return Qa(int(self) // other)
+        if type(other) is int:
+            return Qa(int.__floordiv__(self, other))
+        return Qa(math.floor(Fraction(int(self)) / _rational(other)))
 
     def __rfloordiv__(self, other):
         """Return other // self"""
-        return Qa(other // int(self))
+        return Qa(math.floor(_rational(other) / int(self)))
+
+
+def _new_zil(cls, value: float, qa: int) -> "Zil":
+    self = float.__new__(cls, value)
+    self._qa = qa
+    return self
 
 
 class Zil(float):
+    __slots__ = ("_qa", )
+
+    def __new__(cls, value=0):
+        qa = _number_to_qa(value)
+        self = float.__new__(cls, qa / _UNITS)
+        self._qa = qa
+        return self
+
+    @classmethod
+    def _from_qa(cls, qa: int) -> "Zil":
+        return _new_zil(cls, qa / _UNITS, qa)
+
+    def __reduce__(self):
+        return Zil, (str(self), )
+
     def __str__(self):
-        fmt_str = Units.fmt.format(float(self))
-        return fmt_str.rstrip("0").rstrip(".")
+        sign = "-" if self._qa < 0 else ""
+        zils, qa = divmod(abs(self._qa), _UNITS)
+        if not qa:
+            return "{}{}".format(sign, zils)
+        return "{}{}.{}".format(sign, zils, str(qa).rjust(Units.prec, "0").rstrip("0"))
 
     def __repr__(self):
         return self.__str__() + " Zil"
 
-    def __eq__(self, other):
-        if not isinstance(other, Qa):
-            if not isinstance(other, Zil):
-                other = Zil(other)
-            other = other.toQa()
-        return self.toQa() == other
+    def __format__(self, format_spec):
+        if not format_spec:
+            return str(self)
+        return format(Decimal(self._qa).scaleb(-Units.prec), format_spec)
 
     def toQa(self):
-        qa = float(self) * Units.units
-        return Qa(int(qa))
+        return Qa(self._qa)
 
     @classmethod
     def fromQa(cls, qa):
         return Qa(qa).toZil()
 
+    def __eq__(self, other):
+        try:
+            return self._qa == _zil_operand_to_qa(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    def __hash__(self):
+        """Hash of the exact amount in zils, same as an equal int or float."""
+        return hash(Fraction(self._qa, _UNITS))
+
+    def __lt__(self, other):
+        try:
+            return self._qa < _zil_operand_to_qa(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+
+    def __le__(self, other):
+        try:
+            return self._qa <= _zil_operand_to_qa(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+
+    def __gt__(self, other):
+        try:
+            return self._qa > _zil_operand_to_qa(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+
+    def __ge__(self, other):
+        try:
+            return self._qa >= _zil_operand_to_qa(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+
+    def __bool__(self):
+        return self._qa != 0
+
+    def __neg__(self):
+        return Zil._from_qa(-self._qa)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return Zil._from_qa(abs(self._qa))
+
+    def __int__(self):
+        return int(Fraction(self._qa, _UNITS))
+
+    def __round__(self, n=None):
+        if n is None:
+            return _round_div(self._qa, _UNITS)
+        if n >= Units.prec:
+            return self
+        step = 10 ** (Units.prec - n)
+        return Zil._from_qa(_round_div(self._qa, step) * step)
+
     def __add__(self, other):
         """Return self + other"""
-        if isinstance(other, Qa):
-            other = other.toZil()
-        return Zil(float(self) + float(other))
+        qa = self._qa + (other._qa if type(other) is Zil else _zil_operand_to_qa(other))
+        return _new_zil(Zil, qa / _UNITS, qa)
 
     def __radd__(self, other):
         """Return other + self"""
-        if isinstance(other, Qa):
-            other = other.toZil()
-        return Zil(float(other) + float(self))
+        qa = (other * _UNITS if type(other) is int else _zil_operand_to_qa(other)) + self._qa
+        return _new_zil(Zil, qa / _UNITS, qa)
 
     def __sub__(self, other):
         """Return self - other"""
-        if isinstance(other, Qa):
-            other = other.toZil()
-        return Zil(float(self) - float(other))
+        qa = self._qa - (other._qa if type(other) is Zil else _zil_operand_to_qa(other))
+        return _new_zil(Zil, qa / _UNITS, qa)
 
     def __rsub__(self, other):
         """Return other - self"""
-        if isinstance(other, Qa):
-            other = other.toZil()
-        return Zil(float(other) - float(self))
+        return Zil._from_qa(_zil_operand_to_qa(other) - self._qa)
 
     def __mul__(self, other):
         """Return self * other"""
-        return Zil(float(self) * other)
+        if type(other) is int:
+            return Zil._from_qa(self._qa * other)
+        fraction = _rational(other)
+        return Zil._from_qa(_round_div(self._qa * fraction.numerator, fraction.denominator))
 
     def __rmul__(self, other):
         """Return other * self"""
-        return Zil(other * float(self))
+        return self.__mul__(other)
 
     def __truediv__(self, other):
         """Return self / other"""
-        return Zil(float(self) / other)
+        if type(other) is int:
+            return Zil._from_qa(_round_div(self._qa, other))
+        fraction = _rational(other)
+        return Zil._from_qa(_round_div(self._qa * fraction.denominator, fraction.numerator))
 
     def __rtruediv__(self, other):
         """Return other / self"""
-        return Zil(other / float(self))
+        fraction = _rational(other) / Fraction(self._qa, _UNITS)
+        return Zil._from_qa(_round_div(fraction.numerator * _UNITS, fraction.denominator))
 
     def __floordiv__(self, other):
         """Return self // other"""
-        return Zil(float(self) // other)
+        return Zil(math.floor(Fraction(self._qa, _UNITS) / _rational(other)))
 
     def __rfloordiv__(self, other):
         """Return other // self"""
-        return Zil(other // float(self))
+        return Zil(math.floor(_rational(other) / Fraction(self._qa, _UNITS)))
+
+
+_MASK64 = (1 << 64) - 1
+_MAX_QA_ARRAY = 1 << 128
+
+
+class QaArray:
+    """Compact array of Qa amounts in [0, 2**128), stored as high and low
+    64 bits in two array("Q") columns, 16 bytes per amount.
+    """
+    __slots__ = ("_hi", "_lo")
+
+    def __init__(self, amounts: Optional[Iterable] = None):
+        self._hi = array("Q")
+        self._lo = array("Q")
+        if amounts is not None:
+            self.extend(amounts)
+
+    @classmethod
+    def from_zils(cls, zils: Iterable) -> "QaArray":
+        """Convert Zil amounts (Zil, str, float, int; Qa kept as Qa) to Qa."""
+        return cls(_zil_operand_to_qa(zil) for zil in zils)
+
+    @classmethod
+    def split(cls, total, weights: Iterable) -> "QaArray":
+        """Split total Qa in proportion to weights, remainder Qa goes to the
+        largest fractional shares so that the sum is exactly total.
+        """
+        total = _qa_operand_to_int(total)
+        weights = [_rational(w) for w in weights]
+        if any(w < 0 for w in weights):
+            raise ValueError("weights must not be negative")
+        sum_weights = sum(weights)
+        if not weights or sum_weights == 0:
+            raise ValueError("weights must not be all zero")
+
+        shares = []
+        remainders = []
+        for i, w in enumerate(weights):
+            share, remainder = divmod(total * w.numerator * sum_weights.denominator,
+                                      w.denominator * sum_weights.numerator)
+            shares.append(share)
+            remainders.append((-Fraction(remainder, w.denominator * sum_weights.numerator), i))
+
+        for _, i in sorted(remainders)[:total - sum(shares)]:
+            shares[i] += 1
+        return cls(shares)
+
+    def append(self, qa) -> None:
+        qa = _qa_operand_to_int(qa)
+        if not 0 <= qa < _MAX_QA_ARRAY:
+            raise ValueError("amount out of range: {}".format(qa))
+        self._hi.append(qa >> 64)
+        self._lo.append(qa & _MASK64)
+
+    def extend(self, amounts: Iterable) -> None:
+        if isinstance(amounts, QaArray):
+            self._hi.extend(amounts._hi)
+            self._lo.extend(amounts._lo)
+            return
+        append = self.append
+        for qa in amounts:
+            append(qa)
+
+    def __len__(self):
+        return len(self._lo)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            sliced = QaArray()
+            sliced._hi = self._hi[item]
+            sliced._lo = self._lo[item]
+            return sliced
+        return Qa(self._hi[item] << 64 | self._lo[item])
+
+    def __setitem__(self, index: int, qa):
+        qa = _qa_operand_to_int(qa)
+        if not 0 <= qa < _MAX_QA_ARRAY:
+            raise ValueError("amount out of range: {}".format(qa))
+        self._hi[index] = qa >> 64
+        self._lo[index] = qa & _MASK64
+
+    def pop(self, index: int=-1) -> Qa:
+        return Qa(self._hi.pop(index) << 64 | self._lo.pop(index))
+
+    def __iter__(self):
+        for hi, lo in zip(self._hi, self._lo):
+            yield Qa(hi << 64 | lo)
+
+    def __eq__(self, other):
+        if isinstance(other, QaArray):
+            return self._hi == other._hi and self._lo == other._lo
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return "QaArray([{}])".format(", ".join(str(int(qa)) for qa in self))
+
+    def sum(self) -> Qa:
+        """Return exact sum of all amounts."""
+        return Qa((sum(self._hi) << 64) + sum(self._lo))
+
+    def nlargest(self, n: int) -> List[int]:
+        """Return indices of the n largest amounts, largest first."""
+        return [i for _, _, i in heapq.nlargest(n, zip(self._hi, self._lo, range(len(self._lo))))]
+
+    def sum_zil(self) -> "Zil":
+        return self.sum().toZil()
+
+    def to_zils(self) -> List["Zil"]:
+        """Convert all amounts to Zil."""
+        return [Zil._from_qa(hi << 64 | lo) for hi, lo in zip(self._hi, self._lo)]
 
 
 if "__main__" == __name__:
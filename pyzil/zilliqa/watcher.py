@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+# Zilliqa Python Library
+# Copyright (C) 2019  Gully Chen
+# MIT License
+"""
+pyzil.zilliqa.watcher
+~~~~~~~~~~~~
+
+Watch balances and nonces of many addresses with batched GetBalance.
+
+:copyright: (c) 2019 by Gully Chen.
+:license: MIT License, see LICENSE for more details.
+"""
+
+import time
+import logging
+import threading
+from array import array
+from itertools import islice
+from collections import namedtuple
+from typing import Optional, Callable, Iterable, List, Dict, Set
+
+from pyzil.crypto import zilkey
+from pyzil.zilliqa.api import ZilliqaAPI, APIError, BATCH_SIZE
+from pyzil.zilliqa.chain import active_chain
+from pyzil.zilliqa.index import txn_relations
+from pyzil.zilliqa.sync import BlockSync, SyncedBlock
+from pyzil.zilliqa.units import Qa, QaArray
+
+
+# old_balance and old_nonce are None for the first known state
+BalanceChange = namedtuple("BalanceChange", [
+    "address", "old_balance", "new_balance", "old_nonce", "new_nonce", "block_num"
+])
+
+WATCHER_MAX_RATE = 200.0
+
+
+def _not_created(error) -> bool:
+    return isinstance(error, APIError) and str(error) == "Account is not created"
+
+
+class BalanceWatcher:
+    """Last known balance and nonce of a set of addresses.
+
+    Addresses are kept as 20 bytes keys, balances in a QaArray and nonces
+    in array("Q"). GetBalance calls are sent in json-rpc batches of
+    batch_size, at most max_rate calls per second. Addresses failed to
+    refresh are retried by the next refresh. Changes are returned by the
+    refresh methods and sent to listeners; the first known state of an
+    address is not a change unless emit_initial.
+    """
+
+    def __init__(self, addresses: Iterable[str]=(), api: Optional[ZilliqaAPI]=None,
+                 batch_size=BATCH_SIZE, max_rate: Optional[float]=WATCHER_MAX_RATE,
+                 emit_initial=False):
+        self._api = api
+        self.batch_size = batch_size
+        self.max_rate = max_rate
+        self.emit_initial = emit_initial
+
+        self._slots = {}    # type: Dict[bytes, int]
+        self._keys = []    # type: List[bytes]
+        self._balances = QaArray()
+        self._nonces = array("Q")
+        self._known = bytearray()
+        self._failed = set()    # type: Set[bytes]
+        self._next_call = 0.0
+
+        self.block_num = None    # type: Optional[int]
+        self.num_calls = 0
+        self.listeners = []    # type: List[Callable[[List[BalanceChange]], None]]
+        self.add_many(addresses)
+
+    @property
+    def api(self) -> ZilliqaAPI:
+        return self._api or active_chain.api
+
+    @staticmethod
+    def _key(address: str) -> bytes:
+        key = zilkey.to_address_bytes(address)
+        if key is None:
+            raise ValueError("invalid address: {}".format(address))
+        return key
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, address: str) -> bool:
+        try:
+            return self._key(address) in self._slots
+        except ValueError:
+            return False
+
+    def add(self, address: str) -> None:
+        key = self._key(address)
+        if key in self._slots:
+            return
+        self._slots[key] = len(self._keys)
+        self._keys.append(key)
+        self._balances.append(0)
+        self._nonces.append(0)
+        self._known.append(0)
+
+    def add_many(self, addresses: Iterable[str]) -> None:
+        for address in addresses:
+            self.add(address)
+
+    def remove(self, address: str) -> None:
+        """Remove address, the last slot is moved to its place."""
+        key = self._key(address)
+        slot = self._slots.pop(key)
+        self._failed.discard(key)
+        last_key = self._keys.pop()
+        balance, nonce, known = self._balances.pop(), self._nonces.pop(), self._known.pop()
+        if last_key != key:
+            self._slots[last_key] = slot
+            self._keys[slot] = last_key
+            self._balances[slot] = balance
+            self._nonces[slot] = nonce
+            self._known[slot] = known
+
+    def addresses(self) -> List[str]:
+        return [key.hex() for key in self._keys]
+
+    def balance(self, address: str) -> Optional[Qa]:
+        """Return last known balance in Qa, None if not refreshed yet."""
+        slot = self._slots[self._key(address)]
+        return self._balances[slot] if self._known[slot] else None
+
+    def nonce(self, address: str) -> Optional[int]:
+        slot = self._slots[self._key(address)]
+        return self._nonces[slot] if self._known[slot] else None
+
+    def add_listener(self, listener: Callable[[List[BalanceChange]], None]) -> None:
+        self.listeners.append(listener)
+
+    def _emit(self, changes: List[BalanceChange]) -> List[BalanceChange]:
+        if changes:
+            for listener in self.listeners:
+                listener(changes)
+        return changes
+
+    def _throttle(self, num_calls: int) -> None:
+        if not self.max_rate:
+            return
+        now = time.monotonic()
+        if self._next_call > now:
+            time.sleep(self._next_call - now)
+            now = self._next_call
+        self._next_call = now + num_calls / self.max_rate
+
+    def _update(self, key: bytes, result, block_num: Optional[int]) -> Optional[BalanceChange]:
+        slot = self._slots.get(key)
+        if slot is None:
+            # removed while refreshing
+            return None
+        if _not_created(result):
+            result = {"balance": 0, "nonce": 0}
+        elif not isinstance(result, dict):
+            self._failed.add(key)
+            return None
+        self._failed.discard(key)
+
+        balance, nonce = int(result["balance"]), int(result["nonce"])
+        known = self._known[slot]
+        old_balance, old_nonce = int(self._balances[slot]), self._nonces[slot]
+        self._balances[slot] = balance
+        self._nonces[slot] = nonce
+        self._known[slot] = 1
+        if known and (old_balance, old_nonce) == (balance, nonce):
+            return None
+        if not known and not self.emit_initial:
+            return None
+        return BalanceChange(
+            key.hex(), Qa(old_balance) if known else None, Qa(balance),
+            old_nonce if known else None, nonce, block_num
+        )
+
+    def refresh(self, addresses: Optional[Iterable[str]]=None,
+                block_num: Optional[int]=None) -> List[BalanceChange]:
+        """Refresh addresses (default all watched addresses) and the ones
+        failed before, return changes.
+        """
+        if addresses is None:
+            keys = list(self._keys)
+        else:
+            keys = [key for key in map(self._key, addresses) if key in self._slots]
+            keys.extend(self._failed.difference(keys))
+
+        changes = []
+        for start in range(0, len(keys), self.batch_size):
+            chunk = keys[start:start + self.batch_size]
+            self._throttle(len(chunk))
+            self.num_calls += len(chunk)
+            try:
+                results = self.api.call_batch([("GetBalance", (key.hex(), )) for key in chunk])
+            except Exception as e:
+                # failed chunk is retried by the next refresh, changes
+                # of other chunks are still emitted
+                logging.debug("Retry batch request: {}".format(e))
+                results = [e] * len(chunk)
+            for key, result in zip(chunk, results):
+                change = self._update(key, result, block_num)
+                if change:
+                    changes.append(change)
+        return self._emit(changes)
+
+    def touched(self, txns: Iterable[dict]) -> Set[str]:
+        """Return watched addresses related to transactions."""
+        touched = set()
+        for txn in txns:
+            for address, _ in txn_relations(txn):
+                if bytes.fromhex(address) in self._slots:
+                    touched.add(address)
+        return touched
+
+    def refresh_blocks(self, blocks: Iterable[SyncedBlock]) -> List[BalanceChange]:
+        """Refresh watched addresses touched in blocks with transactions."""
+        touched = set()
+        block_num = self.block_num
+        for synced in blocks:
+            touched.update(self.touched(synced.txns or []))
+            block_num = synced.block_num if block_num is None else max(block_num, synced.block_num)
+        self.block_num = block_num
+        return self.refresh(sorted(touched), block_num=block_num)
+
+    def follow(self, interval: float=60, stop_event: Optional[threading.Event]=None) -> None:
+        """Refresh all addresses every interval seconds until stop_event is set."""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            self.refresh()
+            stop_event.wait(interval)
+
+    def follow_blocks(self, block_sync: Optional[BlockSync]=None, start: Optional[int]=None,
+                      interval: float=10, group=100,
+                      stop_event: Optional[threading.Event]=None) -> None:
+        """Follow new TxBlocks until stop_event is set, refresh addresses
+        touched in every group of blocks. Without start or saved cursor of
+        block_sync, all addresses are refreshed and follow from the next block.
+        """
+        block_sync = block_sync or BlockSync(self._api)
+        stop_event = stop_event or threading.Event()
+        if start is None and block_sync.cursor is None:
+            start = block_sync.latest_block_num() + 1
+            self.refresh()
+        while not stop_event.is_set():
+            blocks = block_sync.blocks(start)
+            start = None
+            while not stop_event.is_set():
+                chunk = list(islice(blocks, group))
+                if not chunk:
+                    break
+                self.refresh_blocks(chunk)
+            blocks.close()
+            stop_event.wait(interval)
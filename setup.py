@@ -16,9 +16,13 @@ tests_require = ["pytest"]
 install_requires = [
     "requests", "jsonrpcclient", "jsonrpcclient[requests]",
     "protobuf", "fastecdsa", "pyethash",
-    "pycryptodome", "eth-hash[pycryptodome]",
+    "pycryptodome", "eth-hash[pycryptodome]", "click",
 ]
 
+entry_points = {
+    "console_scripts": ["pyzil=pyzil.cli:cli"],
+}
+
 setup(
     name="pyzil",
     version=version,
@@ -39,5 +43,6 @@ setup(
     include_package_data=True,
     package_data=package_data,
     install_requires=install_requires,
+    entry_points=entry_points,
     tests_require=tests_require,
 )